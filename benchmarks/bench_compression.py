@@ -0,0 +1,91 @@
+"""
+Measure bytes on the wire against CPU cost for permessage-deflate settings.
+
+The first table compresses a stream of state_changed events the way a
+permessage-deflate sender does (one shared context, sync flush per message),
+so sizes are exact frame payloads without headers. The second table serves
+the same stream end to end and reports client throughput.
+
+    python benchmarks/bench_compression.py [--messages N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+import zlib
+
+import websockets
+
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, SendInteraction, WebsocketOptions
+from mock_hass_websocket.server import MockHass
+
+LEVELS = (1, 6, 9)
+WINDOWS = (15, 12, 9)
+
+def make_payloads(messages):
+    payloads = []
+    for i in range(messages):
+        entity = f"sensor.temperature_{i % 50}"
+        state = {
+            "entity_id": entity,
+            "state": f"{18 + (i * 7) % 100 / 10:.1f}",
+            "attributes": {"unit_of_measurement": "°C", "device_class": "temperature", "friendly_name": f"Temperature {i % 50}"},
+            "last_changed": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.000000+00:00",
+            "context": {"id": f"01HX{i:022d}", "parent_id": None, "user_id": None},
+        }
+        payloads.append({
+            "id": 1,
+            "type": "event",
+            "event": {"event_type": "state_changed", "data": {"entity_id": entity, "new_state": state}},
+        })
+    return payloads
+
+def deflate_stream(encoded, level, window):
+    """Return (compressed bytes, seconds) for a permessage-deflate context."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -window)
+    total = 0
+    start = time.perf_counter()
+    for message in encoded:
+        data = compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        total += len(data) - 4  # the 00 00 ff ff trailer is not sent
+    return total, time.perf_counter() - start
+
+async def serve(payloads, options, compression):
+    script = Script(items=[SendInteraction(type="send", at_ms=0, payload=p) for p in payloads])
+    async with MockHass(engine=Engine(script), ws_options=options) as server:
+        start = time.perf_counter()
+        async with websockets.connect(server.ws_url, compression=compression, max_queue=None, max_size=None) as ws:
+            for _ in payloads:
+                await ws.recv()
+            return time.perf_counter() - start
+
+async def main(messages):
+    payloads = make_payloads(messages)
+    encoded = [json.dumps(p).encode() for p in payloads]
+    raw = sum(len(m) for m in encoded)
+
+    print(f"{messages:,} messages, {raw:,} bytes uncompressed\n")
+    print(f"{'level':>5} {'window':>6} {'bytes':>12} {'ratio':>6} {'cpu us/msg':>10}")
+    for level in LEVELS:
+        for window in WINDOWS:
+            size, elapsed = deflate_stream(encoded, level, window)
+            print(f"{level:>5} {window:>6} {size:>12,} {size / raw:>6.2f} {elapsed / messages * 1e6:>10.2f}")
+
+    print(f"\n{'setting':<20} {'msg/s':>10}")
+    configs = [("off", WebsocketOptions(compress=False), None)]
+    configs += [(f"level {level}", WebsocketOptions(compress_level=level), "deflate") for level in LEVELS]
+    configs.append(("level 6, window 9", WebsocketOptions(compress_level=6, window_bits=9), "deflate"))
+    configs.append(("binary frames", WebsocketOptions(compress=False, binary=True), None))
+    for name, options, compression in configs:
+        elapsed = await serve(payloads, options, compression)
+        print(f"{name:<20} {messages / elapsed:>10,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+    # Per-message INFO logging would dominate the measurement.
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(args.messages))
@@ -0,0 +1,66 @@
+"""
+Compare get_states result encoding with and without the state store caches.
+
+"incremental" changes --changed entities before every call, so only their
+chunks are rebuilt.
+
+    python benchmarks/bench_get_states.py [--entities N] [--calls N] [--changed N]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from mock_hass_websocket.states import StateStore
+
+def make_states(entities):
+    return [
+        {
+            "entity_id": f"sensor.s{i}",
+            "state": str(i % 100),
+            "attributes": {"unit_of_measurement": "W", "friendly_name": f"Sensor {i}"},
+            "last_changed": "2024-01-01T00:00:00.000000+00:00",
+            "last_updated": "2024-01-01T00:00:00.000000+00:00",
+            "context": {"id": f"01HX{i:022d}", "parent_id": None, "user_id": None},
+        }
+        for i in range(entities)
+    ]
+
+async def main(entities, calls, changed):
+    states = make_states(entities)
+
+    start = time.perf_counter()
+    for i in range(calls):
+        json.dumps({"id": i, "type": "result", "success": True, "result": list(states)})
+    naive = (time.perf_counter() - start) / calls
+
+    store = StateStore(states)
+    buffer = bytearray()
+    start = time.perf_counter()
+    await store.encode_result(buffer, 0)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(calls):
+        await store.encode_result(buffer, i)
+    warm = (time.perf_counter() - start) / calls
+
+    start = time.perf_counter()
+    for i in range(calls):
+        for j in range(changed):
+            store.set_state(f"sensor.s{(i * changed + j) * 7919 % entities}", i)
+        await store.encode_result(buffer, i)
+    incremental = (time.perf_counter() - start) / calls
+
+    print(f"{entities:,} entities, {len(buffer):,} bytes per result")
+    print(f"json.dumps    {naive * 1000:8.2f} ms")
+    print(f"cache (cold)  {cold * 1000:8.2f} ms")
+    print(f"cache (warm)  {warm * 1000:8.2f} ms")
+    print(f"incremental   {incremental * 1000:8.2f} ms  ({changed} changed per call)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--changed", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.entities, args.calls, args.changed))
@@ -0,0 +1,66 @@
+"""
+Scenario loading speed: per-item model construction versus one TypeAdapter pass.
+
+Writes a scenario with --items interactions, then times the old way of
+loading it (the pure-Python YAML parser, SendInteraction(**item) for each
+entry, then Script re-validating the list) against load_script, and the
+validation step alone against the SCRIPT adapter.
+
+    python benchmarks/bench_loader.py [--items N]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+from mock_hass_websocket.loader import SCRIPT, load_script
+from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction, SetStateInteraction
+
+MODELS = {"send": SendInteraction, "expect": ExpectInteraction, "set_state": SetStateInteraction}
+
+def make_items(count):
+    items = []
+    for i in range(count):
+        if i % 2:
+            items.append({"type": "expect", "timeout_ms": 1000, "match": {"type": "call_service", "domain": "light"}})
+        else:
+            items.append({"type": "send", "at_ms": i, "payload": {"type": "event", "event": {"n": i}}})
+    return items
+
+def per_item(items):
+    return Script(items=[MODELS[item["type"]](**item) for item in items])
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def main(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scenario.yaml"
+        path.write_text(yaml.dump({"script": make_items(count)}, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper)))
+
+        def old_load():
+            with open(path) as f:
+                per_item(yaml.safe_load(f)["script"])
+
+        old = timed(old_load)
+        new = timed(load_script, path)
+
+    items = make_items(count)
+    old_validate = timed(per_item, items)
+    new_validate = timed(SCRIPT.validate_python, {"items": items})
+
+    print(f"{count:,} items")
+    print(f"load (old)       {old:7.2f} s")
+    print(f"load_script      {new:7.2f} s  ({old / new:.1f}x)")
+    print(f"validate (old)   {old_validate:7.2f} s")
+    print(f"SCRIPT adapter   {new_validate:7.2f} s  ({old_validate / new_validate:.1f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.items)
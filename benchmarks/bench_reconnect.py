@@ -0,0 +1,60 @@
+"""
+Reconnect storm: many identified clients drop and come back at once.
+
+Each client logs in, disconnects, and reconnects with the same client_id.
+Its session resumes, and the server's reconnect latencies are reported.
+
+    python benchmarks/bench_reconnect.py [--clients N] [--rounds N]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import websockets
+
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+
+def make_script():
+    return Script(items=[
+        SendInteraction(type="send", at_ms=0, payload={"type": "auth_required"}),
+        ExpectInteraction(type="expect", timeout_ms=60000, match={"type": "auth"}),
+        SendInteraction(type="send", at_ms=0, payload={"type": "auth_ok"}),
+        ExpectInteraction(type="expect", timeout_ms=600000, match={"type": "never"}),
+    ])
+
+async def client(url, rounds):
+    for _ in range(rounds):
+        async with websockets.connect(url) as ws:
+            await ws.recv()
+            await ws.send(json.dumps({"type": "auth", "access_token": "t"}))
+            await ws.recv()
+
+async def main(clients, rounds):
+    # One engine per client, as with per-client scenario sessions
+    sessions = {f"c{i}": Engine(make_script()) for i in range(clients)}
+    async with MockHass(sessions=sessions, resume_grace_ms=60000) as server:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client(f"ws://{server.host}:{server.port}/session/c{i}/api/websocket?client_id=c{i}", rounds)
+            for i in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+        latencies = sorted(server.resume.reconnect_latencies)
+
+    print(f"{clients} clients x {rounds} connections in {elapsed:.2f}s")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"reconnect latency: median {statistics.median(latencies):.1f}ms, p99 {p99:.1f}ms, max {latencies[-1]:.1f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(args.clients, args.rounds))
@@ -0,0 +1,61 @@
+"""
+Recording access: a JSON array versus the indexed binary format.
+
+Writes a soak-style recording of --entries messages (state_changed events,
+with a call_service reply to every tenth) one second apart, both as a JSON
+array and as a .mhrec file, then times counting call_service messages and
+reading the entries from the last tenth of the run in each.
+
+    python benchmarks/bench_recordings.py [--entries N]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from mock_hass_websocket.binary_recordings import BinaryRecording, json_to_binary
+from mock_hass_websocket.recordings import iter_records
+
+def make_recording(path, count):
+    with open(path, "w") as f:
+        f.write("[")
+        for i in range(count):
+            if i % 10 == 9:
+                payload = {"id": i, "type": "call_service", "domain": "light", "service": "turn_on", "service_data": {"entity_id": f"light.l{i % 50}"}}
+                direction = "received"
+            else:
+                payload = {"id": 1, "type": "event", "event": {"event_type": "state_changed", "data": {"entity_id": f"sensor.s{i % 50}", "new_state": {"state": str(i)}}}}
+                direction = "sent"
+            f.write(("," if i else "") + json.dumps({"timestamp": 1000.0 + i, "direction": direction, "payload": payload}))
+        f.write("]")
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def main(count):
+    with tempfile.TemporaryDirectory() as tmp:
+        source, packed = Path(tmp) / "soak.json", Path(tmp) / "soak.mhrec"
+        make_recording(source, count)
+        seconds, _ = timed(lambda: json_to_binary(source, packed))
+        print(f"{count} entries: JSON {os.path.getsize(source) / 1e6:.1f} MB, binary {os.path.getsize(packed) / 1e6:.1f} MB, converted in {seconds:.2f}s")
+
+        json_count, n = timed(lambda: sum(1 for r in iter_records(source) if r["payload"].get("type") == "call_service"))
+        with BinaryRecording(packed) as recording:
+            binary_count, m = timed(lambda: recording.count(msg_type="call_service"))
+            assert n == m
+            print(f"{'count call_service':22} JSON {json_count * 1e3:9.1f} ms   binary {binary_count * 1e3:9.1f} ms")
+
+            json_tail, tail = timed(lambda: [r for r in iter_records(source) if r["timestamp"] >= 1000.0 + count * 0.9])
+            binary_tail, packed_tail = timed(lambda: list(recording.entries(start=recording.position_at(count * 0.9))))
+            assert len(tail) == len(packed_tail)
+            print(f"{'last tenth':22} JSON {json_tail * 1e3:9.1f} ms   binary {binary_tail * 1e3:9.1f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.entries)
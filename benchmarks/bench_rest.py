@@ -0,0 +1,66 @@
+"""
+REST polling throughput: pooled clients hammer the /api/states routes.
+
+Each worker reuses keep-alive connections from a shared pool and alternates
+between the full state list and single entities, optionally sending
+If-None-Match so unchanged states come back as 304. Reports requests/sec for
+the default HTTP settings and for HttpOptions.high_throughput().
+
+    python benchmarks/bench_rest.py [--entities N] [--requests N] [--concurrency N] [--etag]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import HttpOptions, Script
+from mock_hass_websocket.server import MockHass
+
+def make_states(entities):
+    return [
+        {"entity_id": f"sensor.s{i}", "state": str(i % 100), "attributes": {"unit_of_measurement": "W"}}
+        for i in range(entities)
+    ]
+
+async def worker(http, url, entities, requests, use_etag):
+    etags = {}
+    for i in range(requests):
+        path = "/api/states" if i % 4 == 0 else f"/api/states/sensor.s{i % entities}"
+        headers = {"If-None-Match": etags[path]} if use_etag and path in etags else None
+        async with http.get(url + path, headers=headers) as response:
+            await response.read()
+            etags[path] = response.headers.get("ETag")
+
+async def run(label, http_options, entities, requests, concurrency, use_etag):
+    engine = Engine(Script(states=make_states(entities)))
+    async with MockHass(engine=engine, http_options=http_options) as server:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                worker(http, server.url, entities, requests // concurrency, use_etag)
+                for _ in range(concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+    total = requests // concurrency * concurrency
+    print(f"{label:16} {total / elapsed:10,.0f} req/s")
+
+async def main(entities, requests, concurrency, use_etag):
+    print(f"{entities} entities, {requests} requests, {concurrency} pooled connections, etag={use_etag}")
+    await run("default", HttpOptions(), entities, requests, concurrency, use_etag)
+    await run("high throughput", HttpOptions.high_throughput(), entities, requests, concurrency, use_etag)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--etag", action="store_true")
+    args = parser.parse_args()
+    # Like the CLI: INFO logging, so the default settings pay for access log lines
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+    logging.getLogger("mock_hass_websocket").setLevel(logging.WARNING)
+    asyncio.run(main(args.entities, args.requests, args.concurrency, args.etag))
@@ -0,0 +1,65 @@
+"""
+Measure CLI startup, time-to-ready and first-connection latency.
+
+    python benchmarks/bench_startup.py [--runs N]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENARIO = """
+script:
+  - type: send
+    at_ms: 0
+    payload: {type: auth_required}
+"""
+
+def time_subprocess(args, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(args, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+async def time_server(script_path, runs):
+    import websockets
+    from mock_hass_websocket.server import MockHass
+
+    ready, first = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        async with MockHass(script_path) as server:
+            ready.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            async with websockets.connect(server.ws_url) as ws:
+                json.loads(await ws.recv())
+                first.append(time.perf_counter() - start)
+    return ready, first
+
+def report(name, samples):
+    print(f"{name:<32} median {statistics.median(samples) * 1000:8.2f} ms   min {min(samples) * 1000:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    report("import mock_hass_websocket.main", time_subprocess([sys.executable, "-c", "import mock_hass_websocket.main"], args.runs))
+    report("mock-hass --help", time_subprocess([sys.executable, "-m", "mock_hass_websocket.main", "--help"], args.runs))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script_path = Path(tmp) / "scenario.yaml"
+        script_path.write_text(SCENARIO)
+        ready, first = asyncio.run(time_server(script_path, args.runs))
+    report("start -> ready (port 0)", ready)
+    report("connect -> first message", first)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Connection storm: many clients connect and log in at the same moment.
+
+The server runs with admission control and native auth; each client retries
+on HTTP 503. Reports handshake latencies and the admission counters.
+
+    python benchmarks/bench_storm.py [--clients N] [--max-sessions N] [--accept-rate R]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+
+import websockets
+from websockets.exceptions import InvalidStatus
+
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import AdmissionConfig, Script
+from mock_hass_websocket.server import MockHass
+
+async def client(url, latencies, retries):
+    start = time.perf_counter()
+    while True:
+        try:
+            async with websockets.connect(url, open_timeout=60) as ws:
+                await ws.recv()
+                await ws.send(json.dumps({"type": "auth", "access_token": "t"}))
+                await ws.recv()
+                latencies.append((time.perf_counter() - start) * 1000.0)
+                return
+        except InvalidStatus:
+            retries.append(1)
+            await asyncio.sleep(0.1)
+
+async def main(clients, max_sessions, accept_rate, max_queue):
+    config = AdmissionConfig(
+        max_sessions=max_sessions,
+        accept_rate=accept_rate,
+        accept_burst=max_sessions,
+        max_queue=max_queue,
+        native_auth=True,
+    )
+    latencies, retries = [], []
+    async with MockHass(engine=Engine(Script(items=[])), admission=config) as server:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(server.ws_url, latencies, retries) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        stats = server.admission_control.stats
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{clients} clients logged in within {elapsed:.2f}s ({len(retries)} retries after 503)")
+    print(f"login latency: median {statistics.median(latencies):.1f}ms, p99 {p99:.1f}ms, max {latencies[-1]:.1f}ms")
+    print(f"admitted {stats['admitted']}, rejected {stats['rejected']}, peak queue {stats['peak_waiting']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--max-sessions", type=int, default=100)
+    parser.add_argument("--accept-rate", type=float, default=1000)
+    parser.add_argument("--max-queue", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main(args.clients, args.max_sessions, args.accept_rate, args.max_queue))
@@ -0,0 +1,73 @@
+"""
+Topology scaling: startup time and memory against the number of instances.
+
+Writes a scenario of --items interactions and starts topologies of 1, 10 and
+--instances virtual instances all playing it, timing startup and measuring
+what tracemalloc sees allocated once they are serving. Compare the per
+instance figures with starting one full server per instance.
+
+    python benchmarks/bench_topology.py [--instances N] [--items N]
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import yaml
+
+from mock_hass_websocket.models import InstanceConfig, TopologyConfig
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.topology import Topology
+
+def write_scenario(path, items):
+    script = []
+    for i in range(items):
+        if i % 2:
+            script.append({"type": "expect", "timeout_ms": 1000, "match": {"type": "call_service", "domain": "light"}})
+        else:
+            script.append({"type": "send", "at_ms": i, "payload": {"type": "event", "event": {"n": i}}})
+    path.write_text(yaml.safe_dump({"script": script}))
+
+async def measure(start, stop):
+    tracemalloc.start()
+    began = time.perf_counter()
+    handle = await start()
+    seconds = time.perf_counter() - began
+    size = tracemalloc.get_traced_memory()[0]
+    await stop(handle)
+    tracemalloc.stop()
+    return seconds, size
+
+async def main(instances, items):
+    with tempfile.TemporaryDirectory() as tmp:
+        scenario = Path(tmp) / "scenario.yaml"
+        write_scenario(scenario, items)
+        # Imports and first-use setup would otherwise be charged to the first row
+        warm = await MockHass(scenario).start()
+        await warm.stop()
+        for count in sorted({1, 10, instances}):
+            config = TopologyConfig(instances={f"i{n}": InstanceConfig(scenario=str(scenario)) for n in range(count)})
+
+            async def start_topology():
+                return await Topology(config).start()
+
+            async def start_servers():
+                return [await MockHass(scenario).start() for _ in range(count)]
+
+            async def stop_servers(servers):
+                for server in servers:
+                    await server.stop()
+
+            seconds, size = await measure(start_topology, lambda topology: topology.stop())
+            print(f"{count:4} instances, one topology:   {seconds * 1e3:8.1f} ms  {size / 1e6:7.2f} MB  ({size / count / 1e3:8.1f} kB each)")
+            seconds, size = await measure(start_servers, stop_servers)
+            print(f"{count:4} instances, one server each: {seconds * 1e3:8.1f} ms  {size / 1e6:7.2f} MB  ({size / count / 1e3:8.1f} kB each)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, default=50)
+    parser.add_argument("--items", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.instances, args.items))
@@ -0,0 +1,72 @@
+"""
+Compare message throughput of the TCP, Unix socket and in-process transports.
+
+The server streams N state_changed events (one repeated send) and the client
+reads them all.
+
+    python benchmarks/bench_transports.py [--messages N]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import websockets
+
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, SendInteraction
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.transports import connect_in_process
+
+def make_engine(messages):
+    payload = {
+        "id": 1,
+        "type": "event",
+        "event": {
+            "event_type": "state_changed",
+            "data": {"entity_id": "sensor.x", "new_state": {"state": "21.5", "attributes": {"unit": "C"}}},
+        },
+    }
+    script = Script(items=[SendInteraction(type="send", at_ms=0, payload=payload, repeat=messages)])
+    return Engine(script)
+
+async def drain(ws, messages):
+    for _ in range(messages):
+        await ws.recv()
+
+async def bench_tcp(messages):
+    async with MockHass(engine=make_engine(messages)) as server:
+        start = time.perf_counter()
+        async with websockets.connect(server.ws_url, max_queue=None) as ws:
+            await drain(ws, messages)
+            return time.perf_counter() - start
+
+async def bench_unix(messages):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "hass.sock")
+        async with MockHass(engine=make_engine(messages), unix_path=path) as server:
+            start = time.perf_counter()
+            async with websockets.unix_connect(path, uri=server.ws_url, max_queue=None) as ws:
+                await drain(ws, messages)
+                return time.perf_counter() - start
+
+async def bench_in_process(messages):
+    start = time.perf_counter()
+    async with connect_in_process(make_engine(messages)) as ws:
+        await drain(ws, messages)
+    return time.perf_counter() - start
+
+async def main(messages):
+    for name, bench in (("tcp", bench_tcp), ("unix", bench_unix), ("in-process", bench_in_process)):
+        elapsed = await bench(messages)
+        print(f"{name:<12} {messages / elapsed:12,.0f} msg/s  ({elapsed:.3f}s for {messages:,})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    # Per-message INFO logging would dominate the measurement.
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(args.messages))
@@ -0,0 +1,47 @@
+"""
+Cost of validating client commands.
+
+Times CommandValidator.check on typical AppDaemon traffic, in lenient and
+strict mode, against constructing each model directly.
+
+    python benchmarks/bench_validation.py [--rounds N]
+"""
+import argparse
+import time
+
+from mock_hass_websocket.commands import CommandValidator
+from mock_hass_websocket.models import CallServiceMessage, PingMessage, SubscribeEventsMessage
+
+MESSAGES = [
+    (PingMessage, {"id": 1, "type": "ping"}),
+    (SubscribeEventsMessage, {"id": 2, "type": "subscribe_events", "event_type": "state_changed"}),
+    (CallServiceMessage, {
+        "id": 3,
+        "type": "call_service",
+        "domain": "light",
+        "service": "turn_on",
+        "service_data": {"brightness": 255, "transition": 2},
+        "target": {"entity_id": ["light.kitchen", "light.hall"]},
+    }),
+]
+
+def per_message(check, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for _, message in MESSAGES:
+            check(message)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES)) * 1e6
+
+def main(rounds):
+    lenient = CommandValidator()
+    strict = CommandValidator(strict=True)
+    models = {message["type"]: model for model, message in MESSAGES}
+    print(f"{'model(**msg)':18} {per_message(lambda m: models[m['type']](**m), rounds):6.2f} us/message")
+    print(f"{'lenient':18} {per_message(lenient.check, rounds):6.2f} us/message")
+    print(f"{'strict':18} {per_message(strict.check, rounds):6.2f} us/message")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=100000)
+    args = parser.parse_args()
+    main(args.rounds)
@@ -4,9 +4,6 @@ import json
 import logging
 import websockets
 from pathlib import Path
-from mock_hass_websocket.server import start_server
-from mock_hass_websocket.loader import load_script
-from mock_hass_websocket.engine import Engine, deep_match
 
 # --- PROTOTYPE ---------------------------------------------------------
 # This section simulates your AppDaemon App code.
@@ -65,41 +62,27 @@ class MyApp:
 # This is how you verify your App against the Scenario.
 # -----------------------------------------------------------------------
 
-@pytest.fixture
-def unused_tcp_port():
-    import socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('127.0.0.1', 0))
-        return s.getsockname()[1]
-
 @pytest.mark.asyncio
-async def test_my_app_logic(unused_tcp_port):
+async def test_my_app_logic(mock_hass):
     """
     Test that MyApp behaves correctly according to 'prototype_scenario.yaml'.
     """
     # 1. Setup
-    port = unused_tcp_port
+    # The `mock_hass` fixture (from the bundled pytest plugin) registers the
+    # scenario on a server shared by the whole test session - no startup wait.
     scenario_path = Path("examples/prototype_scenario.yaml")
+    session = mock_hass(scenario_path)
+    script = session.engine.script
     
-    # Load script and engine for verification
-    script = load_script(scenario_path)
-    engine = Engine(script)
-    
-    # 2. Start Mock Server
-    server_task = asyncio.create_task(
-        start_server("127.0.0.1", port, scenario_path, engine=engine)
-    )
-    await asyncio.sleep(0.1) # Wait for server startup
-    
-    # 3. Start App (System Under Test)
-    app = MyApp(f"ws://127.0.0.1:{port}/api/websocket")
+    # 2. Start App (System Under Test)
+    app = MyApp(session.ws_url)
     app_task = asyncio.create_task(app.start())
     
     try:
-        # 4. Wait for interaction to complete
-        # We can wait for a specific time based on scenario duration
-        # The scenario is ~3-4 seconds long.
-        await asyncio.sleep(4.0)
+        # 3. Wait for the scenario to complete
+        # This returns as soon as the last expectation is met, and raises
+        # if the App didn't send an expected command in time.
+        await session.wait_async(timeout=10.0)
         
     finally:
         # Cleanup
@@ -109,30 +92,15 @@ async def test_my_app_logic(unused_tcp_port):
             await app_task
         except asyncio.CancelledError:
             pass
-            
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
 
-    # 5. Verify Results
-    # Check that the Engine successfully matched all expectations
-    # If the Engine raises an error during execution, it logs it.
-    # We can also check the history length
-    
+    # 4. Verify Results
+    engine = session.engine
     print("\n--- Interaction History ---")
     for log in engine.history:
         print(f"[{log.direction.upper()}] {log.payload}")
         
     # Ensure all script items were processed (sent or expected)
     # Note: Engine.history logs *actual* events.
-    # We want to know if the Engine encountered any mismatch exceptions.
-    # Currently Engine catches exceptions and logs them, or raises up to run().
-    # Ideally, we should check if engine.run() completed successfully if we awaited it.
-    # But start_server runs engine.run in a loop per connection.
-    
-    # Simple check: Did we satisfy all expectations?
     # We can verify that we have at least as many 'received' keys in history as 'expect' items in script.
     expected_matches = len([i for i in script.items if i.type == "expect"])
     actual_matches = len([l for l in engine.history if l.direction == "received"])
@@ -1,14 +1,9 @@
-import pytest
-import asyncio
 import json
 import logging
 import threading
 import time
 from pathlib import Path
 from websockets.sync.client import connect  # Synchronous client
-from mock_hass_websocket.server import start_server
-from mock_hass_websocket.loader import load_script
-from mock_hass_websocket.engine import Engine
 
 # --- CLASSIC PROTOTYPE -------------------------------------------------
 # This simulates a "Classic" synchronous AppDaemon App.
@@ -74,53 +69,33 @@ class ClassicApp:
 
 # --- TEST CODE ---------------------------------------------------------
 
-@pytest.fixture
-def unused_tcp_port():
-    import socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('127.0.0.1', 0))
-        return s.getsockname()[1]
-
-@pytest.mark.asyncio
-async def test_classic_app_logic(unused_tcp_port):
+def test_classic_app_logic(mock_hass):
     """
-    Test a synchronous app running in a separate thread against the async mock server.
+    Test a synchronous app running in a separate thread against the mock server.
     """
     # 1. Setup
-    port = unused_tcp_port
+    # The shared server runs in its own thread, so a plain synchronous test works.
     scenario_path = Path("examples/prototype_scenario.yaml")
+    session = mock_hass(scenario_path)
+    script = session.engine.script
+    engine = session.engine
     
-    script = load_script(scenario_path)
-    engine = Engine(script)
-    
-    # 2. Start Mock Server (Async)
-    server_task = asyncio.create_task(
-        start_server("127.0.0.1", port, scenario_path, engine=engine)
-    )
-    await asyncio.sleep(0.5) # Wait for server startup
-    
-    # 3. Start Classic App (In a Thread because it blocks)
-    app = ClassicApp(f"ws://127.0.0.1:{port}/api/websocket")
+    # 2. Start Classic App (In a Thread because it blocks)
+    app = ClassicApp(session.ws_url)
     
     app_thread = threading.Thread(target=app.start)
     app_thread.start()
     
     try:
-        # 4. Wait for interaction to complete
-        await asyncio.sleep(4.0)
+        # 3. Wait for the scenario to complete (raises if it failed)
+        session.wait(timeout=10.0)
         
     finally:
         # Cleanup
         app.stop()
-        app_thread.join(timeout=1.0)
-            
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
+        app_thread.join(timeout=2.0)
 
-    # 5. Verify Results
+    # 4. Verify Results
     print("\n--- Interaction History ---")
     for log in engine.history:
         print(f"[{log.direction.upper()}] {log.payload}")
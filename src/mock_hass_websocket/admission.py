@@ -0,0 +1,123 @@
+"""
+Admission control and the native auth phase.
+
+When many clients (re)connect at once, ``AdmissionController`` keeps the
+server responsive: handshakes are accepted at a bounded rate (token bucket),
+at most ``max_sessions`` connections run concurrently, and excess handshakes
+wait in a bounded queue. Anything beyond the queue, or waiting too long, is
+turned away with HTTP 503 so clients back off and retry.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from typing import Iterable, Optional
+from .models import AdmissionConfig, AuthInvalidMessage, AuthMessage, AuthOkMessage, AuthRequiredMessage
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """The server is saturated; the client should retry later."""
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second with bursts of up to ``burst``."""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated: Optional[float] = None
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def empty(self) -> bool:
+        """Whether the next reservation would have to wait."""
+        self._refill(asyncio.get_running_loop().time())
+        return self._tokens < 1
+
+    def reserve(self) -> float:
+        """Take a token, returning how long to wait before it may be used."""
+        now = asyncio.get_running_loop().time()
+        self._refill(now)
+        self._tokens -= 1
+        # A negative balance is a queue of reservations paid back over time
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+class AdmissionController:
+    """Rate, concurrency and queue limits for incoming websocket sessions."""
+    def __init__(self, config: AdmissionConfig):
+        self.config = config
+        self.bucket = TokenBucket(config.accept_rate, config.accept_burst) if config.accept_rate else None
+        self.active = 0
+        self.waiting = 0
+        self.stats: Counter = Counter()
+        self._slots = asyncio.Semaphore(config.max_sessions) if config.max_sessions else None
+
+    async def acquire(self):
+        """Wait for a session slot; raises ``AdmissionRejected`` if the queue is full or the wait too long."""
+        if self.config.max_queue is not None and self.waiting >= self.config.max_queue and self._busy():
+            self.stats["rejected"] += 1
+            raise AdmissionRejected("Too many pending connections")
+        self.waiting += 1
+        self.stats["peak_waiting"] = max(self.stats["peak_waiting"], self.waiting)
+        try:
+            await asyncio.wait_for(self._admit(), self.config.queue_timeout_ms / 1000.0)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected("Timed out waiting for a session slot")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.stats["admitted"] += 1
+
+    def _busy(self) -> bool:
+        """Whether a new handshake would have to queue."""
+        if self._slots is not None and self._slots.locked():
+            return True
+        return self.bucket is not None and self.bucket.empty()
+
+    async def _admit(self):
+        if self._slots is not None:
+            await self._slots.acquire()
+        try:
+            if self.bucket is not None:
+                delay = self.bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        except BaseException:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+
+    def release(self):
+        self.active -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+# The auth phase is identical for every connection; encode it once.
+AUTH_REQUIRED = json.dumps(AuthRequiredMessage().model_dump())
+AUTH_OK = json.dumps(AuthOkMessage().model_dump())
+
+async def authenticate(websocket, tokens: Optional[Iterable[str]] = None) -> Optional[str]:
+    """
+    Play Home Assistant's auth phase natively.
+
+    Returns the client's access token, or ``None`` after answering
+    ``auth_invalid`` (malformed message or a token not in ``tokens``) or if the
+    client went away first.
+    """
+    await websocket.send(AUTH_REQUIRED)
+    async for message in websocket:
+        try:
+            auth = AuthMessage.model_validate_json(message)
+        except ValueError:
+            await websocket.send(json.dumps(AuthInvalidMessage(message="Invalid auth message").model_dump()))
+            return None
+        if tokens is not None and auth.access_token not in tokens:
+            await websocket.send(json.dumps(AuthInvalidMessage(message="Invalid access token or password").model_dump()))
+            return None
+        await websocket.send(AUTH_OK)
+        return auth.access_token
+    return None
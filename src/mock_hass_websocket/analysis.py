@@ -0,0 +1,194 @@
+"""
+Static analysis of scenarios.
+
+``analyse`` walks a script once, without running it, and works out when each
+step runs. Two clocks are kept:
+
+* the expected clock assumes the client answers every expectation at once, so
+  time only advances when a send or state change waits for its ``at_ms``;
+* the worst-case clock assumes every expectation is met just before its
+  timeout, which bounds how long a passing run can take.
+
+The critical path is the chain of steps that sets the worst-case end: the last
+step that waited for its own ``at_ms``, followed by the expectations after it.
+
+Steps that can't behave as written are reported as issues: ``at_ms`` values that
+go backwards, expectations that no client message can ever meet, and steps that
+change nothing. A scenario that doesn't load, including one with a malformed
+template, is a single error. ``expected_ms`` is what CI should schedule on,
+longest first.
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+from pydantic import BaseModel
+from .loader import ScriptError, load_script, stream_script
+from .models import ExpectInteraction, SendInteraction, SetStateInteraction
+
+# Message types only Home Assistant itself sends; no client ever sends them
+SERVER_MESSAGE_TYPES = frozenset(("auth_required", "auth_ok", "auth_invalid", "result", "event", "pong"))
+
+class Issue(BaseModel):
+    """A step that won't behave as written, or the script itself failing to load."""
+    index: Optional[int] = None
+    severity: Literal["error", "warning", "info"]
+    message: str
+
+    def __str__(self) -> str:
+        where = f"script[{self.index}]" if self.index is not None else "script"
+        return f"{where}: {self.severity}: {self.message}"
+
+class Step(BaseModel):
+    """When one step runs, in milliseconds from the start of the connection."""
+    index: int
+    type: str
+    start_ms: int
+    end_ms: int
+    worst_start_ms: int
+    worst_end_ms: int
+
+class Timeline(BaseModel):
+    """The precomputed schedule of a script."""
+    name: str = ""
+    expected_ms: int = 0
+    worst_ms: int = 0
+    steps: List[Step] = []
+    critical_path: List[int] = []
+    issues: List[Issue] = []
+
+    @property
+    def errors(self) -> List[Issue]:
+        return [issue for issue in self.issues if issue.severity == "error"]
+
+    def summary(self) -> Dict[str, Any]:
+        """The timeline without its steps, for reports and schedulers."""
+        return self.model_dump(exclude={"steps"})
+
+def _initial_states(script: Any) -> Dict[str, Any]:
+    states = getattr(script, "states", None) or []
+    return {
+        state["entity_id"]: (str(state.get("state")), state.get("attributes"))
+        for state in states if isinstance(state, dict) and "entity_id" in state
+    }
+
+def _check_expect(index: int, item: ExpectInteraction, validate_commands: str, issues: List[Issue]):
+    if item.timeout_ms <= 0:
+        issues.append(Issue(index=index, severity="warning", message=(
+            f"timeout_ms {item.timeout_ms} only matches a message that has already arrived"
+        )))
+    if isinstance(item.match, dict) and not item.match:
+        issues.append(Issue(index=index, severity="info", message="match is empty and accepts any message"))
+    msg_type = item.match.get("type") if isinstance(item.match, dict) else None
+    if not isinstance(msg_type, str):
+        return
+    if msg_type in SERVER_MESSAGE_TYPES:
+        issues.append(Issue(index=index, severity="error", message=(
+            f"can never be met: '{msg_type}' messages are only sent by Home Assistant"
+        )))
+    elif validate_commands == "strict":
+        from .commands import COMMAND_TYPES
+
+        if msg_type not in COMMAND_TYPES:
+            issues.append(Issue(index=index, severity="error", message=(
+                f"can never be met: strict command validation rejects '{msg_type}' messages"
+            )))
+
+def analyse(script: Any, name: str = "", keep_steps: bool = True) -> Timeline:
+    """
+    Compute the timeline of ``script`` (a ``Script`` or ``ScriptStream``).
+
+    Items are consumed one at a time, so streamed scripts are analysed in
+    constant memory when ``keep_steps`` is off.
+    """
+    validate_commands = getattr(script, "validate_commands", "off")
+    entities = _initial_states(script)
+    timeline = Timeline(name=name)
+    issues = timeline.issues
+    expected = worst = 0
+    # The at_ms of the latest timed step, to spot values going backwards
+    last_at: Optional[int] = None
+    critical: List[int] = []
+
+    for index, item in enumerate(script.items):
+        start, worst_start = expected, worst
+        if isinstance(item, ExpectInteraction):
+            _check_expect(index, item, validate_commands, issues)
+            worst += max(item.timeout_ms, 0)
+            critical.append(index)
+        else:
+            at_ms = item.at_ms
+            if last_at is not None and at_ms < last_at:
+                issues.append(Issue(index=index, severity="warning", message=(
+                    f"at_ms {at_ms} goes backwards (a previous step runs at {last_at}); it runs at {expected} instead"
+                )))
+            elif at_ms < worst:
+                issues.append(Issue(index=index, severity="info", message=(
+                    f"at_ms {at_ms} slips to {worst} if the expectations before it take their full timeout"
+                )))
+            last = at_ms
+            if isinstance(item, SendInteraction):
+                last = at_ms + (item.repeat - 1) * item.interval_ms
+            elif isinstance(item, SetStateInteraction):
+                current = (str(item.state), item.attributes if item.attributes is not None else entities.get(item.entity_id, (None, None))[1])
+                if entities.get(item.entity_id) == current:
+                    issues.append(Issue(index=index, severity="warning", message=(
+                        f"redundant: {item.entity_id} is already '{item.state}'"
+                    )))
+                entities[item.entity_id] = current
+            start = max(expected, at_ms)
+            worst_start = max(worst, at_ms)
+            expected = max(expected, last)
+            if last >= worst:
+                # This step waits for its own time: the worst case restarts from it
+                critical = [index]
+            worst = max(worst, last)
+            last_at = max(last_at or 0, last)
+        if keep_steps:
+            timeline.steps.append(Step(
+                index=index, type=item.type,
+                start_ms=start, end_ms=expected, worst_start_ms=worst_start, worst_end_ms=worst,
+            ))
+
+    timeline.expected_ms = expected
+    timeline.worst_ms = worst
+    timeline.critical_path = critical
+    return timeline
+
+def analyse_file(path: Union[str, Path], keep_steps: bool = True) -> Timeline:
+    """Analyse a scenario file; load errors are reported as an issue rather than raised."""
+    path = Path(path)
+    try:
+        if path.suffix in (".jsonl", ".ndjson"):
+            try:
+                return analyse(stream_script(path), name=str(path), keep_steps=keep_steps)
+            except ScriptError as e:
+                # Streamed items are validated as they are read, without the file name
+                raise ScriptError(f"{path}: {e}") from e
+        return analyse(load_script(path), name=str(path), keep_steps=keep_steps)
+    except (ScriptError, ValueError, OSError) as e:
+        return Timeline(name=str(path), issues=[Issue(severity="error", message=str(e))])
+
+def scenario_files(paths: Iterable[Union[str, Path]]) -> List[Path]:
+    """Expand directories to the scenario files in them."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix in (".yaml", ".yml", ".jsonl", ".ndjson")))
+        else:
+            files.append(path)
+    return files
+
+def longest_first(timelines: Iterable[Timeline]) -> List[Timeline]:
+    """Order timelines for scheduling: longest expected run first, worst case breaking ties."""
+    return sorted(timelines, key=lambda t: (t.expected_ms, t.worst_ms), reverse=True)
+
+def format_timeline(timeline: Timeline) -> str:
+    """A step-by-step table of one timeline, critical steps marked with ``*``."""
+    critical = set(timeline.critical_path)
+    lines = [f"{'':1} {'#':>5}  {'type':<9} {'start':>9} {'end':>9} {'worst start':>12} {'worst end':>10}"]
+    for step in timeline.steps:
+        mark = "*" if step.index in critical else ""
+        lines.append(
+            f"{mark:1} {step.index:>5}  {step.type:<9} {step.start_ms:>9} {step.end_ms:>9} "
+            f"{step.worst_start_ms:>12} {step.worst_end_ms:>10}"
+        )
+    return "\n".join(lines)
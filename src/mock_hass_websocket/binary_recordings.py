@@ -0,0 +1,254 @@
+"""
+Compact binary recordings with a random-access index.
+
+A ``.mhrec`` file holds the same entries as a JSON recording, laid out so that
+readers can ``mmap`` it and jump straight to the entries they want::
+
+    header    magic, then the offsets of the index and the type table,
+              and the number of entries
+    entries   per entry: payload length, timestamp, direction, then the
+              payload as compact UTF-8 JSON
+    index     per entry: its offset, timestamp, direction and message type
+    types     JSON list of the message types the index refers to
+
+Timestamps are stored as doubles, NaN standing for "not recorded". Seeking by
+time and counting by direction or message type read the index alone; only the
+entries actually asked for are decoded.
+"""
+import bisect
+import json
+import math
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+MAGIC = b"MHREC01\n"
+SUFFIX = ".mhrec"
+_HEADER = struct.Struct("<8sQQQ")   # magic, index offset, types offset, entry count
+_ENTRY = struct.Struct("<IdB")      # payload length, timestamp, direction
+_INDEX = struct.Struct("<QdBH")     # entry offset, timestamp, direction, type id
+
+# Index entries unpacked per slice of the map
+INDEX_CHUNK = 4096
+
+DIRECTION_CODES = {"sent": 0, "received": 1}
+DIRECTION_NAMES = ("sent", "received")
+
+def is_binary_recording(path: Union[str, Path]) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def _message_type(payload: Any) -> str:
+    if isinstance(payload, dict) and isinstance(payload.get("type"), str):
+        return payload["type"]
+    return ""
+
+class BinaryRecordingWriter:
+    """
+    Writes a binary recording entry by entry.
+
+    The index is kept in memory until ``close`` (19 bytes per entry) and
+    written after the entries, so any number of entries can be streamed in.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, 0, 0, 0))
+        self._offset = _HEADER.size
+        self._index = bytearray()
+        self._types: Dict[str, int] = {}
+        self.count = 0
+
+    def write(self, direction: str, payload: Any, timestamp: Optional[float] = None):
+        data = json.dumps(payload, separators=(",", ":")).encode()
+        code = DIRECTION_CODES[direction]
+        stamp = math.nan if timestamp is None else float(timestamp)
+        msg_type = self._types.setdefault(_message_type(payload), len(self._types))
+        self._index += _INDEX.pack(self._offset, stamp, code, msg_type)
+        self._file.write(_ENTRY.pack(len(data), stamp, code))
+        self._file.write(data)
+        self._offset += _ENTRY.size + len(data)
+        self.count += 1
+
+    def write_record(self, record: Dict[str, Any]):
+        """Write a normalised ``{"timestamp", "direction", "payload"}`` record."""
+        self.write(record["direction"], record["payload"], record.get("timestamp"))
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._offset
+        self._file.write(self._index)
+        types_offset = index_offset + len(self._index)
+        self._file.write(json.dumps(list(self._types)).encode())
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, index_offset, types_offset, self.count))
+        self._file.close()
+
+    def __enter__(self) -> "BinaryRecordingWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class _Timestamps:
+    """The index's timestamps as a sequence, for bisecting without copying them out."""
+    def __init__(self, recording: "BinaryRecording"):
+        self._recording = recording
+
+    def __len__(self) -> int:
+        return len(self._recording)
+
+    def __getitem__(self, position: int) -> float:
+        return self._recording._index_entry(position)[1]
+
+class BinaryRecording:
+    """
+    A memory-mapped binary recording.
+
+    Entries are ``{"timestamp", "direction", "payload"}`` dicts like those of
+    ``recordings.iter_recording``; indexing and slicing decode only the
+    entries asked for.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._index_offset, types_offset, self._count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a binary recording")
+        if self._index_offset == 0:
+            self.close()
+            raise ValueError(f"{path} was not closed properly; its index is missing")
+        self.types: List[str] = json.loads(self._map[types_offset:])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "BinaryRecording":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _index_entry(self, position: int):
+        return _INDEX.unpack_from(self._map, self._index_offset + position * _INDEX.size)
+
+    def _decode(self, offset: int) -> Dict[str, Any]:
+        length, stamp, code = _ENTRY.unpack_from(self._map, offset)
+        start = offset + _ENTRY.size
+        return {
+            "timestamp": None if math.isnan(stamp) else stamp,
+            "direction": DIRECTION_NAMES[code],
+            "payload": json.loads(self._map[start:start + length].decode()),
+        }
+
+    def __getitem__(self, position: int) -> Dict[str, Any]:
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("recording entry out of range")
+        return self._decode(self._index_entry(position)[0])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.entries()
+
+    def entries(self, start: int = 0, stop: Optional[int] = None, direction: Optional[str] = None, msg_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Decode the entries from ``start`` to ``stop``, optionally only those of one direction or type."""
+        stop = self._count if stop is None else min(stop, self._count)
+        code = DIRECTION_CODES[direction] if direction is not None else None
+        type_id = self._type_id(msg_type) if msg_type is not None else None
+        if type_id == -1:
+            return
+        for offset, _, entry_code, entry_type in self._scan(start, stop):
+            if (code is None or entry_code == code) and (type_id is None or entry_type == type_id):
+                yield self._decode(offset)
+
+    def _scan(self, start: int, stop: int) -> Iterator[tuple]:
+        """Unpack index entries a chunk at a time, so memory stays flat however long the recording."""
+        for chunk_start in range(start, stop, INDEX_CHUNK):
+            chunk_stop = min(chunk_start + INDEX_CHUNK, stop)
+            yield from _INDEX.iter_unpack(self._map[
+                self._index_offset + chunk_start * _INDEX.size:self._index_offset + chunk_stop * _INDEX.size
+            ])
+
+    def _type_id(self, msg_type: str) -> int:
+        try:
+            return self.types.index(msg_type)
+        except ValueError:
+            return -1
+
+    def count(self, direction: Optional[str] = None, msg_type: Optional[str] = None) -> int:
+        """Count entries by direction and message type from the index alone."""
+        if direction is None and msg_type is None:
+            return self._count
+        code = DIRECTION_CODES[direction] if direction is not None else None
+        type_id = self._type_id(msg_type) if msg_type is not None else None
+        if type_id == -1:
+            return 0
+        return sum(
+            1 for _, _, entry_code, entry_type in self._scan(0, self._count)
+            if (code is None or entry_code == code) and (type_id is None or entry_type == type_id)
+        )
+
+    @property
+    def start_time(self) -> Optional[float]:
+        """The first recorded timestamp."""
+        for position in range(self._count):
+            stamp = self._index_entry(position)[1]
+            if not math.isnan(stamp):
+                return stamp
+        return None
+
+    def position_at(self, seconds: float) -> int:
+        """
+        The first entry at or after ``seconds`` from the start of the recording,
+        found by bisecting the index; timestamps are assumed not to go backwards.
+        """
+        start = self.start_time
+        if start is None:
+            return 0
+        return bisect.bisect_left(_Timestamps(self), start + seconds)
+
+    def payload_bytes(self, position: int) -> bytes:
+        """The undecoded JSON payload of an entry."""
+        offset = self._index_entry(position)[0]
+        length = _ENTRY.unpack_from(self._map, offset)[0]
+        start = offset + _ENTRY.size
+        return self._map[start:start + length]
+
+def json_to_binary(source: Union[str, Path], destination: Union[str, Path]) -> int:
+    """Convert any recording ``recordings`` can read into a binary one; returns the entry count."""
+    from .recordings import iter_recording
+
+    with BinaryRecordingWriter(destination) as writer:
+        for record in iter_recording(Path(source)):
+            writer.write_record(record)
+    return writer.count
+
+def binary_to_json(source: Union[str, Path], destination: Union[str, Path], lines: bool = False) -> int:
+    """
+    Convert a binary recording back into a JSON array (or JSON lines with
+    ``lines``); entries without a timestamp are written without one.
+    """
+    count = 0
+    with BinaryRecording(source) as recording, open(destination, "w") as f:
+        if not lines:
+            f.write("[")
+        for entry in recording:
+            if entry["timestamp"] is None:
+                del entry["timestamp"]
+            if lines:
+                f.write(json.dumps(entry) + "\n")
+            else:
+                f.write(("," if count else "") + "\n  " + json.dumps(entry))
+            count += 1
+        if not lines:
+            f.write("\n]\n" if count else "]\n")
+    return count
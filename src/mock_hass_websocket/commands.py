@@ -0,0 +1,66 @@
+"""
+Validation of client commands against the Home Assistant models.
+
+Every incoming message is checked by one pre-built ``TypeAdapter`` over the
+``ClientMessage`` discriminated union: pydantic-core picks the model from the
+``type`` field and validates it in a single pass, instead of trying each model
+in turn. Invalid commands are answered the way Home Assistant does, with an
+unsuccessful ``result`` carrying an ``ErrorInfo``.
+
+In ``lenient`` mode values are coerced and command types without a model are
+let through, so scripts can use commands the mock doesn't know about. In
+``strict`` mode no coercion takes place and unknown commands are rejected.
+"""
+import typing
+from typing import Any, Optional
+from pydantic import TypeAdapter, ValidationError
+from .models import ClientMessage, ErrorInfo, ResultMessage
+
+CLIENT_MESSAGES: TypeAdapter = TypeAdapter(ClientMessage)
+
+# The discriminator values, for the unknown-command check
+COMMAND_TYPES = frozenset(
+    model.model_fields["type"].default for model in typing.get_args(typing.get_args(ClientMessage)[0])
+)
+
+# Error codes of homeassistant.components.websocket_api.const
+ERR_INVALID_FORMAT = "invalid_format"
+ERR_UNKNOWN_COMMAND = "unknown_command"
+
+def _describe(error: ValidationError) -> str:
+    parts = []
+    for detail in error.errors(include_url=False):
+        # The first location element is the union tag
+        location = ".".join(str(part) for part in detail["loc"][1:])
+        parts.append(f"{detail['msg']} @ {location}" if location else detail["msg"])
+    return "; ".join(parts)
+
+def error_result(msg_id: Any, code: str, message: str) -> ResultMessage:
+    # Home Assistant answers malformed messages without an id too; 0 stands in for it
+    return ResultMessage(
+        id=msg_id if isinstance(msg_id, int) else 0,
+        success=False,
+        error=ErrorInfo(code=code, message=message),
+    )
+
+class CommandValidator:
+    """Checks client messages, returning the error result for invalid ones."""
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+
+    def check(self, data: Any) -> Optional[ResultMessage]:
+        """Return ``None`` if ``data`` is acceptable, else the result to answer it with."""
+        if not isinstance(data, dict):
+            return error_result(None, ERR_INVALID_FORMAT, "Message incorrectly formatted.")
+        msg_type = data.get("type")
+        if msg_type not in COMMAND_TYPES:
+            if not self.strict:
+                return None
+            if not isinstance(data.get("id"), int):
+                return error_result(data.get("id"), ERR_INVALID_FORMAT, "Message incorrectly formatted.")
+            return error_result(data["id"], ERR_UNKNOWN_COMMAND, "Unknown command.")
+        try:
+            CLIENT_MESSAGES.validate_python(data, strict=self.strict)
+        except ValidationError as e:
+            return error_result(data.get("id"), ERR_INVALID_FORMAT, _describe(e))
+        return None
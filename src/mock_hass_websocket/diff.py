@@ -0,0 +1,201 @@
+import json
+from collections import Counter
+from itertools import zip_longest
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from pydantic import BaseModel
+from .recordings import iter_records
+
+# Paths ignored by default: wall-clock timestamps never reproduce between runs.
+DEFAULT_IGNORE = ("timestamp",)
+
+# Convenience presets for common sources of run-to-run noise.
+IGNORE_PRESETS = {
+    "timestamps": ("timestamp", "payload.**.time_fired", "payload.**.last_changed", "payload.**.last_updated", "payload.**.last_reported"),
+    "ids": ("payload.id",),
+    "context": ("payload.**.context",),
+}
+
+_MISSING = object()
+
+class Difference(BaseModel):
+    """A single divergence between two recordings."""
+    index: int
+    path: str
+    expected: Any = None
+    actual: Any = None
+    reason: str
+
+    def __str__(self) -> str:
+        return f"entry {self.index} at {self.path or '<root>'}: {self.reason} (expected {self.expected!r}, got {self.actual!r})"
+
+class IgnoreRules:
+    """
+    Compiled set of dotted ignore paths.
+
+    Each path segment is a key, ``*`` (any single key or list index) or ``**``
+    (any number of levels). For example ``payload.**.context`` drops every
+    ``context`` object anywhere inside a payload.
+    """
+    def __init__(self, paths: Iterable[str] = DEFAULT_IGNORE):
+        self.patterns: List[Tuple[str, ...]] = []
+        for path in paths:
+            path = IGNORE_PRESETS.get(path, (path,))
+            for p in path:
+                self.patterns.append(tuple(p.split(".")))
+
+    def _states(self, states: List[Tuple[Tuple[str, ...], int]], key: str) -> Tuple[List[Tuple[Tuple[str, ...], int]], bool]:
+        """Advance pattern positions over one key; report whether any pattern is complete."""
+        advanced = []
+        done = False
+        for pattern, pos in states:
+            seg = pattern[pos]
+            if seg == "**":
+                # '**' may swallow this key (stay) or match nothing (skip ahead)
+                if pos + 1 == len(pattern):
+                    done = True
+                    continue
+                advanced.append((pattern, pos))
+                if pos + 1 < len(pattern) and pattern[pos + 1] in (key, "*"):
+                    if pos + 2 == len(pattern):
+                        done = True
+                    else:
+                        advanced.append((pattern, pos + 2))
+            elif seg == key or seg == "*":
+                if pos + 1 == len(pattern):
+                    done = True
+                else:
+                    advanced.append((pattern, pos + 1))
+        return advanced, done
+
+    def normalise(self, value: Any) -> Any:
+        """Return ``value`` with every ignored path removed."""
+        if not self.patterns:
+            return value
+        return self._strip(value, [(p, 0) for p in self.patterns])
+
+    def _strip(self, value: Any, states: List[Tuple[Tuple[str, ...], int]]) -> Any:
+        if not states:
+            return value
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                next_states, done = self._states(states, str(key))
+                if not done:
+                    result[key] = self._strip(item, next_states)
+            return result
+        if isinstance(value, list):
+            result = []
+            for index, item in enumerate(value):
+                next_states, done = self._states(states, str(index))
+                if not done:
+                    result.append(self._strip(item, next_states))
+            return result
+        return value
+
+def _compare(expected: Any, actual: Any, path: str) -> Iterator[Tuple[str, Any, Any, str]]:
+    """Yield structural differences between two JSON values."""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        for key, value in expected.items():
+            sub = f"{path}.{key}" if path else str(key)
+            if key not in actual:
+                yield sub, value, None, "missing key"
+            else:
+                yield from _compare(value, actual[key], sub)
+        for key in actual.keys() - expected.keys():
+            sub = f"{path}.{key}" if path else str(key)
+            yield sub, None, actual[key], "unexpected key"
+    elif isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            yield path, len(expected), len(actual), "list length differs"
+        for index, (e, a) in enumerate(zip(expected, actual)):
+            yield from _compare(e, a, f"{path}[{index}]")
+    elif type(expected) is not type(actual) and not (_is_number(expected) and _is_number(actual)):
+        yield path, expected, actual, "type differs"
+    elif expected != actual:
+        yield path, expected, actual, "value differs"
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+def diff_recordings(
+    expected: Iterable[Any],
+    actual: Iterable[Any],
+    ignore: Iterable[str] = DEFAULT_IGNORE,
+    ordered: bool = True,
+    max_diffs: Optional[int] = 1,
+) -> List[Difference]:
+    """
+    Compare two recordings entry by entry.
+
+    Both inputs are consumed as streams, so memory stays bounded in ordered
+    mode. Comparison stops once ``max_diffs`` differences have been collected
+    (``None`` collects all). With ``ordered=False`` the recordings are compared
+    as multisets, which suits messages whose relative order is not deterministic;
+    this mode hashes canonical encodings and is still linear time.
+    """
+    rules = ignore if isinstance(ignore, IgnoreRules) else IgnoreRules(ignore)
+    differences: List[Difference] = []
+
+    def full() -> bool:
+        return max_diffs is not None and len(differences) >= max_diffs
+
+    if ordered:
+        for index, (e, a) in enumerate(zip_longest(expected, actual, fillvalue=_MISSING)):
+            if e is _MISSING:
+                differences.append(Difference(index=index, path="", actual=rules.normalise(a), reason="unexpected extra entry"))
+            elif a is _MISSING:
+                differences.append(Difference(index=index, path="", expected=rules.normalise(e), reason="missing entry"))
+            else:
+                ne, na = rules.normalise(e), rules.normalise(a)
+                if ne == na:
+                    continue
+                for path, ev, av, reason in _compare(ne, na, ""):
+                    differences.append(Difference(index=index, path=path, expected=ev, actual=av, reason=reason))
+                    if full():
+                        break
+            if full():
+                break
+        return differences
+
+    counts: Counter = Counter()
+    first_seen: Dict[str, Tuple[int, Any]] = {}
+    for index, e in enumerate(expected):
+        key = _canonical(rules.normalise(e))
+        counts[key] += 1
+        first_seen.setdefault(key, (index, e))
+    extras: List[Tuple[int, Any]] = []
+    for index, a in enumerate(actual):
+        key = _canonical(rules.normalise(a))
+        if counts[key] > 0:
+            counts[key] -= 1
+        else:
+            extras.append((index, a))
+            if max_diffs is not None and len(extras) >= max_diffs:
+                break
+    for index, a in extras:
+        differences.append(Difference(index=index, path="", actual=rules.normalise(a), reason="unexpected entry"))
+    if not full():
+        for key, remaining in counts.items():
+            if remaining > 0:
+                index, e = first_seen[key]
+                differences.append(Difference(index=index, path="", expected=rules.normalise(e), reason=f"missing entry (x{remaining})"))
+                if full():
+                    break
+    return differences
+
+def diff_files(
+    expected_path: Path,
+    actual_path: Path,
+    ignore: Iterable[str] = DEFAULT_IGNORE,
+    ordered: bool = True,
+    max_diffs: Optional[int] = 1,
+) -> List[Difference]:
+    """Stream two recording files from disk and diff them."""
+    return diff_recordings(iter_records(expected_path), iter_records(actual_path), ignore=ignore, ordered=ordered, max_diffs=max_diffs)
+
+def format_differences(differences: Sequence[Difference]) -> str:
+    return "\n".join(str(d) for d in differences)
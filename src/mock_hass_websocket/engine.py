@@ -1,10 +1,18 @@
 import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
 from websockets.asyncio.server import ServerConnection
 from websockets.exceptions import ConnectionClosed
-from .models import Script, SendInteraction, ExpectInteraction, InteractionLog
+from .models import Script, SendInteraction, ExpectInteraction, SetStateInteraction, InteractionLog, EventMessage, ResultMessage
+from .templates import TemplateContext, compile_template
+from .loader import ScriptStream
+from .states import StateStore, new_context, send_encoded, utc_now
+from .faults import FaultyConnection
+from .commands import CommandValidator
+from .expectations import Expectations
+from .tracing import Tracer, describe, reaction
 
 logger = logging.getLogger(__name__)
 
@@ -35,27 +43,70 @@ def deep_match(received: Any, expected: Any) -> bool:
         return received == expected
 
 class Engine:
-    def __init__(self, script: Script):
+    def __init__(
+        self,
+        script: Union[Script, ScriptStream],
+        history_limit: Optional[int] = None,
+        lookahead: int = 8,
+        tracer: Optional[Tracer] = None,
+    ):
         self.script = script
+        self.history_limit = history_limit
+        self.lookahead = lookahead
         self.start_time = 0
-        self.packet_queue = asyncio.Queue()
-        self.history: List[InteractionLog] = []
+        self.expectations = Expectations(deep_match)
+        self.history: List[InteractionLog] = self._new_history()
+        self.template_context = TemplateContext(script.variables, script.seed)
+        # Only scenarios with initial states answer get_states themselves; a
+        # store created for REST calls or set_state items doesn't turn that on
+        self.answers_get_states = getattr(script, "states", None) is not None
+        self.states = self._new_states()
+        self._played = False
+        self.subscriptions: Dict[int, Optional[str]] = {}
+        self.validator: Optional[CommandValidator] = None
+        # The client connection of the current run, for changes made over REST
+        self.connection: Optional[ServerConnection] = None
+        # Opt-in timing spans; the position and last send give spans their context
+        self.tracer = tracer
+        self._session = 0
+        self._cursor = 0
+        self._last_send: Optional[Dict[str, Any]] = None
 
     async def run(self, websocket: ServerConnection):
         """Run the engine for a connected client."""
         self.start_time = asyncio.get_event_loop().time()
-        self.history = [] # Reset history on run
+        self.history = self._new_history() # Reset history on run
+        self.template_context = TemplateContext(self.script.variables, self.script.seed)
+        if self._played and self.answers_get_states:
+            # Later runs start from the scenario's states again; changes made
+            # over REST before the first run, or to a stateless home, are kept
+            self.states = self._new_states()
+        self._played = True
+        self.subscriptions = {}
+        self.expectations = Expectations(deep_match)
+        mode = getattr(self.script, "validate_commands", "off")
+        self.validator = CommandValidator(strict=mode == "strict") if mode != "off" else None
+        faults = getattr(self.script, "faults", None)
+        if faults is not None:
+            websocket = FaultyConnection(websocket, faults)
+        self.connection = websocket
+        self._last_send = None
+        if self.tracer is not None:
+            self._session = self.tracer.new_session()
         
         # Start receiver task
         receiver_task = asyncio.create_task(self._receiver_loop(websocket))
         
         try:
             # Execute script sequentially
-            for item in self.script.items:
+            for index, item in enumerate(self._prefetch(self.script.items)):
+                self._cursor = index
                 if isinstance(item, SendInteraction):
                     await self._handle_send(websocket, item)
                 elif isinstance(item, ExpectInteraction):
                     await self._handle_expect(item)
+                elif isinstance(item, SetStateInteraction):
+                    await self._handle_set_state(websocket, item)
                     
             logger.info("Script execution completed successfully.")
             
@@ -64,69 +115,243 @@ class Engine:
             raise
         finally:
             receiver_task.cancel()
+            # Let it finish, so the caller can go on reading the connection
+            await asyncio.gather(receiver_task, return_exceptions=True)
+            if faults is not None:
+                # The script's fault wrapper would otherwise go on reading the socket
+                await websocket.stop_receiving()
+            self.expectations.close()
+
+    def _new_history(self):
+        # A bounded history keeps memory constant for long streamed scenarios.
+        if self.history_limit:
+            return deque(maxlen=self.history_limit)
+        return []
+
+    def _new_states(self) -> Optional[StateStore]:
+        states = getattr(self.script, "states", None)
+        return StateStore(states) if states is not None else None
+
+    def _prefetch(self, items: Iterable) -> Iterator:
+        """Yield items while keeping the next `lookahead` ones already decoded."""
+        window = deque()
+        for item in items:
+            window.append(item)
+            if len(window) > self.lookahead:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
 
     async def _handle_send(self, websocket: ServerConnection, item: SendInteraction):
-        """Handle sending an event."""
-        now = asyncio.get_event_loop().time()
-        target_time = self.start_time + (item.at_ms / 1000.0)
-        delay = target_time - now
-        
+        """Handle sending an event (or each repetition of it)."""
+        template = None
+        if item.template:
+            if item._compiled is None:
+                item._compiled = compile_template(item.payload)
+            template = item._compiled
+
+        # In-process transports take Python objects directly, skipping JSON entirely.
+        passthrough = getattr(websocket, "passthrough", False)
+
+        for index in range(item.repeat):
+            now = asyncio.get_event_loop().time()
+            target_time = self.start_time + ((item.at_ms + index * item.interval_ms) / 1000.0)
+            delay = target_time - now
+
+            if delay > 0:
+                logger.debug(f"Waiting {delay:.3f}s to send message")
+                await asyncio.sleep(delay)
+
+            if template is not None:
+                self.template_context.index = index
+                if passthrough:
+                    payload = template.render_payload(self.template_context)
+                else:
+                    text, payload = template.render(self.template_context)
+            else:
+                payload = item.payload
+                text = None if passthrough else json.dumps(payload)
+
+            # Lazy %-formatting: rendering every payload would dominate high-rate streams.
+            logger.info("Sending: %s", payload)
+            started = asyncio.get_event_loop().time()
+            await websocket.send(payload if passthrough else text)
+            if self.tracer is not None:
+                sent = asyncio.get_event_loop().time()
+                self.tracer.add(
+                    "send", "send", self._session, started, sent,
+                    index=self._cursor, repeat=index, at_ms=item.at_ms,
+                    late_ms=round((started - target_time) * 1000.0, 3),
+                    bytes=len(text) if text is not None else None,
+                )
+                self._last_send = {"index": self._cursor, "time": sent}
+            self.history.append(InteractionLog(
+                timestamp=asyncio.get_event_loop().time(),
+                direction="sent",
+                payload=payload
+            ))
+
+    async def _handle_set_state(self, websocket: ServerConnection, item: SetStateInteraction):
+        """Apply a state change and send state_changed to the subscribers."""
+        delay = self.start_time + item.at_ms / 1000.0 - asyncio.get_event_loop().time()
         if delay > 0:
-            logger.debug(f"Waiting {delay:.3f}s to send message")
             await asyncio.sleep(delay)
-        
-        logger.info(f"Sending: {item.payload}")
-        await websocket.send(json.dumps(item.payload))
+
+        started = asyncio.get_event_loop().time()
+        await self.set_state(websocket, item.entity_id, item.state, item.attributes, item.subscription)
+        if self.tracer is not None:
+            end = asyncio.get_event_loop().time()
+            self.tracer.add("set_state", "set_state", self._session, started, end, index=self._cursor, entity_id=item.entity_id)
+            self._last_send = {"index": self._cursor, "time": end}
+
+    def state_store(self) -> StateStore:
+        if self.states is None:
+            # Scripts without initial states start from an empty home
+            self.states = StateStore()
+        return self.states
+
+    async def set_state(
+        self,
+        websocket: Optional[ServerConnection],
+        entity_id: str,
+        state: Any,
+        attributes: Optional[Dict[str, Any]] = None,
+        subscription: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Change an entity and send ``state_changed`` to the subscribers on ``websocket``.
+
+        Events go to ``subscription`` if given, else to every ``state_changed``
+        subscription of the client. Returns the new state.
+        """
+        states = self.state_store()
+        old = states.encoded(entity_id) if entity_id in states else None
+        old_state, new_state = states.set_state(entity_id, state, attributes)
+        logger.info("Set %s to %s", entity_id, new_state["state"])
+        if websocket is None:
+            return new_state
+
+        if subscription is not None:
+            targets = [subscription]
+        else:
+            targets = self._subscribers("state_changed")
+        passthrough = getattr(websocket, "passthrough", False)
+        for subscription in targets:
+            event = states.state_changed_event(subscription, old_state, new_state).model_dump()
+            if passthrough:
+                await websocket.send(event)
+            else:
+                # Reuses the cached state encodings instead of dumping the event
+                await send_encoded(websocket, states.encode_state_changed(subscription, entity_id, old))
+            self.history.append(InteractionLog(
+                timestamp=asyncio.get_event_loop().time(),
+                direction="sent",
+                payload=event
+            ))
+        return new_state
+
+    async def fire_event(self, websocket: Optional[ServerConnection], event_type: str, data: Optional[Dict[str, Any]] = None):
+        """Send an event to the client's subscriptions for ``event_type``."""
+        if websocket is None:
+            return
+        passthrough = getattr(websocket, "passthrough", False)
+        for subscription in self._subscribers(event_type):
+            event = EventMessage(id=subscription, event={
+                "event_type": event_type,
+                "data": data or {},
+                "origin": "REMOTE",
+                "time_fired": utc_now(),
+                "context": new_context(),
+            }).model_dump()
+            await websocket.send(event if passthrough else json.dumps(event))
+            self.history.append(InteractionLog(
+                timestamp=asyncio.get_event_loop().time(),
+                direction="sent",
+                payload=event
+            ))
+
+    def _subscribers(self, event_type: str) -> List[int]:
+        return [sub for sub, subscribed in self.subscriptions.items() if subscribed in (None, event_type)]
+
+    async def _handle_expect(self, item: ExpectInteraction):
+        """Handle expecting an event."""
+        logger.info(f"Expecting: {item.match} within {item.timeout_ms}ms (relative to now)")
+        started = asyncio.get_event_loop().time()
+        try:
+            message = await self.expectations.expect(item.match, item.timeout_ms / 1000.0)
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout waiting for expectation: {item.match}")
+            self._trace_expect(item, started, timed_out=True)
+            raise
+        logger.info(f"Matched expectation: {message}")
+        self._trace_expect(item, started, timed_out=False)
+
+    def _trace_expect(self, item: ExpectInteraction, started: float, timed_out: bool):
+        if self.tracer is None:
+            return
+        end = asyncio.get_event_loop().time()
+        self.tracer.add(
+            describe(item.match), "expect", self._session, started, end,
+            index=self._cursor, match=item.match, timeout_ms=item.timeout_ms, timed_out=timed_out,
+            inspected=self.expectations.inspected, queue_depth=self.expectations.queue_depth,
+            **({} if timed_out else reaction(self._last_send, end)),
+        )
+
+    def _track_subscription(self, data: Dict[str, Any]):
+        """Remember event subscriptions so state changes can be delivered to them."""
+        if data.get("type") == "subscribe_events":
+            self.subscriptions[data["id"]] = data.get("event_type")
+        elif data.get("type") == "unsubscribe_events":
+            self.subscriptions.pop(data.get("subscription"), None)
+
+    async def _answer_get_states(self, websocket: ServerConnection, msg_id: Any):
+        """Answer get_states from the state store; the request still reaches expectations."""
+        await self.states.send_result(websocket, msg_id)
+        logger.info("Sent get_states result with %d states", len(self.states))
+        # The message as sent, so replay and diff see it. The list shares the
+        # store's state dicts, which are replaced on change rather than updated.
         self.history.append(InteractionLog(
             timestamp=asyncio.get_event_loop().time(),
             direction="sent",
-            payload=item.payload
+            payload={"id": msg_id, "type": "result", "success": True, "result": self.states.snapshot()}
         ))
 
-    async def _handle_expect(self, item: ExpectInteraction):
-        """Handle expecting an event."""
-        logger.info(f"Expecting: {item.match} within {item.timeout_ms}ms (relative to now)")
-        
-        timeout = item.timeout_ms / 1000.0
-        start_wait = asyncio.get_event_loop().time()
-        
-        while True:
-            # Calculate remaining time
-            elapsed = asyncio.get_event_loop().time() - start_wait
-            remaining = timeout - elapsed
-            
-            if remaining <= 0:
-                raise asyncio.TimeoutError(f"Expected {item.match} but timed out after {item.timeout_ms}ms")
-            
-            try:
-                # Wait for next message from queue
-                message = await asyncio.wait_for(self.packet_queue.get(), timeout=remaining)
-                
-                # Check if it matches
-                if deep_match(message, item.match):
-                    logger.info(f"Matched expectation: {message}")
-                    return
-                else:
-                    logger.warning(f"Received message {message} did not match expected {item.match}, skipping...")
-                    pass
-                    
-            except asyncio.TimeoutError:
-                logger.error(f"Timeout waiting for expectation: {item.match}")
-                raise
+    async def _reject(self, websocket: ServerConnection, data: Any, error: ResultMessage):
+        """Answer an invalid command with its error result."""
+        logger.warning("Rejected invalid command %s: %s", data, error.error.message)
+        payload = error.model_dump()
+        await websocket.send(payload if getattr(websocket, "passthrough", False) else json.dumps(payload))
+        self.history.append(InteractionLog(
+            timestamp=asyncio.get_event_loop().time(),
+            direction="sent",
+            payload=payload
+        ))
 
     async def _receiver_loop(self, websocket: ServerConnection):
         """Loop to receive messages and put them in queue."""
         try:
             async for message in websocket:
                 try:
-                    data = json.loads(message)
-                    logger.info(f"Received: {data}")
+                    data = json.loads(message) if isinstance(message, (str, bytes)) else message
+                    logger.info("Received: %s", data)
                     self.history.append(InteractionLog(
                         timestamp=asyncio.get_event_loop().time(),
                         direction="received",
                         payload=data
                     ))
-                    await self.packet_queue.put(data)
+                    if self.validator is not None:
+                        error = self.validator.check(data)
+                        if error is not None:
+                            # Rejected commands never reach expectations
+                            await self._reject(websocket, data, error)
+                            continue
+                    if isinstance(data, dict) and isinstance(data.get("id"), int):
+                        self.template_context.last_id = data["id"]
+                        self._track_subscription(data)
+                    if self.answers_get_states and isinstance(data, dict) and data.get("type") == "get_states":
+                        await self._answer_get_states(websocket, data.get("id"))
+                    # After any automatic answer, so a script finishing on this match can't cut it off
+                    self.expectations.deliver(data)
                 except json.JSONDecodeError:
                     logger.error(f"Received invalid JSON: {message}")
         except asyncio.CancelledError:
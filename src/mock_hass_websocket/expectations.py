@@ -0,0 +1,121 @@
+"""
+Pending expectations of a session.
+
+Received messages are handed to ``Expectations.deliver`` by the engine's
+receiver loop and matched on the spot against the waiting expectation, whose
+future is resolved directly. Deadlines are kept in one heap per session with a
+single timer armed for the earliest of them, so no task or timer handle is
+created per received message.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _Waiter:
+    __slots__ = ("match", "future", "deadline", "timeout", "inspected")
+
+    def __init__(self, match: Any, future: asyncio.Future, deadline: float, timeout: float, inspected: int):
+        self.match = match
+        self.future = future
+        self.deadline = deadline
+        self.timeout = timeout
+        self.inspected = inspected
+
+class Expectations:
+    """
+    Matches received messages against the expectations waiting for them.
+
+    Messages arriving while nothing is waiting are kept, in order, for the
+    next expectation. A message that doesn't match the expectation examining
+    it is skipped, as the engine has always done. ``inspected`` and
+    ``queue_depth`` describe the most recent expectation: the messages it
+    examined, and how many were queued when it started.
+    """
+    def __init__(self, matcher: Callable[[Any, Any], bool]):
+        self.matcher = matcher
+        self.backlog: Deque[Any] = deque()
+        self._waiters: Deque[_Waiter] = deque()
+        self._deadlines: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at: Optional[float] = None
+        self.inspected = 0
+        self.queue_depth = 0
+
+    def deliver(self, message: Any):
+        """Hand a received message to the waiting expectation, or keep it for the next one."""
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                self._waiters.popleft()
+                continue
+            waiter.inspected += 1
+            if self.matcher(message, waiter.match):
+                self._waiters.popleft()
+                waiter.future.set_result(message)
+            else:
+                logger.warning(f"Received message {message} did not match expected {waiter.match}, skipping...")
+            return
+        self.backlog.append(message)
+
+    async def expect(self, match: Any, timeout: float) -> Any:
+        """Wait up to ``timeout`` seconds for a message matching ``match`` and return it."""
+        self.queue_depth = len(self.backlog)
+        self.inspected = 0
+        while self.backlog:
+            message = self.backlog.popleft()
+            self.inspected += 1
+            if self.matcher(message, match):
+                return message
+            logger.warning(f"Received message {message} did not match expected {match}, skipping...")
+
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(match, loop.create_future(), loop.time() + timeout, timeout, self.inspected)
+        self._waiters.append(waiter)
+        # Settled expectations leave their deadline behind; drop those at the front
+        while self._deadlines and self._deadlines[0][2].future.done():
+            heapq.heappop(self._deadlines)
+        heapq.heappush(self._deadlines, (waiter.deadline, next(self._sequence), waiter))
+        if self._timer_at is None or waiter.deadline < self._timer_at:
+            self._arm(loop, waiter.deadline)
+        try:
+            return await waiter.future
+        finally:
+            self.inspected = waiter.inspected
+            if not waiter.future.done():
+                # Cancelled: the waiter is dropped lazily by deliver() and the timer
+                waiter.future.cancel()
+
+    def _arm(self, loop: asyncio.AbstractEventLoop, when: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._expire)
+        self._timer_at = when
+
+    def _expire(self):
+        self._timer = self._timer_at = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self._deadlines:
+            deadline, _, waiter = self._deadlines[0]
+            if waiter.future.done():
+                heapq.heappop(self._deadlines)
+            elif deadline <= now:
+                heapq.heappop(self._deadlines)
+                waiter.future.set_exception(asyncio.TimeoutError(
+                    f"Expected {waiter.match} but timed out after {waiter.timeout * 1000:.0f}ms"
+                ))
+            else:
+                self._arm(loop, deadline)
+                return
+
+    def close(self):
+        """Stop the timer; pending expectations are left to their callers."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = self._timer_at = None
@@ -0,0 +1,222 @@
+"""
+Network fault injection.
+
+``FaultyConnection`` wraps any connection the Engine can run on (the aiohttp
+adapter, the in-process transport, a websockets connection) and degrades it
+according to a ``FaultConfig``: per-message latency, a bandwidth cap, dropped
+and duplicated messages, and forced disconnects at fixed times.
+
+Every random decision is drawn from a generator seeded by ``FaultConfig.seed``,
+in message order and separately for each direction, so a given seed drops,
+duplicates and delays the same messages on every run.
+"""
+import asyncio
+import json
+import logging
+import random
+from collections import Counter
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from .models import FaultConfig
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+class FaultScheduler:
+    """Seeded source of fault decisions for one direction of a connection."""
+    def __init__(self, config: FaultConfig, direction: str):
+        self.config = config
+        # String seeds hash deterministically, unlike tuples
+        self.rng = random.Random(f"{config.seed}:{direction}" if config.seed is not None else None)
+
+    def decide(self) -> Tuple[bool, bool, float]:
+        """Return ``(dropped, duplicated, latency_s)`` for the next message."""
+        # Both are always drawn, so changing one rate never shifts the other's sequence
+        drop = self.rng.random() < self.config.drop_rate
+        duplicate = self.rng.random() < self.config.duplicate_rate
+        return drop, duplicate, self._latency() / 1000.0
+
+    def _latency(self) -> float:
+        c = self.config
+        if c.distribution == "uniform":
+            value = self.rng.uniform(c.latency_ms - c.jitter_ms, c.latency_ms + c.jitter_ms)
+        elif c.distribution == "normal":
+            value = self.rng.gauss(c.latency_ms, c.jitter_ms)
+        elif c.distribution == "exponential":
+            value = c.latency_ms + (self.rng.expovariate(1.0 / c.jitter_ms) if c.jitter_ms else 0.0)
+        else:
+            value = c.latency_ms
+        return max(value, 0.0)
+
+def _size(data: Any) -> int:
+    if isinstance(data, (str, bytes, bytearray, memoryview)):
+        return len(data)
+    return len(json.dumps(data))
+
+class FaultyConnection:
+    """
+    A connection wrapper that injects faults into a healthy link.
+
+    Delayed messages keep their order, as on a real TCP link: each message is
+    delivered no earlier than the one before it. ``stats`` counts the faults
+    injected so far (``dropped``, ``duplicated``, ``delayed``, ``disconnects``).
+    """
+    def __init__(self, websocket: Any, config: FaultConfig):
+        self.websocket = websocket
+        self.config = config
+        self.remote_address = getattr(websocket, "remote_address", None)
+        self.passthrough = getattr(websocket, "passthrough", False)
+        self.stats: Counter = Counter()
+        self._send_faults = FaultScheduler(config, "send") if config.direction in ("send", "both") else None
+        self._receive_faults = FaultScheduler(config, "receive") if config.direction in ("receive", "both") else None
+        self._loop = asyncio.get_running_loop()
+        self._link_free_at = 0.0
+        self._last_delivery = 0.0
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._pending = 0
+        self._error: Optional[BaseException] = None
+        self._tasks: List[asyncio.Task] = [
+            asyncio.create_task(self._disconnect_after(at_ms / 1000.0)) for at_ms in config.disconnect_at_ms
+        ]
+        if hasattr(websocket, "wait_closed"):
+            self._tasks.append(asyncio.create_task(self._cleanup_when_closed()))
+        self._sender: Optional[asyncio.Task] = None
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._pump: Optional[asyncio.Task] = None
+        # The message taken from the inbox and still waiting out its latency
+        self._held: Optional[Tuple[float, Any]] = None
+
+    async def send(self, data: Any):
+        await self._transmit(data, self.websocket.send)
+
+    async def send_encoded(self, data: bytes):
+        send = getattr(self.websocket, "send_encoded", None)
+        if send is None:
+            data = data.decode()
+            send = self.websocket.send
+        await self._transmit(data, send)
+
+    async def _transmit(self, data: Any, send: Callable[[Any], Awaitable[None]]):
+        if self._error is not None:
+            raise self._error
+        copies = 1
+        latency = 0.0
+        if self._send_faults is not None:
+            dropped, duplicated, latency = self._send_faults.decide()
+            if dropped:
+                self.stats["dropped"] += 1
+                logger.info("Fault: dropped outgoing message")
+                return
+            if duplicated:
+                self.stats["duplicated"] += 1
+                copies = 2
+
+        now = self._loop.time()
+        ready = now
+        if self.config.bandwidth_bps:
+            # Messages queue behind each other for the link
+            self._link_free_at = max(self._link_free_at, now) + _size(data) * copies / self.config.bandwidth_bps
+            ready = self._link_free_at
+        deliver_at = max(ready + latency, self._last_delivery)
+        self._last_delivery = deliver_at
+
+        if deliver_at <= now and self._pending == 0:
+            for _ in range(copies):
+                await send(data)
+            return
+        self.stats["delayed"] += 1
+        if isinstance(data, (bytearray, memoryview)):
+            # The sender may reuse its buffer before this frame goes out
+            data = bytes(data)
+        for _ in range(copies):
+            self._pending += 1
+            self._outbox.put_nowait((deliver_at, data, send))
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._deliver())
+            self._tasks.append(self._sender)
+
+    async def _deliver(self):
+        while True:
+            deliver_at, data, send = await self._outbox.get()
+            delay = deliver_at - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await send(data)
+            except Exception as e:
+                # Surface the failure on the next send, like a broken socket would
+                self._error = e
+                return
+            finally:
+                self._pending -= 1
+
+    async def __aiter__(self):
+        if self._receive_faults is None:
+            async for message in self.websocket:
+                yield message
+            return
+
+        # One pump per connection: a reader that stops early (the auth phase,
+        # a cancelled receiver) leaves what was already read for the next one
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._pump_messages())
+            self._tasks.append(self._pump)
+        while True:
+            if self._held is None:
+                self._held = await self._inbox.get()
+            deliver_at, message = self._held
+            if message is _END:
+                return
+            delay = deliver_at - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._held = None
+            yield message
+
+    async def _pump_messages(self):
+        """Read the underlying connection, timestamping arrivals before any delay."""
+        last = 0.0
+        try:
+            async for message in self.websocket:
+                dropped, duplicated, latency = self._receive_faults.decide()
+                if dropped:
+                    self.stats["dropped"] += 1
+                    logger.info("Fault: dropped incoming message")
+                    continue
+                last = max(self._loop.time() + latency, last)
+                self._inbox.put_nowait((last, message))
+                if duplicated:
+                    self.stats["duplicated"] += 1
+                    self._inbox.put_nowait((last, message))
+        finally:
+            self._inbox.put_nowait((0.0, _END))
+
+    async def stop_receiving(self):
+        """Stop reading the underlying connection, so another reader can take over."""
+        if self._pump is not None:
+            self._pump.cancel()
+            await asyncio.gather(self._pump, return_exceptions=True)
+
+    async def _disconnect_after(self, delay: float):
+        await asyncio.sleep(delay)
+        self.stats["disconnects"] += 1
+        logger.info(f"Fault: forcing disconnect of {self.remote_address}")
+        await self.websocket.close()
+
+    async def _cleanup_when_closed(self):
+        await self.websocket.wait_closed()
+        self.cancel()
+
+    def cancel(self):
+        """Stop pending deliveries and scheduled disconnects."""
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+
+    async def close(self):
+        self.cancel()
+        await self.websocket.close()
+
+    async def wait_closed(self):
+        await self.websocket.wait_closed()
@@ -1,19 +1,200 @@
+import json
 import yaml
 from pathlib import Path
-from .models import Script, SendInteraction, ExpectInteraction
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from pydantic import TypeAdapter, ValidationError
+from .models import Script, ScriptItem, SendInteraction, ExpectInteraction, SetStateInteraction, FaultConfig
+from .templates import check_variables
+
+Interaction = Union[SendInteraction, ExpectInteraction, SetStateInteraction]
+
+# Built once: pydantic-core validates a whole document, or one streamed item, in a single pass.
+SCRIPT: TypeAdapter = TypeAdapter(Script)
+INTERACTION: TypeAdapter = TypeAdapter(ScriptItem)
+
+# The C parser is several times faster when libyaml is available.
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_HEADER_KEYS = ("seed", "states", "faults", "validate_commands")
+_TAGS = frozenset(("send", "expect", "set_state"))
+
+class ScriptError(ValueError):
+    """A scenario that doesn't validate; the message lists every problem and where it is."""
+
+def _describe(error: ValidationError, prefix: Tuple[Any, ...] = ()) -> str:
+    problems = []
+    for detail in error.errors(include_url=False):
+        location = []
+        for part in prefix + detail["loc"]:
+            # pydantic puts the union tag after each item index
+            if location and isinstance(location[-1], int) and part in _TAGS:
+                continue
+            location.append(part)
+        if location and location[0] == "items":
+            location[0] = "script"
+        path = "".join(f"[{part}]" if isinstance(part, int) else f".{part}" for part in location).lstrip(".")
+        if detail["type"] in ("union_tag_invalid", "union_tag_not_found"):
+            message = f"Unknown interaction type: {detail['input'].get('type') if isinstance(detail['input'], dict) else None}"
+        elif detail["type"] == "model_attributes_type" and path.startswith("script["):
+            message = f"Interaction must be a mapping, got {type(detail['input']).__name__}"
+        else:
+            message = detail["msg"]
+        problems.append(f"{path}: {message}" if path else message)
+    return "; ".join(problems)
+
+def build_interaction(item: Any, index: Optional[int] = None) -> Interaction:
+    """Build an interaction model from its parsed mapping; ``index`` locates it in error messages."""
+    if isinstance(item, (SendInteraction, ExpectInteraction, SetStateInteraction)):
+        return item
+    try:
+        return INTERACTION.validate_python(item)
+    except ValidationError as e:
+        raise ScriptError(_describe(e, ("items", index) if index is not None else ())) from e
 
 def load_script(path: Path) -> Script:
-    """Load script from a YAML file."""
+    """Load script from a YAML file, validating it in one pass."""
     with open(path, "r") as f:
-        data = yaml.safe_load(f)
-    
-    interactions = []
-    for item in data.get("script", []):
-        if item.get("type") == "send":
-            interactions.append(SendInteraction(**item))
-        elif item.get("type") == "expect":
-            interactions.append(ExpectInteraction(**item))
-        else:
-            raise ValueError(f"Unknown interaction type: {item.get('type')}")
-            
-    return Script(items=interactions)
+        data = yaml.load(f, Loader=_YamlLoader) or {}
+
+    document = {"items": data.get("script") or [], "variables": data.get("variables") or {}}
+    for key in _HEADER_KEYS:
+        if key in data:
+            document[key] = data[key]
+    try:
+        return SCRIPT.validate_python(document)
+    except ValidationError as e:
+        raise ScriptError(f"{path}: {_describe(e)}") from e
+
+class ScriptStream:
+    """
+    A script whose interactions are produced lazily.
+
+    ``factory`` is called once per engine run and must return a fresh iterable of
+    interactions (models or mappings), so a generator function works directly.
+    Only the interactions currently being scheduled are ever held in memory.
+    """
+    def __init__(
+        self,
+        factory: Callable[[], Iterable[Any]],
+        variables: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+        states: Optional[List[Dict[str, Any]]] = None,
+        faults: Optional[FaultConfig] = None,
+        validate_commands: str = "off",
+    ):
+        self.factory = factory
+        self.variables = variables or {}
+        try:
+            check_variables(self.variables)
+        except ValueError as e:
+            raise ScriptError(f"variables: {e}") from e
+        self.seed = seed
+        self.states = states
+        self.faults = FaultConfig(**faults) if isinstance(faults, dict) else faults
+        self.validate_commands = validate_commands
+
+    @property
+    def items(self) -> "ScriptStream":
+        return self
+
+    def __iter__(self) -> Iterator[Interaction]:
+        for index, item in enumerate(self.factory()):
+            yield build_interaction(item, index)
+
+def _iter_yaml(path: Path) -> Iterator[Tuple[str, Any]]:
+    """
+    Walk a scenario YAML file event by event.
+
+    Yields ``("header", (key, value))`` for top-level keys and ``("item", mapping)``
+    for each entry of the ``script`` sequence, composing one entry at a time.
+    """
+    with open(path, "r") as f:
+        loader = yaml.SafeLoader(f)
+        try:
+            loader.get_event()  # StreamStart
+            if loader.check_event(yaml.StreamEndEvent):
+                return
+            loader.get_event()  # DocumentStart
+            if not loader.check_event(yaml.MappingStartEvent):
+                raise ValueError(f"Scenario {path} must be a mapping")
+            loader.get_event()
+            while not loader.check_event(yaml.MappingEndEvent):
+                key = loader.construct_document(loader.compose_node(None, None))
+                if key == "script" and loader.check_event(yaml.SequenceStartEvent):
+                    loader.get_event()
+                    while not loader.check_event(yaml.SequenceEndEvent):
+                        yield "item", loader.construct_document(loader.compose_node(None, None))
+                    loader.get_event()
+                else:
+                    yield "header", (key, loader.construct_document(loader.compose_node(None, None)))
+        finally:
+            loader.dispose()
+
+def _iter_jsonl(path: Path) -> Iterator[Tuple[str, Any]]:
+    """Walk a JSON-lines scenario: an optional header object, then one interaction per line."""
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON: {e}")
+            if isinstance(record, dict) and "type" not in record:
+                for key, value in record.items():
+                    yield "header", (key, value)
+            else:
+                yield "item", record
+
+def _reader_for(path: Path) -> Callable[[Path], Iterator[Tuple[str, Any]]]:
+    return _iter_jsonl if path.suffix in (".jsonl", ".ndjson") else _iter_yaml
+
+def stream_script(path: Path) -> ScriptStream:
+    """
+    Open a scenario for lazy consumption.
+
+    YAML files use the regular scenario layout (``variables``, ``seed``,
+    ``states``, ``faults`` and ``validate_commands`` must precede ``script``); ``.jsonl`` files hold one interaction per line.
+    """
+    path = Path(path)
+    reader = _reader_for(path)
+
+    header: Dict[str, Any] = {}
+    records = reader(path)
+    try:
+        for kind, value in records:
+            if kind == "item":
+                break
+            key, data = value
+            header[key] = data
+    finally:
+        records.close()
+
+    def factory() -> Iterator[Any]:
+        return (value for kind, value in reader(path) if kind == "item")
+
+    return ScriptStream(factory, variables=header.get("variables") or {}, seed=header.get("seed"), states=header.get("states"), faults=header.get("faults"), validate_commands=header.get("validate_commands", "off"))
+
+class ScriptCache:
+    """
+    Parsed scenarios shared by every engine that plays them.
+
+    Scripts are keyed by resolved path, so instances of a topology that serve
+    the same scenario parse and validate it once. Streamed scenarios are cached
+    as their ``ScriptStream``, which re-reads the file on each run anyway.
+    """
+    def __init__(self):
+        self._scripts: Dict[Tuple[Path, bool], Union[Script, ScriptStream]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scripts)
+
+    def get(self, path: Union[str, Path], stream: bool = False) -> Union[Script, ScriptStream]:
+        path = Path(path)
+        stream = stream or path.suffix in (".jsonl", ".ndjson")
+        key = (path.resolve(), stream)
+        script = self._scripts.get(key)
+        if script is None:
+            script = self._scripts[key] = stream_script(path) if stream else load_script(path)
+        return script
@@ -1,18 +1,281 @@
 import typer
 import asyncio
 from pathlib import Path
-from .server import start_server
+from typing import List, Optional
+from .server import start_server, STREAM_HISTORY_LIMIT
 
+# Subcommands import their dependencies (engine, models, aiohttp) lazily so
+# that `--help` and light commands start quickly.
 app = typer.Typer()
 
-@app.command()
+@app.callback(invoke_without_command=True)
 def main(
-    config: Path = typer.Option(..., "-c", "--config", help="Path to the YAML scenario file."),
+    ctx: typer.Context,
+    config: Optional[Path] = typer.Option(None, "-c", "--config", help="Path to the YAML scenario file."),
     host: str = typer.Option("127.0.0.1", help="Host to bind to."),
     port: int = typer.Option(8123, help="Port to bind to."),
+    stream: bool = typer.Option(False, help="Read the scenario lazily instead of loading it up front."),
+    unix: Optional[Path] = typer.Option(None, help="Listen on this Unix domain socket instead of host/port."),
+    compress: bool = typer.Option(True, help="Accept permessage-deflate when the client offers it."),
+    compress_level: Optional[int] = typer.Option(None, min=0, max=9, help="zlib compression level (default: fastest)."),
+    compress_window: Optional[int] = typer.Option(None, min=9, max=15, help="Compression window bits, at most what the client negotiated."),
+    compress_threshold: int = typer.Option(0, min=0, help="Send messages smaller than this many bytes uncompressed."),
+    binary: bool = typer.Option(False, help="Send messages as binary frames instead of text frames."),
+    faults: Optional[Path] = typer.Option(None, help="YAML file of network faults (latency, drops, disconnects) to inject."),
+    resume_grace_ms: int = typer.Option(0, min=0, help="Let clients with a client_id or token resume their session this long after disconnecting."),
+    max_sessions: Optional[int] = typer.Option(None, min=1, help="Serve at most this many websocket sessions at once; further handshakes queue."),
+    accept_rate: Optional[float] = typer.Option(None, min=0.001, help="Accept at most this many websocket handshakes per second."),
+    accept_burst: int = typer.Option(10, min=1, help="Handshakes accepted back to back before --accept-rate applies."),
+    max_queue: Optional[int] = typer.Option(None, min=0, help="Answer HTTP 503 once this many handshakes are waiting."),
+    native_auth: bool = typer.Option(False, help="Answer the auth phase natively; the scenario starts after auth_ok."),
+    high_throughput: bool = typer.Option(False, help="Tune HTTP for heavy REST polling: large backlog, long keep-alive, no access log."),
+    backlog: Optional[int] = typer.Option(None, min=1, help="Pending connections the listening socket queues."),
+    keepalive_timeout: Optional[float] = typer.Option(None, min=0, help="Seconds an idle keep-alive connection stays open."),
+    access_log: Optional[bool] = typer.Option(None, "--access-log/--no-access-log", help="Log a line per HTTP request."),
+    reuse_port: bool = typer.Option(False, help="Set SO_REUSEPORT so several servers can share the port."),
+    trace: Optional[Path] = typer.Option(None, help="Write per-interaction timing spans to this Chrome trace file on shutdown."),
+    profile: Optional[Path] = typer.Option(None, help="Profile the server into this directory and serve /admin/profile/* controls."),
+    profile_cpu: bool = typer.Option(True, help="With --profile, capture a CPU profile from startup to shutdown."),
+    profile_memory: bool = typer.Option(False, help="With --profile, trace allocations and write the process's memory growth during each session."),
 ):
     """Run the mock Home Assistant websocket server."""
-    asyncio.run(start_server(host, port, config))
+    if ctx.invoked_subcommand is not None:
+        return
+    if config is None:
+        raise typer.BadParameter("Missing option '--config'.", param_hint="'-c' / '--config'")
+    import yaml
+    from .models import AdmissionConfig, FaultConfig, HttpOptions, WebsocketOptions
+
+    ws_options = WebsocketOptions(
+        compress=compress,
+        compress_level=compress_level,
+        window_bits=compress_window,
+        compress_threshold=compress_threshold,
+        binary=binary,
+    )
+    fault_config = None
+    if faults is not None:
+        with open(faults) as f:
+            fault_config = FaultConfig(**(yaml.safe_load(f) or {}))
+    admission = None
+    if max_sessions or accept_rate or max_queue is not None or native_auth:
+        admission = AdmissionConfig(
+            max_sessions=max_sessions,
+            accept_rate=accept_rate,
+            accept_burst=accept_burst,
+            max_queue=max_queue,
+            native_auth=native_auth,
+        )
+    http_settings = {
+        name: value
+        for name, value in (("backlog", backlog), ("keepalive_timeout", keepalive_timeout), ("access_log", access_log))
+        if value is not None
+    }
+    if reuse_port:
+        http_settings["reuse_port"] = True
+    http_options = None
+    if high_throughput:
+        http_options = HttpOptions.high_throughput(**http_settings)
+    elif http_settings:
+        http_options = HttpOptions(**http_settings)
+    profiler = None
+    if profile is not None:
+        from .profiling import Profiler
+        profiler = Profiler(profile, cpu=profile_cpu, memory=profile_memory)
+    asyncio.run(start_server(
+        host, port, config,
+        stream=stream,
+        unix_path=str(unix) if unix else None,
+        ws_options=ws_options,
+        faults=fault_config,
+        resume_grace_ms=resume_grace_ms or None,
+        admission=admission,
+        http_options=http_options,
+        trace_path=trace,
+        profiler=profiler,
+    ))
+
+@app.command()
+def replay(
+    recording: Path = typer.Argument(..., help="Recording (JSON array or JSON lines) to replay."),
+    host: str = typer.Option("127.0.0.1", help="Host to bind to."),
+    port: int = typer.Option(8123, help="Port to bind to."),
+    speed: float = typer.Option(1.0, help="Time compression factor, e.g. 100 replays 100x faster."),
+    expect_timeout_ms: int = typer.Option(5000, help="Timeout for each expectation built from a received message."),
+    expect: bool = typer.Option(True, help="Turn received messages into expectations (disable for pure load tests)."),
+    strip_key: List[str] = typer.Option([], help="Top-level key to drop from expectations, e.g. 'id'. Repeatable."),
+):
+    """Serve a recorded session: sent messages are replayed, received ones are expected."""
+    from .engine import Engine
+    from .replay import replay_script
+
+    script = replay_script(recording, speed=speed, expect_timeout_ms=expect_timeout_ms, expect=expect, strip_keys=strip_key)
+    engine = Engine(script, history_limit=STREAM_HISTORY_LIMIT)
+    asyncio.run(start_server(host, port, recording, engine=engine))
+
+@app.command()
+def diff(
+    expected: Path = typer.Argument(..., help="Reference recording."),
+    actual: Path = typer.Argument(..., help="Recording to check."),
+    ignore: List[str] = typer.Option(["timestamp"], help="Dotted path to ignore ('*' and '**' wildcards, or a preset: timestamps, ids, context). Repeatable."),
+    ordered: bool = typer.Option(True, help="Require entries in the same order (--no-ordered compares as multisets)."),
+    max_diffs: int = typer.Option(10, help="Stop after this many differences (0 for all)."),
+):
+    """Compare two recordings and report where they diverge."""
+    from .diff import diff_files, format_differences
+
+    differences = diff_files(expected, actual, ignore=ignore, ordered=ordered, max_diffs=max_diffs or None)
+    if differences:
+        typer.echo(format_differences(differences))
+        raise typer.Exit(1)
+    typer.echo("Recordings match.")
+
+@app.command()
+def topology(
+    topology_file: Path = typer.Argument(..., help="YAML file describing the virtual Home Assistant instances."),
+    host: str = typer.Option("127.0.0.1", help="Host to bind to."),
+    port: int = typer.Option(8123, help="Shared port; instances without a port of their own are served under /NAME on it."),
+):
+    """Serve several virtual Home Assistant instances from one process."""
+    from .topology import load_topology, serve_topology
+
+    asyncio.run(serve_topology(load_topology(topology_file), host, port))
+
+@app.command()
+def convert(
+    source: Path = typer.Argument(..., help="Recording to convert (JSON array, JSON lines or binary)."),
+    destination: Path = typer.Argument(..., help="File to write; a .mhrec suffix writes the binary format."),
+    lines: bool = typer.Option(False, help="Write JSON lines instead of a JSON array."),
+):
+    """Convert recordings between JSON and the indexed binary format."""
+    from .binary_recordings import SUFFIX, binary_to_json, is_binary_recording, json_to_binary
+
+    if destination.suffix == SUFFIX:
+        count = json_to_binary(source, destination)
+    elif is_binary_recording(source):
+        count = binary_to_json(source, destination, lines=lines)
+    else:
+        raise typer.BadParameter("Convert JSON recordings to a .mhrec file, or .mhrec files to JSON.", param_hint="'DESTINATION'")
+    typer.echo(f"Wrote {count} entries to {destination}")
+
+def _pattern(text: str) -> object:
+    import json
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+@app.command()
+def stats(
+    recording: Path = typer.Argument(..., help="Recording or saved history (JSON array, JSON lines or binary)."),
+    group_by: List[str] = typer.Option([], help="Dotted payload path to count by, e.g. 'domain'. Repeatable."),
+    bucket: Optional[float] = typer.Option(None, min=0.001, help="Also count per time bucket of this many seconds."),
+    direction: Optional[str] = typer.Option(None, help="Only count 'sent' or 'received' entries."),
+    msg_type: Optional[str] = typer.Option(None, "--type", help="Only count entries of this message type."),
+    where: List[str] = typer.Option([], help="Only count entries with PATH=VALUE (VALUE parsed as JSON if it can be). Repeatable."),
+    pair_from: Optional[str] = typer.Option(None, help="JSON pattern of sent entries starting a delay."),
+    pair_to: Optional[str] = typer.Option(None, help="JSON pattern of received entries ending it."),
+    pairing: str = typer.Option("latest", help="'latest': an end answers the most recent start; 'fifo': the oldest unanswered one."),
+    pair_group_by: List[str] = typer.Option([], help="Dotted path of the start entry to report delays by. Repeatable."),
+    json_output: bool = typer.Option(False, "--json", help="Print the results as JSON."),
+):
+    """Aggregate a recording in one streaming pass: counts by payload values and time, and delays between paired messages."""
+    import json
+    from .stats import Counts, Filter, Pairs, aggregate_file, format_rows
+
+    conditions = {}
+    for condition in where:
+        path, sep, value = condition.partition("=")
+        if not sep:
+            raise typer.BadParameter(f"Expected PATH=VALUE, got {condition!r}", param_hint="'--where'")
+        conditions[path] = _pattern(value)
+    if msg_type is not None:
+        conditions["type"] = msg_type
+    if (pair_from is None) != (pair_to is None):
+        raise typer.BadParameter("--pair-from and --pair-to go together.", param_hint="'--pair-from' / '--pair-to'")
+    if pairing not in ("latest", "fifo"):
+        raise typer.BadParameter("Pairing is 'latest' or 'fifo'.", param_hint="'--pairing'")
+
+    counts = Counts(group_by, bucket, Filter(direction, conditions))
+    aggregators = [counts]
+    pairs = None
+    if pair_from is not None:
+        pairs = Pairs(_pattern(pair_from), _pattern(pair_to), mode=pairing, group_by=pair_group_by)
+        aggregators.append(pairs)
+    total = aggregate_file(recording, aggregators)
+
+    if json_output:
+        result = {"entries": total, "counts": counts.rows()}
+        if pairs is not None:
+            result["delays_ms"] = pairs.rows()
+            result["unmatched"] = pairs.unmatched_ends
+        typer.echo(json.dumps(result, indent=2))
+        return
+    typer.echo(f"{total} entries")
+    typer.echo(format_rows(counts.rows()))
+    if pairs is not None:
+        typer.echo("")
+        typer.echo("Delays (ms):")
+        typer.echo(format_rows(pairs.rows()))
+        if pairs.unmatched_ends:
+            typer.echo(f"{pairs.unmatched_ends} matching end entries had no start")
+
+@app.command()
+def check(
+    paths: List[Path] = typer.Argument(..., help="Scenario files, or directories of them."),
+    timeline: bool = typer.Option(False, help="Print each scenario's step-by-step timeline."),
+    json_output: bool = typer.Option(False, "--json", help="Print the analysis as JSON, longest scenario first."),
+    strict: bool = typer.Option(False, help="Fail on warnings as well as errors."),
+    verbose: bool = typer.Option(False, "-v", "--verbose", help="Also list informational notes, such as sends that may slip."),
+):
+    """Analyse scenarios without running them: timeline, expected runtime and impossible steps."""
+    import json
+    from .analysis import analyse_file, format_timeline, longest_first, scenario_files
+
+    timelines = longest_first(analyse_file(path, keep_steps=timeline) for path in scenario_files(paths))
+    if json_output:
+        typer.echo(json.dumps([t.model_dump() if timeline else t.summary() for t in timelines], indent=2))
+    else:
+        for t in timelines:
+            typer.echo(f"{t.name}: expected {t.expected_ms}ms, worst case {t.worst_ms}ms, critical path {t.critical_path}")
+            for issue in t.issues:
+                if issue.severity != "info" or verbose:
+                    typer.echo(f"  {issue}")
+            if timeline and t.steps:
+                typer.echo(format_timeline(t))
+        total = sum(t.expected_ms for t in timelines)
+        typer.echo(f"{len(timelines)} scenario(s), {total}ms expected in total")
+    failing = ("error", "warning") if strict else ("error",)
+    if any(issue.severity in failing for t in timelines for issue in t.issues):
+        raise typer.Exit(1)
+
+@app.command("run-suite")
+def run_suite(
+    paths: List[Path] = typer.Argument(..., help="Scenario files, or directories of them."),
+    workers: int = typer.Option(1, min=1, help="Processes to spread the scenarios over, longest first."),
+    concurrency: Optional[int] = typer.Option(None, min=1, help="Most scenarios running at once in each worker (default: all)."),
+    recordings: Optional[Path] = typer.Option(None, help="Directory of recordings each scenario's history must match."),
+    slack: float = typer.Option(5.0, min=0, help="Seconds allowed beyond a scenario's worst-case duration before it fails as hung."),
+    junit: Optional[Path] = typer.Option(None, help="Write a JUnit XML report here."),
+    json_report: Optional[Path] = typer.Option(None, "--json", help="Write a JSON report here."),
+):
+    """Run many scenarios concurrently, each against a client playing its counterpart."""
+    from .suite import run_suite as run
+
+    report = run(paths, workers=workers, recordings=recordings, concurrency=concurrency, slack_s=slack)
+    for result in report.results:
+        typer.echo(f"{result.status.upper():<6} {result.name} {result.seconds:.3f}s (expected {result.expected_ms / 1000.0:.3f}s, worker {result.worker})")
+        if result.message:
+            typer.echo(f"       {result.message}")
+    counts = report.counts()
+    typer.echo(f"{counts['passed']} passed, {counts['failed']} failed, {counts['error']} errors in {report.seconds:.3f}s on {report.workers} worker(s)")
+    if junit is not None:
+        report.write_junit(junit)
+    if json_report is not None:
+        report.write_json(json_report)
+    if not report.ok:
+        raise typer.Exit(1)
 
 if __name__ == "__main__":
     app()
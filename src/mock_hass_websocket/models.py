@@ -1,5 +1,6 @@
-from typing import Any, List, Optional, Union, Literal, Dict
-from pydantic import BaseModel, Field
+from typing import Annotated, Any, List, Optional, Union, Literal, Dict
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, model_validator
+from .templates import check_variables, compile_template
 
 class Interaction(BaseModel):
     """Base class for all interactions."""
@@ -10,6 +11,17 @@ class SendInteraction(Interaction):
     type: Literal["send"]
     at_ms: int = Field(..., description="Time in milliseconds from start of connection to send this message.")
     payload: Any = Field(..., description="The JSON payload to send.")
+    template: bool = Field(False, description="Render ${...} placeholders in the payload before sending.")
+    repeat: int = Field(1, ge=1, description="Number of times to send the payload.")
+    interval_ms: int = Field(0, ge=0, description="Delay between repeated sends.")
+    _compiled: Any = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def _compile_template(self) -> "SendInteraction":
+        # A bad placeholder fails the scenario load, not the run that reaches it
+        if self.template:
+            self._compiled = compile_template(self.payload)
+        return self
 
 class ExpectInteraction(Interaction):
     """Event expected from the client."""
@@ -17,14 +29,93 @@ class ExpectInteraction(Interaction):
     timeout_ms: int = Field(..., description="Time in milliseconds to wait for this message relative to previous 'expect' or start.")
     match: Any = Field(..., description="Pattern to match against received message.")
 
+class SetStateInteraction(Interaction):
+    """Change an entity in the state store and notify state_changed subscribers."""
+    type: Literal["set_state"]
+    at_ms: int = Field(..., description="Time in milliseconds from start of connection to apply the change.")
+    entity_id: str
+    state: Any = Field(..., description="The new state value (stringified like Home Assistant does).")
+    attributes: Optional[Dict[str, Any]] = Field(None, description="Replacement attributes; unchanged when omitted.")
+    subscription: Optional[int] = Field(None, description="Event id to use; defaults to every state_changed subscription of the client.")
+
 class InteractionLog(BaseModel):
     """Record of an interaction that occurred."""
     timestamp: float
     direction: Literal["sent", "received"]
     payload: Any
 
+class FaultConfig(BaseModel):
+    """Degraded-link settings applied to a connection; all randomness comes from ``seed``."""
+    seed: Optional[int] = Field(None, description="Seed for the fault scheduler; fixes every drop, duplicate and delay.")
+    latency_ms: float = Field(0, ge=0, description="Base one-way delay per message.")
+    jitter_ms: float = Field(0, ge=0, description="Spread of the latency distribution.")
+    distribution: Literal["constant", "uniform", "normal", "exponential"] = Field("constant", description="Shape of the latency around latency_ms.")
+    bandwidth_bps: Optional[int] = Field(None, gt=0, description="Link capacity in bytes per second.")
+    drop_rate: float = Field(0, ge=0, le=1, description="Probability that a message is lost.")
+    duplicate_rate: float = Field(0, ge=0, le=1, description="Probability that a message is delivered twice.")
+    disconnect_at_ms: List[int] = Field(default_factory=list, description="Times after connecting at which the connection is forcibly closed.")
+    direction: Literal["send", "receive", "both"] = Field("send", description="Which messages latency, drops and duplicates apply to.")
+
+# A script entry, keyed on ``type``
+ScriptItem = Annotated[Union[SendInteraction, ExpectInteraction, SetStateInteraction], Field(discriminator="type")]
+
 class Script(BaseModel):
-    items: List[Union[SendInteraction, ExpectInteraction]] = Field(default_factory=list)
+    items: List[ScriptItem] = Field(default_factory=list)
+    variables: Dict[str, Any] = Field(default_factory=dict, description="Values available to payload templates.")
+    seed: Optional[int] = Field(None, description="Seed for the template random number generator.")
+    states: Optional[List[Dict[str, Any]]] = Field(None, description="Initial entity states; when set, get_states is answered from them.")
+    faults: Optional[FaultConfig] = Field(None, description="Network faults injected into every connection running this script.")
+    validate_commands: Literal["off", "lenient", "strict"] = Field("off", description="Check client commands against the Home Assistant models and answer invalid ones with an error result.")
+
+    @field_validator("variables")
+    @classmethod
+    def _check_variables(cls, variables: Dict[str, Any]) -> Dict[str, Any]:
+        check_variables(variables)
+        return variables
+
+class WebsocketOptions(BaseModel):
+    """Server-side websocket framing and compression settings."""
+    compress: bool = Field(True, description="Offer permessage-deflate when the client requests it.")
+    compress_level: Optional[int] = Field(None, ge=0, le=9, description="zlib level; defaults to aiohttp's fastest setting.")
+    window_bits: Optional[int] = Field(None, ge=9, le=15, description="Compression window; capped by what the client negotiated.")
+    compress_threshold: int = Field(0, ge=0, description="Messages shorter than this many bytes are sent uncompressed.")
+    binary: bool = Field(False, description="Send messages as binary frames instead of text frames.")
+    max_msg_size: int = Field(4 * 1024 * 1024, ge=0, description="Largest accepted client message in bytes (0 for unlimited).")
+
+class HttpOptions(BaseModel):
+    """Listening socket and HTTP server settings."""
+    backlog: int = Field(128, ge=1, description="Pending connections the listening socket queues.")
+    keepalive_timeout: Optional[float] = Field(None, ge=0, description="Seconds an idle keep-alive connection stays open; aiohttp's default when omitted.")
+    access_log: bool = Field(True, description="Log a line per HTTP request.")
+    reuse_port: bool = Field(False, description="Set SO_REUSEPORT so several servers can share the port.")
+
+    @classmethod
+    def high_throughput(cls, **overrides: Any) -> "HttpOptions":
+        """Settings for clients that poll the REST API as fast as they can."""
+        return cls(**{"backlog": 4096, "keepalive_timeout": 300, "access_log": False, **overrides})
+
+class AdmissionConfig(BaseModel):
+    """Limits on incoming websocket sessions, and the native auth phase."""
+    max_sessions: Optional[int] = Field(None, ge=1, description="Most websocket sessions served at once; unlimited when omitted.")
+    accept_rate: Optional[float] = Field(None, gt=0, description="Handshakes accepted per second; unlimited when omitted.")
+    accept_burst: int = Field(10, ge=1, description="Handshakes accepted back to back before accept_rate applies.")
+    max_queue: Optional[int] = Field(None, ge=0, description="Most handshakes waiting for admission; further ones get HTTP 503.")
+    queue_timeout_ms: int = Field(30000, ge=0, description="How long a handshake may wait for admission before getting HTTP 503.")
+    native_auth: bool = Field(False, description="Answer the auth phase natively; scripts then start after auth_ok.")
+    tokens: Optional[List[str]] = Field(None, description="Access tokens accepted by the native auth phase; any token when omitted.")
+
+class InstanceConfig(BaseModel):
+    """One virtual Home Assistant of a topology."""
+    scenario: Optional[str] = Field(None, description="Scenario served at the instance's /api/websocket.")
+    sessions: Dict[str, str] = Field(default_factory=dict, description="Further scenarios by session id, served under the instance's /session/{id}/.")
+    stream: bool = Field(False, description="Read the instance's scenarios lazily.")
+    port: Optional[int] = Field(None, ge=0, description="Serve the instance on its own port instead of under /{name} of the shared one.")
+    native_auth: bool = Field(False, description="Answer the auth phase natively; implied by tokens.")
+    tokens: Optional[List[str]] = Field(None, description="Access tokens this instance accepts.")
+
+class TopologyConfig(BaseModel):
+    """Several virtual Home Assistant instances served by one process."""
+    instances: Dict[str, InstanceConfig] = Field(default_factory=dict)
 
 
 # --- Home Assistant WebSocket API Models ---
@@ -126,6 +217,30 @@ class GetServicesForTargetMessage(HACommand):
     target: Dict[str, Any]
     expand_group: Optional[bool] = None
 
+# Everything a client may send, keyed on ``type``
+ClientMessage = Annotated[
+    Union[
+        AuthMessage,
+        SupportedFeaturesMessage,
+        SubscribeEventsMessage,
+        UnsubscribeEventsMessage,
+        SubscribeTriggerMessage,
+        FireEventMessage,
+        CallServiceMessage,
+        GetStatesMessage,
+        GetConfigMessage,
+        GetServicesMessage,
+        GetPanelsMessage,
+        PingMessage,
+        ValidateConfigMessage,
+        ExtractFromTargetMessage,
+        GetTriggersForTargetMessage,
+        GetConditionsForTargetMessage,
+        GetServicesForTargetMessage,
+    ],
+    Field(discriminator="type"),
+]
+
 # Command Phase (Server -> Client)
 class ErrorInfo(BaseModel):
     code: str
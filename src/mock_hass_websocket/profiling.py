@@ -0,0 +1,241 @@
+"""
+Profiling hooks for a running server.
+
+A ``Profiler`` writes everything it captures into one directory:
+
+* cProfile captures (``cpu-N.prof``), started and stopped at will; open them
+  with ``python -m pstats`` or snakeviz.
+* tracemalloc snapshots (``memory-N.txt``), either of the whole process or of
+  how much it grew while one session was open. tracemalloc can't tell
+  sessions apart, so the growth includes whatever concurrent sessions
+  allocated, and every connection takes a full snapshot of the heap: keep
+  the number of clients small while profiling memory.
+* hot-path counters (``counters.json``): matches of received messages against
+  expectations (``deep_match``, counted once per match however deep the
+  pattern), JSON encode and decode time in the engine, and websocket sends
+  with their bytes and time.
+
+The counters are installed by swapping the engine's ``Expectations`` and
+``json`` and the adapter's send methods for counting versions, so code paths
+pay nothing while no profiler is installed.
+
+With ``admin=True`` the server exposes the controls over HTTP::
+
+    POST /admin/profile/start      start a cProfile capture
+    POST /admin/profile/stop       stop it and write cpu-N.prof
+    POST /admin/profile/memory     write a tracemalloc snapshot
+    GET  /admin/profile/counters   the hot-path counters as JSON
+"""
+import contextlib
+import cProfile
+import itertools
+import json
+import logging
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Frames kept per allocation; enough to tell callers apart
+TRACEMALLOC_FRAMES = 10
+MEMORY_TOP = 25
+
+class HotPathCounters:
+    """Call counts, and seconds spent, per hot-path operation."""
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.seconds: Counter = Counter()
+        self.bytes: Counter = Counter()
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {"calls": self.calls[name], "seconds": round(self.seconds[name], 6), "bytes": self.bytes[name]}
+            for name in sorted(self.calls)
+        }
+
+class _TimedJson:
+    """Stands in for the ``json`` module, timing ``dumps`` and ``loads``."""
+    def __init__(self, module, counters: HotPathCounters):
+        self._module = module
+        self._counters = counters
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._module, name)
+
+    def dumps(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._module.dumps(*args, **kwargs)
+        finally:
+            self._counters.calls["json_encode"] += 1
+            self._counters.seconds["json_encode"] += time.perf_counter() - start
+
+    def loads(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._module.loads(*args, **kwargs)
+        finally:
+            self._counters.calls["json_decode"] += 1
+            self._counters.seconds["json_decode"] += time.perf_counter() - start
+
+def _counting(function: Callable, counters: HotPathCounters, name: str) -> Callable:
+    def counted(*args, **kwargs):
+        counters.calls[name] += 1
+        return function(*args, **kwargs)
+    return counted
+
+def _counting_expectations(expectations: Callable, counters: HotPathCounters) -> Callable:
+    def create(matcher: Callable):
+        return expectations(_counting(matcher, counters, "deep_match"))
+    return create
+
+def _timed_send(send: Callable, counters: HotPathCounters) -> Callable:
+    async def timed(self, data):
+        start = time.perf_counter()
+        try:
+            return await send(self, data)
+        finally:
+            counters.calls["send"] += 1
+            counters.bytes["send"] += len(data)
+            counters.seconds["send"] += time.perf_counter() - start
+    return timed
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    # Leave out tracemalloc's own bookkeeping
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+class Profiler:
+    """CPU, memory and hot-path profiling of the server process; see the module docstring."""
+    def __init__(self, directory: Union[str, Path], cpu: bool = False, memory: bool = False, admin: bool = True):
+        self.directory = Path(directory)
+        self.cpu = cpu
+        self.memory = memory
+        self.admin = admin
+        self.counters = HotPathCounters()
+        self._cpu: Optional[cProfile.Profile] = None
+        self._numbers = itertools.count(1)
+        self._patches: List[Tuple[Any, str, Any]] = []
+        self._tracing_memory = False
+
+    def install(self):
+        """Create the output directory, install the counters and start the captures asked for."""
+        from . import engine
+        from .server import WebsocketAdapter
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Count at the expectations' matcher: deep_match recursing into a pattern isn't another match
+        self._patch(engine, "Expectations", _counting_expectations(engine.Expectations, self.counters))
+        self._patch(engine, "json", _TimedJson(engine.json, self.counters))
+        # Sends are where the frames are written to the socket
+        self._patch(WebsocketAdapter, "_send", _timed_send(WebsocketAdapter._send, self.counters))
+        self._patch(WebsocketAdapter, "_send_utf8", _timed_send(WebsocketAdapter._send_utf8, self.counters))
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._tracing_memory = True
+        if self.cpu:
+            self.start_cpu()
+
+    def _patch(self, owner: Any, name: str, replacement: Any):
+        self._patches.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, replacement)
+
+    def uninstall(self):
+        for owner, name, original in reversed(self._patches):
+            setattr(owner, name, original)
+        self._patches.clear()
+
+    @property
+    def cpu_running(self) -> bool:
+        return self._cpu is not None
+
+    def start_cpu(self):
+        if self._cpu is not None:
+            raise RuntimeError("A CPU profile is already being captured")
+        self._cpu = cProfile.Profile()
+        self._cpu.enable()
+
+    def stop_cpu(self) -> Path:
+        """Stop the CPU capture and write it out, returning the file."""
+        if self._cpu is None:
+            raise RuntimeError("No CPU profile is being captured")
+        self._cpu.disable()
+        path = self.directory / f"cpu-{next(self._numbers)}.prof"
+        self._cpu.dump_stats(path)
+        self._cpu = None
+        logger.info(f"Wrote CPU profile to {path}")
+        return path
+
+    def snapshot_memory(self, label: str = "process", baseline: Optional[tracemalloc.Snapshot] = None) -> Path:
+        """Write the largest allocations (or growth since ``baseline``), returning the file."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory profiling is off")
+        snapshot = _take_snapshot()
+        if baseline is not None:
+            stats = snapshot.compare_to(baseline, "lineno")
+        else:
+            stats = snapshot.statistics("lineno")
+        path = self.directory / f"memory-{next(self._numbers)}.txt"
+        with open(path, "w") as f:
+            f.write(f"# {label}\n")
+            for stat in stats[:MEMORY_TOP]:
+                f.write(f"{stat}\n")
+        return path
+
+    @contextlib.asynccontextmanager
+    async def session(self, label: str) -> AsyncIterator[None]:
+        """Around a websocket session: with memory profiling, write how the process grew meanwhile."""
+        if not self.memory:
+            yield
+            return
+        baseline = _take_snapshot()
+        try:
+            yield
+        finally:
+            path = self.snapshot_memory(f"process growth during session {label}", baseline)
+            logger.info(f"Wrote process memory growth during session {label} to {path}")
+
+    def write_counters(self) -> Path:
+        path = self.directory / "counters.json"
+        with open(path, "w") as f:
+            json.dump(self.counters.as_dict(), f, indent=2)
+        return path
+
+    def close(self):
+        """Write out whatever is still being captured and remove the counters."""
+        if self._cpu is not None:
+            self.stop_cpu()
+        self.write_counters()
+        self.uninstall()
+        if self._tracing_memory:
+            tracemalloc.stop()
+            self._tracing_memory = False
+
+    def add_routes(self, router):
+        from aiohttp import web
+
+        def answer(action: Callable[[], Any]) -> Callable:
+            async def handler(request):
+                try:
+                    result = action()
+                except RuntimeError as e:
+                    return web.json_response({"message": str(e)}, status=409)
+                return web.json_response(result)
+            return handler
+
+        def stop():
+            return {"file": str(self.stop_cpu())}
+
+        def start():
+            self.start_cpu()
+            return {"message": "CPU profile started."}
+
+        router.add_post("/admin/profile/start", answer(start))
+        router.add_post("/admin/profile/stop", answer(stop))
+        router.add_post("/admin/profile/memory", answer(lambda: {"file": str(self.snapshot_memory())}))
+        router.add_get("/admin/profile/counters", answer(self.counters.as_dict))
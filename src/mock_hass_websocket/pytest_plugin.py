@@ -0,0 +1,163 @@
+"""
+Pytest plugin providing a shared mock Home Assistant server.
+
+One server is started per test session (per worker under pytest-xdist) on an
+ephemeral port, in a background thread with its own event loop so it works with
+both synchronous and asyncio tests. Each test gets isolated scenario sessions
+through the ``mock_hass`` fixture::
+
+    def test_my_app(mock_hass):
+        session = mock_hass("scenarios/3_motion_light.yaml")
+        run_app(session.url)          # HA base URL, websocket at session.ws_url
+        session.wait(timeout=10)      # raises if the script failed
+"""
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import pytest
+
+logger = logging.getLogger(__name__)
+
+STARTUP_TIMEOUT = 10.0
+
+
+class HassSession:
+    """A scenario registered on the shared server under its own URL prefix."""
+
+    def __init__(self, server: "MockHassServer", session_id: str, engine):
+        self.server = server
+        self.session_id = session_id
+        self.engine = engine
+        self._finished: concurrent.futures.Future = concurrent.futures.Future()
+
+    async def run(self, websocket):
+        """Run the engine for a connection, reporting the first outcome to waiters."""
+        try:
+            await self.engine.run(websocket)
+        except BaseException as e:
+            if not self._finished.done():
+                self._finished.set_exception(e)
+            raise
+        if not self._finished.done():
+            self._finished.set_result(self.engine.history)
+
+    @property
+    def url(self) -> str:
+        """Home Assistant base URL for this session."""
+        return f"http://{self.server.host}:{self.server.port}/session/{self.session_id}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.server.host}:{self.server.port}/session/{self.session_id}/api/websocket"
+
+    @property
+    def history(self):
+        return self.engine.history
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until the script has run to completion; re-raise its failure."""
+        return self._finished.result(timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None):
+        """Await script completion from an asyncio test."""
+        return await asyncio.wait_for(asyncio.wrap_future(self._finished), timeout)
+
+
+class MockHassServer:
+    """A mock server running in a background thread, hosting many sessions."""
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.host = host
+        self.port: Optional[int] = None
+        self.sessions: Dict[str, Any] = {}
+        self._ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._stop: Optional[asyncio.Future] = None
+
+    def start(self, timeout: float = STARTUP_TIMEOUT):
+        self._thread = threading.Thread(target=self._run, name="mock-hass", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("mock-hass server did not start in time")
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        from .server import MockHass
+
+        server = MockHass(host=self.host, port=0, sessions=self.sessions)
+        try:
+            await server.start()
+            self.port = server.port
+            self._stop = asyncio.get_running_loop().create_future()
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            await server.stop()
+            return
+        logger.info(f"Shared mock-hass server ready on {server.url}")
+        self._ready.set()
+        try:
+            await self._stop
+        finally:
+            await server.stop()
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(lambda: self._stop.done() or self._stop.set_result(None))
+        if self._thread is not None:
+            self._thread.join(STARTUP_TIMEOUT)
+
+    def add_session(self, scenario: Union[str, Path, Any], name: Optional[str] = None) -> HassSession:
+        """Register a scenario (path, ``Script`` or ``ScriptStream``) as a new session."""
+        from .engine import Engine
+        from .loader import load_script
+
+        script = load_script(Path(scenario)) if isinstance(scenario, (str, Path)) else scenario
+        session_id = f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name or 's')[:40]}-{next(self._ids)}"
+        session = HassSession(self, session_id, Engine(script))
+        self.sessions[session_id] = session
+        return session
+
+    def remove_session(self, session: HassSession):
+        self.sessions.pop(session.session_id, None)
+
+
+@pytest.fixture(scope="session")
+def mock_hass_server():
+    """The shared mock server (one per session, or per xdist worker)."""
+    server = MockHassServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mock_hass(mock_hass_server, request):
+    """Factory creating isolated scenario sessions on the shared server."""
+    created = []
+
+    def factory(scenario, name: Optional[str] = None) -> HassSession:
+        session = mock_hass_server.add_session(scenario, name=name or request.node.name)
+        created.append(session)
+        return session
+
+    yield factory
+    for session in created:
+        mock_hass_server.remove_session(session)
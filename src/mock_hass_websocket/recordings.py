@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, Optional
+
+CHUNK_SIZE = 1 << 16
+
+# Accepted spellings of the direction field, as seen from the server side.
+DIRECTIONS = {
+    "sent": "sent", "send": "sent", "out": "sent", "outgoing": "sent", "server": "sent",
+    "received": "received", "receive": "received", "recv": "received", "in": "received",
+    "incoming": "received", "client": "received",
+}
+PAYLOAD_KEYS = ("payload", "message", "msg", "data")
+TIMESTAMP_KEYS = ("timestamp", "time", "ts")
+
+def _skip_ws(buf: str, pos: int) -> int:
+    while pos < len(buf) and buf[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+def iter_json_array(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Any]:
+    """Incrementally decode the elements of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    state = "open"
+
+    while True:
+        pos = _skip_ws(buf, pos)
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Unexpected end of recording")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = chunk, 0
+            continue
+
+        if state == "open":
+            if buf[pos] != "[":
+                raise ValueError("Recording is not a JSON array")
+            pos += 1
+            state = "first"
+        elif state == "sep":
+            if buf[pos] == "]":
+                return
+            if buf[pos] != ",":
+                raise ValueError(f"Expected ',' in recording, found {buf[pos]!r}")
+            pos += 1
+            state = "value"
+        else:
+            if state == "first" and buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            if end is None or (end == len(buf) and not eof):
+                # The element continues past the buffered data.
+                if eof:
+                    raise ValueError("Invalid JSON in recording")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield value
+            pos = end
+            state = "sep"
+
+        if pos > chunk_size:
+            buf, pos = buf[pos:], 0
+
+def iter_records(path: Path) -> Iterator[Any]:
+    """Stream raw records from a JSON array, JSON-lines or binary recording."""
+    from .binary_recordings import BinaryRecording, is_binary_recording
+
+    if is_binary_recording(path):
+        with BinaryRecording(path) as recording:
+            for entry in recording:
+                if entry["timestamp"] is None:
+                    del entry["timestamp"]
+                yield entry
+        return
+    with open(path, "r") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if not head:
+            return
+        if head == "[":
+            yield from iter_json_array(_Prepend(head, f))
+            return
+        line = head + f.readline()
+        while line:
+            if line.strip():
+                yield json.loads(line)
+            line = f.readline()
+
+class _Prepend:
+    """File wrapper that replays already consumed characters first."""
+    def __init__(self, prefix: str, f: IO[str]):
+        self.prefix = prefix
+        self.f = f
+
+    def read(self, size: int) -> str:
+        if self.prefix:
+            data, self.prefix = self.prefix, ""
+            return data + self.f.read(max(size - len(data), 0))
+        return self.f.read(size)
+
+def normalise_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a recorded message into ``{"timestamp", "direction", "payload"}``.
+
+    Besides our own ``InteractionLog`` dumps this accepts common capture layouts
+    (``in``/``out`` directions, ``message``/``data`` payloads, JSON-encoded text).
+    """
+    if not isinstance(record, dict):
+        raise ValueError(f"Recording entry must be an object, got {type(record).__name__}")
+    direction = DIRECTIONS.get(str(record.get("direction", record.get("dir", ""))).lower())
+    if direction is None:
+        raise ValueError(f"Recording entry has no recognised direction: {record}")
+
+    payload: Any = None
+    for key in PAYLOAD_KEYS:
+        if key in record:
+            payload = record[key]
+            break
+    if isinstance(payload, (str, bytes)) and payload[:1] in ("{", "[", b"{", b"["):
+        try:
+            payload = json.loads(payload)
+        except json.JSONDecodeError:
+            pass
+
+    timestamp: Optional[float] = None
+    for key in TIMESTAMP_KEYS:
+        if record.get(key) is not None:
+            timestamp = float(record[key])
+            break
+
+    return {"timestamp": timestamp, "direction": direction, "payload": payload}
+
+def iter_recording(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream normalised records from a recording file."""
+    for record in iter_records(path):
+        yield normalise_record(record)
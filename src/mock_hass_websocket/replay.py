@@ -0,0 +1,58 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Sequence, Union
+from .loader import ScriptStream
+from .models import SendInteraction, ExpectInteraction
+from .recordings import iter_recording
+
+DEFAULT_EXPECT_TIMEOUT_MS = 5000
+
+def recording_to_interactions(
+    records: Iterable[Dict[str, Any]],
+    speed: float = 1.0,
+    expect_timeout_ms: int = DEFAULT_EXPECT_TIMEOUT_MS,
+    expect: bool = True,
+    strip_keys: Sequence[str] = (),
+) -> Iterator[Union[SendInteraction, ExpectInteraction]]:
+    """
+    Turn normalised recording records into script interactions.
+
+    Messages the server sent become timed sends (``at_ms`` is taken from the
+    record timestamps relative to the first record, divided by ``speed``);
+    messages the server received become expectations on the same payload, minus
+    any top-level ``strip_keys``. Records without timestamps are sent as soon
+    as the preceding interactions complete.
+    """
+    if speed <= 0:
+        raise ValueError("Replay speed must be positive")
+
+    start: Optional[float] = None
+    for record in records:
+        timestamp = record.get("timestamp")
+        if timestamp is not None and start is None:
+            start = timestamp
+        payload = record["payload"]
+
+        if record["direction"] == "sent":
+            at_ms = 0
+            if timestamp is not None:
+                at_ms = int((timestamp - start) * 1000.0 / speed)
+            yield SendInteraction(type="send", at_ms=at_ms, payload=payload)
+        elif expect:
+            if strip_keys and isinstance(payload, dict):
+                payload = {k: v for k, v in payload.items() if k not in strip_keys}
+            yield ExpectInteraction(type="expect", timeout_ms=expect_timeout_ms, match=payload)
+
+def replay_script(
+    path: Path,
+    speed: float = 1.0,
+    expect_timeout_ms: int = DEFAULT_EXPECT_TIMEOUT_MS,
+    expect: bool = True,
+    strip_keys: Sequence[str] = (),
+) -> ScriptStream:
+    """Build a lazily-read script that replays a recording file."""
+    def factory():
+        return recording_to_interactions(
+            iter_recording(path), speed=speed, expect_timeout_ms=expect_timeout_ms,
+            expect=expect, strip_keys=strip_keys,
+        )
+    return ScriptStream(factory)
@@ -0,0 +1,136 @@
+"""
+Home Assistant REST API emulation.
+
+The REST endpoints AppDaemon and other clients use are answered from the
+engine's state store, so state read or written over HTTP is the same state the
+websocket side serves: ``POST /api/states/{entity_id}`` notifies the client's
+``state_changed`` subscriptions and ``POST /api/events/{event_type}`` its event
+subscriptions. Every call is recorded in the engine's history as a received
+``{"type": "rest", ...}`` message.
+
+State reads carry an ETag built from the store's version counters, so clients
+polling with ``If-None-Match`` get an empty ``304 Not Modified`` until
+something changes, and the full state list is only re-encoded after a change.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Callable
+from aiohttp import web
+from .models import InteractionLog
+
+logger = logging.getLogger(__name__)
+
+def _etag_matches(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if header is None:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+def _message(text: str, status: int) -> web.Response:
+    return web.json_response({"message": text}, status=status)
+
+class RestApi:
+    """
+    REST routes for the engine that ``resolve`` returns for a request.
+
+    Objects without a state store (such as custom session runners) get the
+    empty JSON answers the mock gave before it emulated the API.
+    """
+    def __init__(self, resolve: Callable[[web.Request], Any]):
+        self.resolve = resolve
+
+    def add_routes(self, router: web.UrlDispatcher, prefix: str = ""):
+        router.add_get(f"{prefix}/api/", self.api_status)
+        router.add_get(f"{prefix}/api/states", self.get_states)
+        router.add_get(f"{prefix}/api/states/{{entity_id}}", self.get_state)
+        router.add_post(f"{prefix}/api/states/{{entity_id}}", self.post_state)
+        router.add_delete(f"{prefix}/api/states/{{entity_id}}", self.delete_state)
+        router.add_post(f"{prefix}/api/services/{{domain}}/{{service}}", self.call_service)
+        router.add_post(f"{prefix}/api/events/{{event_type}}", self.fire_event)
+
+    async def _begin(self, request: web.Request):
+        """Resolve the engine and record the call; returns ``(engine, body)``."""
+        # Sessions of the pytest plugin wrap their engine
+        session = self.resolve(request)
+        engine = getattr(session, "engine", session)
+        # Always read the body: unread payloads make the server reset the connection
+        raw = await request.read()
+        body = None
+        if raw:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                raise web.HTTPBadRequest(text=json.dumps({"message": "Invalid JSON specified."}), content_type="application/json")
+        if hasattr(engine, "history"):
+            engine.history.append(InteractionLog(
+                timestamp=asyncio.get_event_loop().time(),
+                direction="received",
+                payload={"type": "rest", "method": request.method, "path": request.path, "body": body},
+            ))
+        if not hasattr(engine, "state_store"):
+            raise web.HTTPOk(text="{}", content_type="application/json")
+        return engine, body
+
+    async def api_status(self, request: web.Request) -> web.Response:
+        await self._begin(request)
+        return _message("API running.", 200)
+
+    async def get_states(self, request: web.Request) -> web.Response:
+        engine, _ = await self._begin(request)
+        states = engine.state_store()
+        etag = f'"{states.tag}-{states.version}"'
+        if _etag_matches(request, etag):
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=await states.encoded_list(), content_type="application/json", headers={"ETag": etag})
+
+    async def get_state(self, request: web.Request) -> web.Response:
+        engine, _ = await self._begin(request)
+        states = engine.state_store()
+        entity_id = request.match_info["entity_id"]
+        if entity_id not in states:
+            return _message("Entity not found.", 404)
+        etag = f'"{states.tag}-{states.entity_version(entity_id)}"'
+        if _etag_matches(request, etag):
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=states.encoded(entity_id), content_type="application/json", headers={"ETag": etag})
+
+    async def post_state(self, request: web.Request) -> web.Response:
+        engine, body = await self._begin(request)
+        if not isinstance(body, dict) or "state" not in body:
+            return _message("No state specified.", 400)
+        entity_id = request.match_info["entity_id"]
+        existed = entity_id in engine.state_store()
+        try:
+            new_state = await engine.set_state(engine.connection, entity_id, body["state"], body.get("attributes"))
+        except Exception as e:
+            # The client may be gone; the store is updated regardless
+            logger.warning(f"Could not notify the client of {entity_id}: {e}")
+            new_state = engine.state_store().get(entity_id)
+        return web.json_response(
+            new_state,
+            status=200 if existed else 201,
+            headers={"Location": f"/api/states/{entity_id}"},
+        )
+
+    async def delete_state(self, request: web.Request) -> web.Response:
+        engine, _ = await self._begin(request)
+        if engine.state_store().remove(request.match_info["entity_id"]) is None:
+            return _message("Entity not found.", 404)
+        return _message("Entity removed.", 200)
+
+    async def call_service(self, request: web.Request) -> web.Response:
+        await self._begin(request)
+        # Services have no effect here; the call is only recorded
+        return web.json_response([])
+
+    async def fire_event(self, request: web.Request) -> web.Response:
+        engine, body = await self._begin(request)
+        event_type = request.match_info["event_type"]
+        try:
+            await engine.fire_event(engine.connection, event_type, body if isinstance(body, dict) else None)
+        except Exception as e:
+            logger.warning(f"Could not deliver event {event_type} to the client: {e}")
+        return _message(f"Event {event_type} fired.", 200)
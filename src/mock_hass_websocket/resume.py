@@ -0,0 +1,192 @@
+"""
+Reconnect-aware sessions.
+
+A client that identifies itself (``?client_id=``, an ``X-Client-Id`` header or
+an ``Authorization: Bearer`` token) gets a session that outlives its
+connection. If it reconnects within the grace window, the script carries on
+where it was: the cursor, pending expectations and received messages stay with
+the engine, and messages sent while the client was away are flushed to the new
+connection. Home Assistant's auth handshake is answered natively on resume,
+since the script has already played it.
+"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from websockets.exceptions import ConnectionClosedOK
+from .admission import authenticate
+
+logger = logging.getLogger(__name__)
+
+_CLOSED = object()
+
+def session_key(request) -> Optional[str]:
+    """Identify the client behind an HTTP request, if it says who it is."""
+    client_id = request.query.get("client_id") or request.headers.get("X-Client-Id")
+    if client_id:
+        return f"client:{client_id}"
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        return f"token:{authorization[7:]}"
+    return None
+
+class SessionConnection:
+    """
+    The connection an engine sees for a resumable session.
+
+    Sends go to whichever client connection is attached, or are buffered while
+    none is. Received messages from successive connections form one stream.
+    The connection only closes for good when the grace window expires.
+    """
+    def __init__(self, key: str, grace: float, reconnect_latencies: Optional[List[float]] = None):
+        self.key = key
+        self.grace = grace
+        self.current: Optional[Any] = None
+        # Milliseconds between losing the client and its return; may be shared
+        self.reconnect_latencies: List[float] = reconnect_latencies if reconnect_latencies is not None else []
+        # Set once the script is done; later messages are read and dropped
+        self.finished = False
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._outbox: Deque[Tuple[bool, Any]] = deque()
+        self._closed = asyncio.Event()
+        self._detached_at: Optional[float] = None
+        self._expiry: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def remote_address(self):
+        return getattr(self.current, "remote_address", None)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def send(self, data: Any):
+        await self._send(False, data)
+
+    async def send_encoded(self, data: bytes):
+        await self._send(True, data)
+
+    async def _send(self, encoded: bool, data: Any):
+        if self.closed:
+            raise ConnectionClosedOK(None, None)
+        websocket = self.current
+        if websocket is None:
+            self._outbox.append((encoded, data))
+            return
+        try:
+            await _deliver(websocket, encoded, data)
+        except Exception as e:
+            logger.info(f"Session {self.key}: send failed ({e}), buffering until the client returns")
+            self._outbox.append((encoded, data))
+            self.detach(websocket)
+
+    async def __aiter__(self):
+        while True:
+            message = await self._inbox.get()
+            if message is _CLOSED:
+                return
+            yield message
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def attach(self, websocket):
+        """Serve the session over ``websocket`` until it disconnects, flushing buffered messages first."""
+        loop = asyncio.get_running_loop()
+        previous = self.current
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        if self._detached_at is not None:
+            latency = (loop.time() - self._detached_at) * 1000.0
+            self.reconnect_latencies.append(latency)
+            logger.info(f"Session {self.key}: resumed after {latency:.1f}ms")
+            self._detached_at = None
+        self.current = websocket
+        if previous is not None and previous is not websocket:
+            # The client came back before we noticed it had gone
+            await previous.close()
+
+        try:
+            while self._outbox and self.current is websocket:
+                encoded, data = self._outbox[0]
+                await _deliver(websocket, encoded, data)
+                self._outbox.popleft()
+            async for message in websocket:
+                if not self.finished:
+                    self._inbox.put_nowait(message)
+        finally:
+            self.detach(websocket)
+
+    def detach(self, websocket):
+        """Forget ``websocket`` and start the grace window."""
+        if self.current is not websocket or self.closed:
+            return
+        self.current = None
+        loop = asyncio.get_running_loop()
+        self._detached_at = loop.time()
+        self._expiry = loop.call_later(self.grace, self.close)
+        logger.info(f"Session {self.key}: client disconnected, waiting {self.grace:.1f}s for it to return")
+
+    def close(self):
+        if self.closed:
+            return
+        logger.info(f"Session {self.key}: closed")
+        self._closed.set()
+        self._inbox.put_nowait(_CLOSED)
+
+async def _deliver(websocket, encoded: bool, data: Any):
+    if encoded:
+        send = getattr(websocket, "send_encoded", None)
+        if send is not None:
+            await send(data)
+            return
+        data = data.decode()
+    await websocket.send(data)
+
+async def reauthenticate(websocket) -> bool:
+    """Play Home Assistant's auth handshake natively for a returning client."""
+    return await authenticate(websocket) is not None
+
+class SessionRegistry:
+    """Resumable sessions of one server, by client key."""
+    def __init__(self, grace_ms: int):
+        self.grace = grace_ms / 1000.0
+        self.sessions: Dict[str, Tuple[SessionConnection, asyncio.Task]] = {}
+        # Every reconnect latency seen by this server, in milliseconds
+        self.reconnect_latencies: List[float] = []
+
+    async def serve(self, key: str, engine, websocket, authenticated: bool = False):
+        """
+        Run ``engine`` for a new client, or resume the client's existing session.
+
+        ``authenticated`` means the server already played the auth phase.
+        """
+        entry = self.sessions.get(key)
+        if entry is not None and not entry[0].closed:
+            connection = entry[0]
+            logger.info(f"Session {key}: client reconnected")
+            if not authenticated and not await reauthenticate(websocket):
+                return
+        else:
+            connection = SessionConnection(key, self.grace, self.reconnect_latencies)
+            self.sessions[key] = (connection, asyncio.create_task(self._run(engine, connection)))
+        await connection.attach(websocket)
+
+    def close(self):
+        """End every session without waiting for its grace window."""
+        for connection, task in list(self.sessions.values()):
+            connection.close()
+            task.cancel()
+
+    async def _run(self, engine, connection: SessionConnection):
+        try:
+            await engine.run(connection)
+        except Exception as e:
+            logger.error(f"Session {connection.key}: script failed: {e}")
+        finally:
+            connection.finished = True
+            # Idle sessions are kept for the grace window after the client leaves
+            await connection.wait_closed()
+            if self.sessions.get(connection.key, (None,))[0] is connection:
+                del self.sessions[connection.key]
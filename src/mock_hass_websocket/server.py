@@ -1,95 +1,466 @@
 import asyncio
+import contextlib
 import logging
 import signal
-from typing import Optional
-from websockets.asyncio.server import serve, ServerConnection
-from .engine import Engine
-from .loader import load_script
+from typing import TYPE_CHECKING, Any, AsyncContextManager, Callable, Dict, Mapping, Optional, Tuple
 from pathlib import Path
 
+# aiohttp, the engine and the pydantic models are imported where they are first
+# needed, so the CLI starts quickly and can bind the socket as early as possible.
+if TYPE_CHECKING:
+    from aiohttp import web
+    from .admission import AdmissionController
+    from .engine import Engine
+    from .loader import ScriptCache
+    from .models import AdmissionConfig, FaultConfig, HttpOptions, WebsocketOptions
+    from .profiling import Profiler
+    from .resume import SessionRegistry
+    from .tracing import Tracer
+
 logger = logging.getLogger(__name__)
 
-from aiohttp import web
+# Streamed scenarios may be arbitrarily long; keep only the tail of their history.
+STREAM_HISTORY_LIMIT = 10000
 
 class WebsocketAdapter:
     """Adapts aiohttp WebSocketResponse to the websockets ServerConnection API that Engine expects."""
-    def __init__(self, ws, request):
+    def __init__(self, ws, request, options: Optional["WebsocketOptions"] = None):
         self.ws = ws
         # Mock remote address
         self.remote_address = request.remote
         self._closed_event = asyncio.Event()
-        
+        self.binary = options.binary if options is not None else False
+        self.compress_threshold = options.compress_threshold if options is not None else 0
+        if options is not None and ws.compress and (options.compress_level is not None or options.window_bits is not None):
+            configure_compressor(ws, options.compress_level, options.window_bits)
+
     async def send(self, data):
-        await self.ws.send_str(data)
-        
+        if isinstance(data, str) and self.binary:
+            data = data.encode()
+        await self._send_frame(data, len(data), self._send)
+
+    async def send_encoded(self, data):
+        """Send JSON that is already UTF-8 encoded without decoding it again."""
+        await self._send_frame(data, len(data), self._send_utf8)
+
+    async def _send_frame(self, data, size, send):
+        writer = self.ws._writer if self.compress_threshold else None
+        if writer is not None and writer.compress and size < self.compress_threshold:
+            # Small messages barely shrink; uncompressed frames are always valid
+            # on a deflate connection (RFC 7692, section 6.1).
+            compress, writer.compress = writer.compress, 0
+            try:
+                await send(data)
+            finally:
+                writer.compress = compress
+        else:
+            await send(data)
+
+    async def _send(self, data):
+        if isinstance(data, bytes):
+            await self.ws.send_bytes(data)
+        else:
+            await self.ws.send_str(data)
+
+    async def _send_utf8(self, data):
+        import aiohttp
+
+        if self.binary:
+            await self.ws.send_bytes(data)
+        else:
+            await self.ws.send_frame(data, aiohttp.WSMsgType.TEXT)
+
     async def __aiter__(self):
         import aiohttp
         try:
             async for msg in self.ws:
-                if msg.type == aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
                     yield msg.data
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     break
         finally:
-            self._closed_event.set()
+            # A cancelled reader doesn't mean the connection is gone.
+            if self.ws.closed or self.ws.exception() is not None:
+                self._closed_event.set()
+
+    async def close(self):
+        await self.ws.close()
+        self._closed_event.set()
 
     async def wait_closed(self):
         """Wait for the websocket connection to close."""
         await self._closed_event.wait()
 
-async def start_server(host: str, port: int, script_path: Path, engine: Optional[Engine] = None):
-    """Start the websocket server using aiohttp to support REST calls."""
-    logging.basicConfig(level=logging.INFO)
-    
-    if engine is None:
-        logger.info(f"Loading script from {script_path}")
-        script = load_script(script_path)
-        engine = Engine(script)
+def configure_compressor(ws, level: Optional[int], window_bits: Optional[int]):
+    """
+    Replace the negotiated permessage-deflate compressor of a prepared websocket.
+
+    aiohttp always deflates with ``Z_BEST_SPEED`` and the negotiated window, so
+    this swaps in a compressor with the requested level. The window can only be
+    narrowed: the client's decoder accepts anything up to the negotiated size.
+    """
+    try:
+        from aiohttp.compression_utils import ZLibCompressor
+        from aiohttp._websocket.writer import WEBSOCKET_MAX_SYNC_CHUNK_SIZE
+    except ImportError:
+        ZLibCompressor = None
+
+    writer = getattr(ws, "_writer", None)
+    if ZLibCompressor is None or writer is None or not hasattr(writer, "_compressobj"):
+        logger.warning("Cannot tune websocket compression with this aiohttp version")
+        return
+    wbits = min(window_bits or ws.compress, ws.compress)
+    writer._compressobj = ZLibCompressor(
+        level=level,
+        wbits=-wbits,
+        max_sync_chunk_size=WEBSOCKET_MAX_SYNC_CHUNK_SIZE,
+    )
 
-    async def websocket_handler(request):
+async def run_engine(
+    engine: "Engine",
+    request,
+    options: Optional["WebsocketOptions"] = None,
+    faults: Optional["FaultConfig"] = None,
+    resume: Optional["SessionRegistry"] = None,
+    admission: Optional["AdmissionController"] = None,
+) -> "web.WebSocketResponse":
+    """
+    Upgrade the request to a websocket and run the engine's script on it.
+
+    The link is degraded by ``faults`` if given. With a ``resume`` registry,
+    clients that identify themselves get sessions that survive reconnects.
+    ``admission`` holds the handshake until a session slot is free, answers
+    HTTP 503 when the server is saturated, and may play the auth phase.
+    """
+    from aiohttp import web
+
+    if admission is None:
+        return await _run_engine(engine, request, options, faults, resume)
+    from .admission import AdmissionRejected
+
+    try:
+        await admission.acquire()
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected client {request.remote}: {e}")
+        raise web.HTTPServiceUnavailable(text=str(e), headers={"Retry-After": "1"})
+    try:
+        return await _run_engine(engine, request, options, faults, resume, admission.config)
+    finally:
+        admission.release()
+
+async def _run_engine(
+    engine: "Engine",
+    request,
+    options: Optional["WebsocketOptions"],
+    faults: Optional["FaultConfig"],
+    resume: Optional["SessionRegistry"],
+    admission: Optional["AdmissionConfig"] = None,
+) -> "web.WebSocketResponse":
+    from aiohttp import web
+
+    if options is None:
         ws = web.WebSocketResponse()
-        await ws.prepare(request)
-        
-        adapter = WebsocketAdapter(ws, request)
-        logger.info(f"Client connected: {adapter.remote_address}")
-        try:
-            await engine.run(adapter)
-        except Exception as e:
-            logger.error(f"Error during execution: {e}")
-        finally:
-            logger.info("Handler finished")
-        return ws
+    else:
+        ws = web.WebSocketResponse(compress=options.compress, max_msg_size=options.max_msg_size)
+    await ws.prepare(request)
+
+    adapter = WebsocketAdapter(ws, request, options)
+    if faults is not None:
+        from .faults import FaultyConnection
+        adapter = FaultyConnection(adapter, faults)
+    logger.info(f"Client connected: {adapter.remote_address}")
+    from .resume import session_key
+
+    key = session_key(request) if resume is not None else None
+    native_auth = admission is not None and admission.native_auth
+    try:
+        if native_auth:
+            from .admission import authenticate
+
+            if await authenticate(adapter, admission.tokens) is None:
+                await adapter.close()
+                return ws
+        if key is not None:
+            if "session_id" in request.match_info:
+                key = f"{request.match_info['session_id']}/{key}"
+            await resume.serve(key, engine, adapter, authenticated=native_auth)
+            return ws
+        await engine.run(adapter)
+        # Like a real Home Assistant, keep the connection open once the script is done.
+        async for message in adapter:
+            logger.debug(f"Received after script completion: {message}")
+    except Exception as e:
+        logger.error(f"Error during execution: {e}")
+    finally:
+        logger.info("Handler finished")
+    return ws
+
+def create_app(
+    engine: Optional["Engine"] = None,
+    sessions: Optional[Mapping[str, Any]] = None,
+    ws_options: Optional["WebsocketOptions"] = None,
+    faults: Optional["FaultConfig"] = None,
+    resume: Optional["SessionRegistry"] = None,
+    admission: Optional["AdmissionController"] = None,
+    profiler: Optional["Profiler"] = None,
+) -> "web.Application":
+    """
+    Build the aiohttp application.
 
-    async def rest_handler(request):
-        # Just return HTTP 200 for any api call AppDaemon makes
-        # Must read the body to avoid TCP RST when the client sends a payload
-        await request.read()
-        return web.json_response({})
+    ``engine`` serves the standard ``/api/websocket`` endpoint. ``sessions`` maps
+    session ids to engines (or anything with an async ``run(websocket)``) served
+    under ``/session/{id}/api/...``, so one server can host many isolated
+    scenarios (clients use ``http://host:port/session/{id}`` as their Home
+    Assistant URL). Each engine also answers the REST API from its state
+    store (see ``rest``). ``ws_options`` configures compression and framing, and
+    ``faults`` degrades every websocket connection. A ``resume``
+    registry lets identified clients resume their session after reconnecting,
+    and ``admission`` limits how many websocket sessions run at once.
+    A ``profiler`` follows each session and may serve its admin endpoints.
+    """
+    from aiohttp import web
+    from .rest import RestApi
 
     app = web.Application()
-    app.router.add_get('/api/websocket', websocket_handler)
-    # Catch all POST requests to /api/states/*
-    app.router.add_post('/api/states/{tail:.*}', rest_handler)
-    app.router.add_get('/api/states/{tail:.*}', rest_handler)
-
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, host, port)
-    
-    logger.info(f"Server started on http://{host}:{port}")
-    await site.start()
-    
-    stop = asyncio.Future()
-    def terminate():
-        if not stop.done():
-            stop.set_result(None)
-    
-    loop = asyncio.get_running_loop()
+    def tracked(request) -> AsyncContextManager:
+        if profiler is None:
+            return contextlib.nullcontext()
+        return profiler.session(f"{request.remote} {request.path}")
+
+    if engine is not None:
+        async def websocket_handler(request):
+            async with tracked(request):
+                return await run_engine(engine, request, ws_options, faults, resume, admission)
+
+        app.router.add_get('/api/websocket', websocket_handler)
+        RestApi(lambda request: engine).add_routes(app.router)
+
+    if sessions is not None:
+        def session_engine(request):
+            session = sessions.get(request.match_info["session_id"])
+            if session is None:
+                raise web.HTTPNotFound(text="Unknown session")
+            return session
+
+        async def session_handler(request):
+            async with tracked(request):
+                return await run_engine(session_engine(request), request, ws_options, faults, resume, admission)
+
+        app.router.add_get('/session/{session_id}/api/websocket', session_handler)
+        RestApi(session_engine).add_routes(app.router, '/session/{session_id}')
+
+    if profiler is not None and profiler.admin:
+        profiler.add_routes(app.router)
+    return app
+
+def load_engine(script_path: Path, stream: bool = False, cache: Optional["ScriptCache"] = None) -> "Engine":
+    """
+    Create an engine for a scenario file, streaming it if requested or if it is
+    JSON lines. With a ``cache``, engines of the same scenario share its parse.
+    """
+    from .engine import Engine
+    from .loader import ScriptCache
+
+    streamed = stream or Path(script_path).suffix in (".jsonl", ".ndjson")
+    logger.info(f"{'Streaming' if streamed else 'Loading'} script from {script_path}")
+    script = (cache if cache is not None else ScriptCache()).get(script_path, stream)
+    return Engine(script, history_limit=STREAM_HISTORY_LIMIT if streamed else None)
+
+class MockHass:
+    """
+    A running mock server, usable as an async context manager::
+
+        async with MockHass("scenario.yaml") as server:   # port 0 picks a free port
+            await connect(server.ws_url)
+
+    ``ready`` is set once the socket is bound and ``port`` holds the actual port.
+    With ``unix_path`` the server listens on that Unix domain socket instead of
+    TCP, which avoids the TCP stack for local tests. ``ws_options`` configures
+    permessage-deflate and binary framing, and ``faults`` injects network
+    faults into every connection. With ``resume_grace_ms``, clients identified
+    by ``client_id`` or token resume their script after reconnecting;
+    ``resume`` then holds the session registry and its reconnect latencies.
+    ``admission`` caps concurrent sessions and the handshake rate, and may
+    answer the auth phase natively; ``admission_control`` then holds the
+    controller and its ``stats``. ``http_options`` tunes the listening socket,
+    keep-alive and access logging. With ``trace_path``, every engine records
+    per-interaction timing spans into ``tracer``, written there as a Chrome
+    trace when the server stops. A ``profiler`` is installed while the server
+    runs and writes out its captures when it stops. ``subapps`` mounts further
+    applications under URL prefixes, as ``topology`` does for virtual instances.
+    """
+    def __init__(
+        self,
+        script_path: Optional[Path] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        engine: Optional["Engine"] = None,
+        stream: bool = False,
+        sessions: Optional[Mapping[str, Any]] = None,
+        unix_path: Optional[str] = None,
+        ws_options: Optional["WebsocketOptions"] = None,
+        faults: Optional["FaultConfig"] = None,
+        resume_grace_ms: Optional[int] = None,
+        admission: Optional["AdmissionConfig"] = None,
+        http_options: Optional["HttpOptions"] = None,
+        trace_path: Optional[Path] = None,
+        profiler: Optional["Profiler"] = None,
+        subapps: Optional[Mapping[str, "web.Application"]] = None,
+    ):
+        self.script_path = script_path
+        self.unix_path = unix_path
+        self.host = host
+        self.port = port
+        self.engine = engine
+        self.stream = stream
+        self.sessions = sessions
+        self.ws_options = ws_options
+        self.faults = faults
+        self.resume_grace_ms = resume_grace_ms
+        self.resume: Optional["SessionRegistry"] = None
+        self.admission = admission
+        self.admission_control: Optional["AdmissionController"] = None
+        self.http_options = http_options
+        self.trace_path = trace_path
+        self.tracer: Optional["Tracer"] = None
+        self.profiler = profiler
+        self.subapps = subapps
+        self.ready = asyncio.Event()
+        self._runner = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.host, self.port
+
+    @property
+    def url(self) -> str:
+        if self.unix_path is not None:
+            # Clients connect through the socket file; the host part is nominal.
+            return "http://localhost"
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws{self.url[4:]}/api/websocket"
+
+    async def start(self) -> "MockHass":
+        from aiohttp import web
+
+        if self.engine is None and self.script_path is not None:
+            self.engine = load_engine(self.script_path, self.stream)
+        if self.trace_path is not None:
+            from .tracing import Tracer
+            self.tracer = Tracer()
+            engines = [self.engine, *(self.sessions or {}).values()]
+            for engine in engines:
+                if hasattr(engine, "tracer") and engine.tracer is None:
+                    engine.tracer = self.tracer
+
+        if self.resume_grace_ms:
+            from .resume import SessionRegistry
+            self.resume = SessionRegistry(self.resume_grace_ms)
+        if self.admission is not None:
+            from .admission import AdmissionController
+            self.admission_control = AdmissionController(self.admission)
+        if self.profiler is not None:
+            self.profiler.install()
+        app = create_app(self.engine, self.sessions, self.ws_options, self.faults, self.resume, self.admission_control, self.profiler)
+        for prefix, subapp in (self.subapps or {}).items():
+            app.add_subapp(prefix, subapp)
+        runner_options: Dict[str, Any] = {}
+        site_options: Dict[str, Any] = {}
+        if self.http_options is not None:
+            if not self.http_options.access_log:
+                runner_options["access_log"] = None
+            if self.http_options.keepalive_timeout is not None:
+                runner_options["keepalive_timeout"] = self.http_options.keepalive_timeout
+            site_options["backlog"] = self.http_options.backlog
+        self._runner = web.AppRunner(app, **runner_options)
+        await self._runner.setup()
+        if self.unix_path is not None:
+            site = web.UnixSite(self._runner, self.unix_path, **site_options)
+            await site.start()
+            logger.info(f"Server started on unix socket {self.unix_path}")
+        else:
+            if self.http_options is not None and self.http_options.reuse_port:
+                site_options["reuse_port"] = True
+            site = web.TCPSite(self._runner, self.host, self.port, **site_options)
+            await site.start()
+            self.port = self._runner.addresses[0][1]
+            logger.info(f"Server started on {self.url}")
+        self.ready.set()
+        return self
+
+    async def stop(self):
+        if self.resume is not None:
+            self.resume.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self.tracer is not None:
+            self.tracer.write(self.trace_path)
+            logger.info(f"Wrote {len(self.tracer.spans)} spans to {self.trace_path}")
+        if self.profiler is not None:
+            self.profiler.close()
+            logger.info(f"Wrote profiling results to {self.profiler.directory}")
+        self.ready.clear()
+
+    async def __aenter__(self) -> "MockHass":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+async def start_server(
+    host: str,
+    port: int,
+    script_path: Path,
+    engine: Optional["Engine"] = None,
+    stream: bool = False,
+    on_ready: Optional[Callable[[MockHass], Any]] = None,
+    unix_path: Optional[str] = None,
+    ws_options: Optional["WebsocketOptions"] = None,
+    faults: Optional["FaultConfig"] = None,
+    resume_grace_ms: Optional[int] = None,
+    admission: Optional["AdmissionConfig"] = None,
+    http_options: Optional["HttpOptions"] = None,
+    trace_path: Optional[Path] = None,
+    profiler: Optional["Profiler"] = None,
+):
+    """
+    Start the websocket server using aiohttp to support REST calls.
+
+    Runs until SIGINT/SIGTERM or cancellation. ``on_ready`` is called with the
+    running ``MockHass`` once the socket is bound (pass port 0 to let the OS
+    choose a free port and read it from ``server.port``). ``unix_path`` binds a
+    Unix domain socket instead of ``host``/``port``. ``ws_options`` configures
+    websocket compression and framing, ``faults`` the injected network faults
+    and ``resume_grace_ms`` how long disconnected sessions wait for their client.
+    ``admission`` limits concurrent sessions and the handshake rate, and
+    ``http_options`` tunes the HTTP server for heavy REST polling.
+    ``trace_path`` receives a Chrome trace of every interaction on shutdown,
+    and ``profiler`` profiles the server while it runs.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    server = MockHass(script_path, host, port, engine=engine, stream=stream, unix_path=unix_path, ws_options=ws_options, faults=faults, resume_grace_ms=resume_grace_ms, admission=admission, http_options=http_options, trace_path=trace_path, profiler=profiler)
+    await server.start()
     try:
-        loop.add_signal_handler(signal.SIGINT, terminate)
-        loop.add_signal_handler(signal.SIGTERM, terminate)
-    except NotImplementedError:
-        pass
-    
-    await stop
-    await runner.cleanup()
+        if on_ready is not None:
+            on_ready(server)
+
+        stop = asyncio.Future()
+        def terminate():
+            if not stop.done():
+                stop.set_result(None)
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, terminate)
+            loop.add_signal_handler(signal.SIGTERM, terminate)
+        except NotImplementedError:
+            pass
+
+        await stop
+    finally:
+        await server.stop()
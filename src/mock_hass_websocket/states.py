@@ -0,0 +1,242 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from .models import EventMessage, ResultMessage
+
+# Entities per snapshot chunk, and between two yields to the event loop.
+DEFAULT_CHUNK_SIZE = 500
+
+def utc_now() -> str:
+    """The current time as Home Assistant writes it in states and events."""
+    return datetime.now(timezone.utc).isoformat()
+
+def new_context() -> Dict[str, Any]:
+    """A fresh context for a state change or event, with no parent or user."""
+    return {"id": uuid.uuid4().hex, "parent_id": None, "user_id": None}
+
+class StateStore:
+    """
+    Entity states of the mocked Home Assistant instance.
+
+    Each entity's JSON encoding is cached until the entity changes, and entities
+    are grouped into chunks whose joined encoding is cached as well. A change
+    marks only its entity and chunk dirty, so a ``get_states`` snapshot
+    re-encodes the changed entities and concatenates ready-made fragments for
+    everything else.
+
+    ``version`` increases with every change and ``entity_version`` records the
+    version that last touched an entity; together with the store's random
+    ``tag`` they make ETags that never repeat across stores.
+    """
+    def __init__(self, states: Iterable[Dict[str, Any]] = (), chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._encoded: Dict[str, bytes] = {}
+        # Snapshot order, each entity's position in it, and the cached chunks
+        self._order: List[str] = []
+        self._position: Dict[str, int] = {}
+        self._chunks: List[Optional[bytes]] = []
+        # Bumped whenever positions shift, so an in-progress snapshot restarts
+        self._generation = 0
+        self.tag = uuid.uuid4().hex[:12]
+        self.version = 0
+        self._versions: Dict[str, int] = {}
+        self._list: Optional[Tuple[int, bytes]] = None
+        self._buffer = bytearray()
+        self._buffer_lock = asyncio.Lock()
+        for state in states:
+            self.set(state)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._states
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._states.values())
+
+    @property
+    def dirty(self) -> Set[str]:
+        """Entities whose encoding is out of date."""
+        return self._states.keys() - self._encoded.keys()
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        return self._states.get(entity_id)
+
+    def entity_version(self, entity_id: str) -> Optional[int]:
+        return self._versions.get(entity_id)
+
+    def set(self, state: Dict[str, Any]):
+        """Add or replace an entity state, marking it dirty."""
+        entity_id = state.get("entity_id")
+        if not isinstance(entity_id, str):
+            raise ValueError(f"State must have an entity_id: {state}")
+        position = self._position.get(entity_id)
+        if position is None:
+            position = self._position[entity_id] = len(self._order)
+            self._order.append(entity_id)
+            if position // self.chunk_size >= len(self._chunks):
+                self._chunks.append(None)
+        self._states[entity_id] = state
+        self._encoded.pop(entity_id, None)
+        self._chunks[position // self.chunk_size] = None
+        self.version += 1
+        self._versions[entity_id] = self.version
+
+    def set_state(
+        self,
+        entity_id: str,
+        state: Any,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Change an entity like Home Assistant does, returning ``(old_state, new_state)``.
+
+        ``last_changed`` only moves when the state value changes; ``attributes``
+        replace the current ones when given.
+        """
+        old = self._states.get(entity_id)
+        now = utc_now()
+        state = str(state)
+        if old is not None:
+            attributes = old.get("attributes", {}) if attributes is None else attributes
+            last_changed = old.get("last_changed", now) if old.get("state") == state else now
+        else:
+            last_changed = now
+        new = {
+            "entity_id": entity_id,
+            "state": state,
+            "attributes": attributes or {},
+            "last_changed": last_changed,
+            "last_reported": now,
+            "last_updated": now,
+            "context": new_context(),
+        }
+        self.set(new)
+        return old, new
+
+    def remove(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        state = self._states.pop(entity_id, None)
+        if state is not None:
+            self._encoded.pop(entity_id, None)
+            self._versions.pop(entity_id, None)
+            self.version += 1
+            # Removals are rare: rebuild the layout rather than tracking holes
+            self._order = list(self._states)
+            self._position = {e: i for i, e in enumerate(self._order)}
+            self._chunks = [None] * -(-len(self._order) // self.chunk_size)
+            self._generation += 1
+        return state
+
+    def encoded(self, entity_id: str) -> bytes:
+        """Return the cached JSON encoding of one entity."""
+        data = self._encoded.get(entity_id)
+        if data is None:
+            data = self._encoded[entity_id] = json.dumps(self._states[entity_id]).encode()
+        return data
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """All states as a list, for transports that take Python objects."""
+        return list(self._states.values())
+
+    def result_message(self, msg_id: int) -> ResultMessage:
+        """The ``get_states`` result as a model."""
+        return ResultMessage(id=msg_id, success=True, result=self.snapshot())
+
+    def state_changed_event(self, subscription: int, old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> EventMessage:
+        """A ``state_changed`` event for a subscription, as a model."""
+        return EventMessage(id=subscription, event={
+            "event_type": "state_changed",
+            "data": {"entity_id": new["entity_id"], "old_state": old, "new_state": new},
+            "origin": "LOCAL",
+            "time_fired": new["last_updated"],
+            "context": new["context"],
+        })
+
+    def encode_state_changed(self, subscription: int, entity_id: str, old: Optional[bytes]) -> bytes:
+        """
+        Encode a ``state_changed`` event from cached fragments.
+
+        ``old`` is the previous encoding of the entity (``encoded()`` before the
+        change). The new state's encoding is cached for the next snapshot too.
+        Equal to ``json.dumps`` of ``state_changed_event(...).model_dump()``.
+        """
+        new = self._states[entity_id]
+        return b'{"type": "event", "id": %s, "event": {"event_type": "state_changed", "data": {"entity_id": %s, "old_state": %s, "new_state": %s}, "origin": "LOCAL", "time_fired": %s, "context": %s}}' % (
+            json.dumps(subscription).encode(),
+            json.dumps(entity_id).encode(),
+            old if old is not None else b"null",
+            self.encoded(entity_id),
+            json.dumps(new.get("last_updated")).encode(),
+            json.dumps(new.get("context")).encode(),
+        )
+
+    async def encode_result(self, buffer: bytearray, msg_id: Any) -> bytearray:
+        """
+        Write a complete ``get_states`` result message into ``buffer``.
+
+        Only dirty chunks are rebuilt, yielding to the event loop after each
+        one so other connections keep being served while a large home is
+        encoded. Clean chunks are copied as they are.
+        """
+        prefix = b'{"id": %s, "type": "result", "success": true, "result": [' % json.dumps(msg_id).encode()
+        return await self._encode_list(buffer, prefix, b"]}")
+
+    async def encode_states(self, buffer: bytearray) -> bytearray:
+        """Write the JSON list of all states into ``buffer``, as ``GET /api/states`` returns it."""
+        return await self._encode_list(buffer, b"[", b"]")
+
+    async def encoded_list(self) -> bytes:
+        """The JSON list of all states, cached until the next change."""
+        version = self.version
+        if self._list is None or self._list[0] != version:
+            # Tagged with the version it started from, so a change made meanwhile forces a rebuild
+            self._list = (version, bytes(await self.encode_states(bytearray())))
+        return self._list[1]
+
+    async def _encode_list(self, buffer: bytearray, prefix: bytes, suffix: bytes) -> bytearray:
+        while True:
+            generation = self._generation
+            buffer.clear()
+            buffer += prefix
+            index = 0
+            while index < len(self._chunks):
+                chunk = self._chunks[index]
+                if chunk is None:
+                    chunk = self._build_chunk(index)
+                    await asyncio.sleep(0)
+                    if generation != self._generation:
+                        break
+                if index:
+                    buffer += b", "
+                buffer += chunk
+                index += 1
+            else:
+                buffer += suffix
+                return buffer
+
+    def _build_chunk(self, index: int) -> bytes:
+        start = index * self.chunk_size
+        chunk = self._chunks[index] = b", ".join(self.encoded(e) for e in self._order[start:start + self.chunk_size])
+        return chunk
+
+    async def send_result(self, websocket, msg_id: Any):
+        """Answer a ``get_states`` command on ``websocket``."""
+        if getattr(websocket, "passthrough", False):
+            await websocket.send({"id": msg_id, "type": "result", "success": True, "result": self.snapshot()})
+            return
+        # The buffer is reused across requests: only one encoding may use it at a time.
+        async with self._buffer_lock:
+            data = await self.encode_result(self._buffer, msg_id)
+            await send_encoded(websocket, data)
+
+async def send_encoded(websocket, data: bytes):
+    """Send pre-encoded JSON, without decoding it when the connection allows."""
+    send = getattr(websocket, "send_encoded", None)
+    if send is not None:
+        await send(data)
+    else:
+        await websocket.send(data.decode())
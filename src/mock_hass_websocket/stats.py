@@ -0,0 +1,250 @@
+"""
+Streaming aggregation over recordings and interaction histories.
+
+Entries are read one at a time (JSON, JSON lines or binary recordings alike)
+and folded into aggregators, so memory depends on the number of groups and
+time buckets, not on the length of the recording:
+
+* ``Counts`` counts entries per time bucket and per values of payload key
+  paths, e.g. ``call_service`` per ``domain`` per minute.
+* ``Pairs`` pairs an entry matching one pattern with a later entry matching
+  another, e.g. a sent ``state_changed`` of an entity and the service call
+  the client makes in response, and reports the delays between them.
+
+Delay percentiles come from a bounded reservoir, exact until it fills up and a
+uniform sample after that. With NumPy installed they are computed in
+vectorised form.
+"""
+import array
+import math
+import random
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Literal, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Delays kept for percentiles; beyond this a uniform sample is kept instead
+RESERVOIR_SIZE = 100_000
+# Unpaired start entries remembered by a Pairs aggregator
+MAX_PENDING = 10_000
+PERCENTILES = (50, 90, 95, 99)
+
+_MISSING = object()
+
+def lookup(payload: Any, path: str) -> Any:
+    """The value at a dotted path of a payload (list items by index), ``None`` if absent."""
+    value = payload
+    for key in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(key, _MISSING)
+        elif isinstance(value, list) and key.lstrip("-").isdigit() and -len(value) <= int(key) < len(value):
+            value = value[int(key)]
+        else:
+            value = _MISSING
+        if value is _MISSING:
+            return None
+    return value
+
+def _label(value: Any) -> Any:
+    # Group keys must be hashable; nested values are grouped by their text
+    return value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+
+class Filter:
+    """Which entries an aggregator looks at: a direction, and payload paths with required values."""
+    def __init__(self, direction: Optional[str] = None, where: Optional[Dict[str, Any]] = None):
+        self.direction = direction
+        self.where = where or {}
+
+    def __call__(self, entry: Dict[str, Any]) -> bool:
+        if self.direction is not None and entry["direction"] != self.direction:
+            return False
+        return all(lookup(entry["payload"], path) == value for path, value in self.where.items())
+
+class Counts:
+    """Entry counts per time bucket and per group of payload values."""
+    def __init__(self, group_by: Sequence[str] = (), bucket_s: Optional[float] = None, select: Optional[Filter] = None):
+        self.group_by = list(group_by)
+        self.bucket_s = bucket_s
+        self.select = select or Filter()
+        self.counts: Counter = Counter()
+        self.origin: Optional[float] = None
+
+    def add(self, entry: Dict[str, Any]):
+        if not self.select(entry):
+            return
+        bucket = None
+        if self.bucket_s:
+            timestamp = entry.get("timestamp")
+            if timestamp is not None:
+                if self.origin is None:
+                    self.origin = timestamp
+                bucket = int((timestamp - self.origin) // self.bucket_s)
+        group = tuple(_label(lookup(entry["payload"], path)) for path in self.group_by)
+        self.counts[bucket, group] += 1
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One row per bucket and group, in time order, largest group first within a bucket."""
+        ordered = sorted(self.counts.items(), key=lambda item: (item[0][0] is None, item[0][0] or 0, -item[1], repr(item[0][1])))
+        rows = []
+        for (bucket, group), count in ordered:
+            row: Dict[str, Any] = {}
+            if self.bucket_s:
+                row["bucket_s"] = None if bucket is None else bucket * self.bucket_s
+            row.update(zip(self.group_by, group))
+            row["count"] = count
+            rows.append(row)
+        return rows
+
+class Reservoir:
+    """Exact count, sum, min and max of a stream, and a bounded uniform sample of it."""
+    def __init__(self, size: int = RESERVOIR_SIZE, seed: Optional[int] = 0):
+        self.size = size
+        self.sample = array.array("d")
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self._random = random.Random(seed)
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            slot = self._random.randrange(self.count)
+            if slot < self.size:
+                self.sample[slot] = value
+
+    @property
+    def exact(self) -> bool:
+        return self.count <= self.size
+
+    def summary(self, percentiles: Iterable[float] = PERCENTILES) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        result: Dict[str, Any] = {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.minimum,
+            "max": self.maximum,
+        }
+        result.update(zip((f"p{p:g}" for p in percentiles), _percentiles(self.sample, list(percentiles))))
+        if not self.exact:
+            result["sampled"] = len(self.sample)
+        return result
+
+def _percentiles(values: array.array, percentiles: List[float]) -> List[float]:
+    """Linearly interpolated percentiles, like numpy's default method."""
+    if numpy is not None:
+        return [float(v) for v in numpy.percentile(numpy.frombuffer(values, dtype=numpy.float64), percentiles)]
+    ordered = sorted(values)
+    results = []
+    for p in percentiles:
+        rank = (len(ordered) - 1) * p / 100.0
+        low = math.floor(rank)
+        high = min(low + 1, len(ordered) - 1)
+        results.append(ordered[low] + (ordered[high] - ordered[low]) * (rank - low))
+    return results
+
+class Pairs:
+    """
+    Delays, in milliseconds, from entries matching ``start`` to later entries
+    matching ``end`` (patterns as in expectations, matched with ``deep_match``).
+
+    With ``fifo`` pairing each end answers the oldest unanswered start, as with
+    requests and responses; with ``latest`` it answers the most recent start
+    and the older ones are dropped, as with a trigger and the reaction to it.
+    ``group_by`` paths are read from the start entry.
+    """
+    def __init__(
+        self,
+        start: Any,
+        end: Any,
+        start_direction: Optional[str] = "sent",
+        end_direction: Optional[str] = "received",
+        mode: Literal["fifo", "latest"] = "latest",
+        group_by: Sequence[str] = (),
+        reservoir_size: int = RESERVOIR_SIZE,
+    ):
+        from .engine import deep_match
+
+        self._match = deep_match
+        self.start = start
+        self.end = end
+        self.start_direction = start_direction
+        self.end_direction = end_direction
+        self.mode = mode
+        self.group_by = list(group_by)
+        self.reservoir_size = reservoir_size
+        self.delays: Dict[Tuple[Any, ...], Reservoir] = {}
+        self.pending: Deque[Tuple[float, Tuple[Any, ...]]] = deque(maxlen=MAX_PENDING)
+        self.unmatched_ends = 0
+
+    def add(self, entry: Dict[str, Any]):
+        timestamp = entry.get("timestamp")
+        if timestamp is None:
+            return
+        direction = entry["direction"]
+        payload = entry["payload"]
+        if (self.end_direction is None or direction == self.end_direction) and self._match(payload, self.end):
+            if not self.pending:
+                self.unmatched_ends += 1
+            else:
+                if self.mode == "fifo":
+                    started, group = self.pending.popleft()
+                else:
+                    started, group = self.pending.pop()
+                    self.pending.clear()
+                reservoir = self.delays.get(group)
+                if reservoir is None:
+                    reservoir = self.delays[group] = Reservoir(self.reservoir_size)
+                reservoir.add((timestamp - started) * 1000.0)
+            return
+        if (self.start_direction is None or direction == self.start_direction) and self._match(payload, self.start):
+            self.pending.append((timestamp, tuple(_label(lookup(payload, path)) for path in self.group_by)))
+
+    def rows(self) -> List[Dict[str, Any]]:
+        rows = []
+        for group, reservoir in sorted(self.delays.items(), key=lambda item: -item[1].count):
+            row: Dict[str, Any] = dict(zip(self.group_by, group))
+            row.update(reservoir.summary())
+            rows.append(row)
+        return rows
+
+def aggregate(entries: Iterable[Dict[str, Any]], aggregators: Sequence[Any]) -> int:
+    """Feed every entry to every aggregator in one pass; returns the number of entries read."""
+    count = 0
+    for entry in entries:
+        count += 1
+        for aggregator in aggregators:
+            aggregator.add(entry)
+    return count
+
+def aggregate_file(path: Union[str, Path], aggregators: Sequence[Any]) -> int:
+    from .recordings import iter_recording
+
+    return aggregate(iter_recording(Path(path)), aggregators)
+
+def format_rows(rows: List[Dict[str, Any]]) -> str:
+    """A plain text table of result rows."""
+    if not rows:
+        return "(no entries)"
+    columns: List[str] = []
+    for row in rows:
+        columns.extend(key for key in row if key not in columns)
+
+    def cell(value: Any) -> str:
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return "-" if value is None else str(value)
+
+    table = [columns] + [[cell(row.get(column)) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    return "\n".join("  ".join(text.ljust(width) for text, width in zip(line, widths)).rstrip() for line in table)
@@ -0,0 +1,254 @@
+"""
+Running a library of scenarios concurrently.
+
+Each scenario is played against itself: a client connects to its own session
+on a shared server, answers every expectation with the pattern it expects and
+reads every message the script sends, so a passing scenario is one that runs to
+completion (and, given a recordings directory, reproduces its recording).
+
+All sessions of a worker share one server and one event loop, so a worker
+takes about as long as its longest scenario rather than the sum of them. With
+several workers, scenarios are spread across processes by longest-first
+bin-packing on the durations ``analysis`` works out ahead of time.
+"""
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import json
+import logging
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Union
+from pydantic import BaseModel
+from .analysis import Timeline, analyse_file, longest_first, scenario_files
+from .models import ExpectInteraction, SendInteraction, SetStateInteraction
+
+logger = logging.getLogger(__name__)
+
+# Added to each scenario's worst-case duration before it is declared hung
+DEFAULT_SLACK_S = 5.0
+
+class ScenarioResult(BaseModel):
+    """How one scenario went."""
+    name: str
+    status: Literal["passed", "failed", "error"]
+    seconds: float = 0.0
+    expected_ms: int = 0
+    worst_ms: int = 0
+    worker: int = 0
+    message: str = ""
+
+class SuiteReport(BaseModel):
+    """Every scenario's result, with the wall time of the whole run."""
+    results: List[ScenarioResult] = []
+    seconds: float = 0.0
+    workers: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return all(result.status == "passed" for result in self.results)
+
+    def counts(self) -> Dict[str, int]:
+        counts = {"passed": 0, "failed": 0, "error": 0}
+        for result in self.results:
+            counts[result.status] += 1
+        return counts
+
+    def write_json(self, path: Union[str, Path]):
+        with open(path, "w") as f:
+            json.dump(self.model_dump(), f, indent=2)
+
+    def write_junit(self, path: Union[str, Path]):
+        """Write a JUnit XML report, one test case per scenario."""
+        counts = self.counts()
+        suite = ET.Element("testsuite", {
+            "name": "mock-hass",
+            "tests": str(len(self.results)),
+            "failures": str(counts["failed"]),
+            "errors": str(counts["error"]),
+            "time": f"{self.seconds:.3f}",
+        })
+        for result in self.results:
+            case = ET.SubElement(suite, "testcase", {
+                "classname": f"mock-hass.worker{result.worker}",
+                "name": result.name,
+                "time": f"{result.seconds:.3f}",
+            })
+            if result.status == "failed":
+                ET.SubElement(case, "failure", {"message": result.message}).text = result.message
+            elif result.status == "error":
+                ET.SubElement(case, "error", {"message": result.message}).text = result.message
+        ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+def plan(timelines: Iterable[Timeline], workers: int) -> List[List[Timeline]]:
+    """
+    Spread scenarios over ``workers`` shards, longest first, each to the least
+    loaded shard so far; every shard then takes about as long as the others.
+    """
+    shards: List[List[Timeline]] = [[] for _ in range(max(workers, 1))]
+    loads = [(0, index) for index in range(len(shards))]
+    for timeline in longest_first(timelines):
+        load, index = heapq.heappop(loads)
+        shards[index].append(timeline)
+        heapq.heappush(loads, (load + max(timeline.expected_ms, 1), index))
+    return [shard for shard in shards if shard]
+
+class _Session:
+    """A scenario's engine on the shared server, reporting how its first run ended."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.finished: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    async def run(self, websocket):
+        try:
+            await self.engine.run(websocket)
+        except BaseException as e:
+            if not self.finished.done():
+                self.finished.set_exception(e)
+            raise
+        if not self.finished.done():
+            self.finished.set_result(None)
+
+async def _receive(ws, count: int):
+    for _ in range(count):
+        await ws.recv()
+
+async def play(ws, script: Any):
+    """
+    Act as the client ``script`` expects: reply to each expectation with its
+    pattern, after reading everything the server sent before it.
+    """
+    has_states = getattr(script, "states", None) is not None
+    subscriptions: Dict[int, Optional[str]] = {}
+    pending = 0
+    for item in script.items:
+        if isinstance(item, SendInteraction):
+            pending += item.repeat
+        elif isinstance(item, SetStateInteraction):
+            if item.subscription is not None:
+                pending += 1
+            else:
+                pending += sum(1 for event_type in subscriptions.values() if event_type in (None, "state_changed"))
+        elif isinstance(item, ExpectInteraction):
+            await _receive(ws, pending)
+            pending = 0
+            match = item.match
+            if isinstance(match, dict):
+                if match.get("type") == "subscribe_events" and isinstance(match.get("id"), int):
+                    subscriptions[match["id"]] = match.get("event_type")
+                elif has_states and match.get("type") == "get_states":
+                    # Answered by the engine itself
+                    pending += 1
+            await ws.send(json.dumps(match))
+    await _receive(ws, pending)
+
+def _load(path: Path):
+    from .loader import load_script, stream_script
+
+    if path.suffix in (".jsonl", ".ndjson"):
+        return stream_script(path)
+    return load_script(path)
+
+def _compare(engine, recording: Path) -> str:
+    from .diff import diff_recordings, format_differences
+
+    with open(recording) as f:
+        expected = json.load(f)
+    differences = diff_recordings(expected, [log.model_dump() for log in engine.history], max_diffs=5)
+    return format_differences(differences) if differences else ""
+
+async def run_scenarios(
+    timelines: Sequence[Timeline],
+    recordings: Optional[Path] = None,
+    concurrency: Optional[int] = None,
+    slack_s: float = DEFAULT_SLACK_S,
+    worker: int = 0,
+) -> List[ScenarioResult]:
+    """
+    Run scenarios concurrently on one server in this event loop.
+
+    ``timelines`` come from ``analysis`` and name the scenario files; they
+    start longest first, at most ``concurrency`` at a time. Each scenario may
+    take its worst-case duration plus ``slack_s`` before it fails as hung.
+    """
+    import websockets
+    from .engine import Engine
+    from .server import MockHass
+
+    sessions: Dict[str, _Session] = {}
+    ids = itertools.count(1)
+    limit = asyncio.Semaphore(concurrency) if concurrency else None
+
+    async def run_one(timeline: Timeline) -> ScenarioResult:
+        path = Path(timeline.name)
+        result = ScenarioResult(name=path.stem, status="passed", expected_ms=timeline.expected_ms, worst_ms=timeline.worst_ms, worker=worker)
+        if timeline.errors:
+            result.status, result.message = "error", "; ".join(issue.message for issue in timeline.errors)
+            return result
+        script = _load(path)
+        session_id = f"{path.stem}-{next(ids)}"
+        session = sessions[session_id] = _Session(Engine(script))
+        started = time.perf_counter()
+        try:
+            async def scenario():
+                async with websockets.connect(f"{server.url.replace('http', 'ws', 1)}/session/{session_id}/api/websocket") as ws:
+                    await play(ws, script)
+                    await session.finished
+            await asyncio.wait_for(scenario(), timeline.worst_ms / 1000.0 + slack_s)
+        except asyncio.TimeoutError:
+            result.status, result.message = "failed", f"did not finish within {timeline.worst_ms / 1000.0 + slack_s:.1f}s"
+        except Exception as e:
+            result.status, result.message = "failed", str(e) or type(e).__name__
+        finally:
+            result.seconds = round(time.perf_counter() - started, 3)
+            sessions.pop(session_id, None)
+        if result.status == "passed" and recordings is not None:
+            recording = recordings / f"{path.stem}.json"
+            if recording.exists():
+                mismatch = _compare(session.engine, recording)
+                if mismatch:
+                    result.status, result.message = "failed", f"history differs from {recording}:\n{mismatch}"
+        logger.info(f"{result.name}: {result.status} in {result.seconds:.3f}s")
+        return result
+
+    async def limited(timeline: Timeline) -> ScenarioResult:
+        if limit is None:
+            return await run_one(timeline)
+        async with limit:
+            return await run_one(timeline)
+
+    async with MockHass(port=0, sessions=sessions) as server:
+        return list(await asyncio.gather(*(limited(t) for t in longest_first(timelines))))
+
+def _run_shard(timelines: List[Timeline], recordings: Optional[Path], concurrency: Optional[int], slack_s: float, worker: int) -> List[ScenarioResult]:
+    return asyncio.run(run_scenarios(timelines, recordings, concurrency, slack_s, worker))
+
+def run_suite(
+    paths: Iterable[Union[str, Path]],
+    workers: int = 1,
+    recordings: Optional[Path] = None,
+    concurrency: Optional[int] = None,
+    slack_s: float = DEFAULT_SLACK_S,
+) -> SuiteReport:
+    """
+    Analyse and run every scenario under ``paths``.
+
+    With more than one worker the scenarios are bin-packed across that many
+    processes; results come back longest scenario first.
+    """
+    started = time.perf_counter()
+    timelines = [analyse_file(path, keep_steps=False) for path in scenario_files(paths)]
+    shards = plan(timelines, workers)
+    if len(shards) <= 1:
+        results = [result for shard in shards for result in _run_shard(shard, recordings, concurrency, slack_s, 0)]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(len(shards)) as pool:
+            futures = [
+                pool.submit(_run_shard, shard, recordings, concurrency, slack_s, worker)
+                for worker, shard in enumerate(shards)
+            ]
+            results = [result for future in futures for result in future.result()]
+    results.sort(key=lambda result: (result.expected_ms, result.worst_ms), reverse=True)
+    return SuiteReport(results=results, seconds=round(time.perf_counter() - started, 3), workers=len(shards))
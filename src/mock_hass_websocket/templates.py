@@ -0,0 +1,232 @@
+import ast
+import json
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Placeholders look like ${name} or ${func(arg, ...)} inside any string value.
+PLACEHOLDER = re.compile(r"\$\{\s*([^}]*?)\s*\}")
+CALL = re.compile(r"^([A-Za-z_]\w*)\((.*)\)$", re.DOTALL)
+NAME = re.compile(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$")
+# Names every template can use; scenario variables can't take them.
+BUILTINS = frozenset(("index", "last_id"))
+
+Slot = Callable[["TemplateContext"], Any]
+
+
+class TemplateContext:
+    """Mutable render state shared by all templates of one engine run."""
+
+    def __init__(self, variables: Optional[Dict[str, Any]] = None, seed: Optional[int] = None):
+        self.variables = dict(variables or {})
+        self.rng = random.Random(seed)
+        self.counters: Dict[str, int] = {}
+        self.last_id: Optional[int] = None
+        self.index = 0
+
+    def next_count(self, name: str, start: int) -> int:
+        value = self.counters.get(name, start - 1) + 1
+        self.counters[name] = value
+        return value
+
+
+def check_variables(variables: Dict[str, Any]):
+    """Reject scenario variables that the built-in names would shadow."""
+    for name in variables:
+        if name in BUILTINS:
+            raise ValueError(f"{name!r} is a built-in template variable and can't be redefined")
+
+
+def _lookup(path: str) -> Slot:
+    head, *rest = path.split(".")
+
+    def slot(ctx: TemplateContext) -> Any:
+        if head == "index":
+            return ctx.index
+        if head == "last_id":
+            return ctx.last_id
+        try:
+            value = ctx.variables[head]
+            for key in rest:
+                value = value[key]
+        except (KeyError, IndexError, TypeError):
+            raise KeyError(f"Unknown template variable: {path}")
+        return value
+
+    return slot
+
+
+def _range_slot(start: int, stop: Optional[int] = None, step: int = 1) -> Slot:
+    if stop is None:
+        start, stop = 0, start
+    values = range(start, stop, step)
+    if not values:
+        raise ValueError(f"Empty template range({start}, {stop}, {step})")
+    return lambda ctx: values[ctx.index % len(values)]
+
+
+def _compile_call(name: str, args: Tuple[Any, ...]) -> Slot:
+    if name in ("counter", "count"):
+        counter = args[0] if args else "default"
+        start = args[1] if len(args) > 1 else 1
+        return lambda ctx: ctx.next_count(counter, start)
+    if name == "range":
+        return _range_slot(*args)
+    if name == "randint":
+        low, high = args
+        return lambda ctx: ctx.rng.randint(low, high)
+    if name == "uniform":
+        low, high = args[0], args[1]
+        digits = args[2] if len(args) > 2 else None
+        if digits is None:
+            return lambda ctx: ctx.rng.uniform(low, high)
+        return lambda ctx: round(ctx.rng.uniform(low, high), digits)
+    if name == "choice":
+        options = list(args[0]) if len(args) == 1 and isinstance(args[0], (list, tuple)) else list(args)
+        return lambda ctx: ctx.rng.choice(options)
+    raise ValueError(f"Unknown template function: {name}")
+
+
+def _parse_args(text: str) -> Tuple[Any, ...]:
+    """Parse call arguments as Python literals; bare names are taken as strings."""
+    if not text.strip():
+        return ()
+    try:
+        node = ast.parse(f"({text},)", mode="eval").body
+        return tuple(
+            arg.id if isinstance(arg, ast.Name) else ast.literal_eval(arg)
+            for arg in node.elts
+        )
+    except (ValueError, SyntaxError):
+        raise ValueError(f"Invalid template arguments: {text}")
+
+
+def compile_expression(expr: str) -> Slot:
+    """Compile the text between ``${`` and ``}`` into a slot function."""
+    call = CALL.match(expr)
+    if call:
+        name, arg_text = call.groups()
+        try:
+            return _compile_call(name, _parse_args(arg_text))
+        except (TypeError, IndexError):
+            raise ValueError(f"Invalid template arguments: {expr}")
+    if NAME.match(expr):
+        return _lookup(expr)
+    raise ValueError(f"Invalid template expression: {expr}")
+
+
+class CompiledTemplate:
+    """
+    A payload compiled into pre-encoded JSON fragments plus dynamic slots.
+
+    Rendering evaluates every slot once, then splices the results between the
+    static fragments to produce the wire text, and rebuilds only the containers
+    that hold dynamic values for the history payload (static subtrees are shared).
+    """
+
+    def __init__(self, payload: Any):
+        self._slots: List[Slot] = []
+        self._parts: List[Any] = []
+        self._holes: List[Tuple[int, Callable[[List[Any]], str]]] = []
+        self._build = self._compile(payload)
+        self.is_static = not self._slots
+        self._static_text = "".join(self._parts) if self.is_static else None
+
+    # -- compilation ------------------------------------------------------
+
+    def _emit(self, text: str):
+        if self._parts and isinstance(self._parts[-1], str):
+            self._parts[-1] += text
+        else:
+            self._parts.append(text)
+
+    def _emit_hole(self, encode: Callable[[List[Any]], str]):
+        self._holes.append((len(self._parts), encode))
+        self._parts.append(None)
+
+    def _add_slot(self, expr: str) -> int:
+        self._slots.append(compile_expression(expr))
+        return len(self._slots) - 1
+
+    def _compile(self, node: Any) -> Callable[[List[Any]], Any]:
+        if isinstance(node, dict):
+            self._emit("{")
+            builders = []
+            for n, (key, value) in enumerate(node.items()):
+                if n:
+                    self._emit(", ")
+                self._emit(json.dumps(str(key)) + ": ")
+                builders.append((key, self._compile(value)))
+            self._emit("}")
+            if all(getattr(b, "static", False) for _, b in builders):
+                return _static(node)
+            return lambda values: {key: build(values) for key, build in builders}
+        if isinstance(node, list):
+            self._emit("[")
+            builders = []
+            for n, value in enumerate(node):
+                if n:
+                    self._emit(", ")
+                builders.append(self._compile(value))
+            self._emit("]")
+            if all(getattr(b, "static", False) for b in builders):
+                return _static(node)
+            return lambda values: [build(values) for build in builders]
+        if isinstance(node, str) and "${" in node:
+            return self._compile_string(node)
+        self._emit(json.dumps(node))
+        return _static(node)
+
+    def _compile_string(self, text: str) -> Callable[[List[Any]], Any]:
+        whole = PLACEHOLDER.fullmatch(text)
+        if whole:
+            # A lone placeholder keeps the value's JSON type.
+            index = self._add_slot(whole.group(1))
+            self._emit_hole(lambda values: json.dumps(values[index]))
+            return lambda values: values[index]
+
+        pieces: List[Any] = []
+        pos = 0
+        for m in PLACEHOLDER.finditer(text):
+            if m.start() > pos:
+                pieces.append(text[pos:m.start()])
+            pieces.append(self._add_slot(m.group(1)))
+            pos = m.end()
+        if pos < len(text):
+            pieces.append(text[pos:])
+
+        def build(values: List[Any]) -> str:
+            return "".join(p if isinstance(p, str) else str(values[p]) for p in pieces)
+
+        self._emit_hole(lambda values: json.dumps(build(values)))
+        return build
+
+    # -- rendering --------------------------------------------------------
+
+    def render(self, ctx: TemplateContext) -> Tuple[str, Any]:
+        """Render to ``(json_text, payload)`` using the given context."""
+        if self.is_static:
+            return self._static_text, self._build([])
+        values = [slot(ctx) for slot in self._slots]
+        parts = self._parts.copy()
+        for index, encode in self._holes:
+            parts[index] = encode(values)
+        return "".join(parts), self._build(values)
+
+    def render_payload(self, ctx: TemplateContext) -> Any:
+        """Render only the payload object, for transports that skip JSON."""
+        if self.is_static:
+            return self._build([])
+        return self._build([slot(ctx) for slot in self._slots])
+
+
+def _static(value: Any) -> Callable[[List[Any]], Any]:
+    def build(values: List[Any]) -> Any:
+        return value
+    build.static = True
+    return build
+
+
+def compile_template(payload: Any) -> CompiledTemplate:
+    """Compile a payload containing ``${...}`` placeholders."""
+    return CompiledTemplate(payload)
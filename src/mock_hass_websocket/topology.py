@@ -0,0 +1,190 @@
+"""
+Several virtual Home Assistant instances in one process.
+
+A topology file names the instances and what each one serves::
+
+    instances:
+      home:
+        scenario: scenarios/3_motion_light.yaml
+        tokens: [home-token]
+      cabin:
+        scenario: scenarios/1_thermostat_cool.yaml
+        sessions: {heat: scenarios/2_thermostat_heat.yaml}
+        port: 8124
+
+Instances without a port are mounted under ``/{name}`` of the shared port,
+so their clients use ``http://host:port/home`` as the Home Assistant URL; the
+others get a server of their own. Every instance has its own engines, and so
+its own state store, and its own auth phase. The event loop and the parsed
+scenarios are shared: a scenario played by several instances is loaded once.
+"""
+import asyncio
+import logging
+import re
+import signal
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    from .engine import Engine
+    from .loader import ScriptCache
+    from .models import HttpOptions, InstanceConfig, TopologyConfig, WebsocketOptions
+    from .server import MockHass
+
+logger = logging.getLogger(__name__)
+
+_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def load_topology(path: Union[str, Path]) -> "TopologyConfig":
+    """Read a topology file; scenario paths in it are relative to the file."""
+    import yaml
+    from .models import TopologyConfig
+
+    path = Path(path)
+    with open(path) as f:
+        config = TopologyConfig.model_validate(yaml.safe_load(f) or {})
+    for instance in config.instances.values():
+        if instance.scenario is not None:
+            instance.scenario = str(path.parent / instance.scenario)
+        instance.sessions = {key: str(path.parent / value) for key, value in instance.sessions.items()}
+    return config
+
+class Instance:
+    """A virtual Home Assistant: its engines, auth settings and where it is served."""
+    def __init__(self, name: str, config: "InstanceConfig", cache: "ScriptCache"):
+        from .server import load_engine
+
+        self.name = name
+        self.config = config
+        self.engine: Optional["Engine"] = load_engine(Path(config.scenario), config.stream, cache) if config.scenario else None
+        self.sessions: Dict[str, "Engine"] = {
+            session_id: load_engine(Path(scenario), config.stream, cache)
+            for session_id, scenario in config.sessions.items()
+        }
+        self.server: Optional["MockHass"] = None
+        # The instance's Home Assistant base URL, once it is served
+        self.url = ""
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws{self.url[4:]}/api/websocket"
+
+    def session_ws_url(self, session_id: str) -> str:
+        return f"ws{self.url[4:]}/session/{session_id}/api/websocket"
+
+    @property
+    def admission(self):
+        from .models import AdmissionConfig
+
+        if not (self.config.native_auth or self.config.tokens):
+            return None
+        return AdmissionConfig(native_auth=True, tokens=self.config.tokens)
+
+    def application(self, ws_options: Optional["WebsocketOptions"] = None):
+        """The instance as an aiohttp application, for mounting under a prefix."""
+        from .admission import AdmissionController
+        from .server import create_app
+
+        admission = self.admission
+        controller = AdmissionController(admission) if admission is not None else None
+        return create_app(self.engine, self.sessions if self.sessions else None, ws_options, admission=controller)
+
+class Topology:
+    """
+    Serves every instance of a ``TopologyConfig``, usable as an async context manager::
+
+        async with Topology(load_topology("topology.yaml")) as topology:
+            connect(topology.instances["home"].ws_url)
+
+    ``port`` is the shared port (0 picks a free one); ``cache`` may be shared
+    with other topologies to reuse their parsed scenarios.
+    """
+    def __init__(
+        self,
+        config: "TopologyConfig",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        ws_options: Optional["WebsocketOptions"] = None,
+        http_options: Optional["HttpOptions"] = None,
+        cache: Optional["ScriptCache"] = None,
+    ):
+        from .loader import ScriptCache
+
+        self.config = config
+        self.host = host
+        self.port = port
+        self.ws_options = ws_options
+        self.http_options = http_options
+        self.cache = cache if cache is not None else ScriptCache()
+        self.instances: Dict[str, Instance] = {}
+        self.servers: List["MockHass"] = []
+
+    async def start(self) -> "Topology":
+        from .server import MockHass
+
+        for name, config in self.config.instances.items():
+            if not _NAME.match(name):
+                raise ValueError(f"Instance name {name!r} can't be used in a URL path")
+            self.instances[name] = Instance(name, config, self.cache)
+        logger.info(f"Loaded {len(self.cache)} distinct scenarios for {len(self.instances)} instances")
+
+        mounted = {name: instance for name, instance in self.instances.items() if instance.config.port is None}
+        try:
+            if mounted:
+                shared = MockHass(
+                    host=self.host, port=self.port, ws_options=self.ws_options, http_options=self.http_options,
+                    subapps={f"/{name}": instance.application(self.ws_options) for name, instance in mounted.items()},
+                )
+                await shared.start()
+                self.servers.append(shared)
+                self.port = shared.port
+                for name, instance in mounted.items():
+                    instance.server = shared
+                    instance.url = f"{shared.url}/{name}"
+            for instance in self.instances.values():
+                if instance.config.port is None:
+                    continue
+                server = MockHass(
+                    host=self.host, port=instance.config.port, engine=instance.engine,
+                    sessions=instance.sessions or None, ws_options=self.ws_options,
+                    admission=instance.admission, http_options=self.http_options,
+                )
+                await server.start()
+                self.servers.append(server)
+                instance.server = server
+                instance.url = server.url
+        except BaseException:
+            await self.stop()
+            raise
+        for name, instance in self.instances.items():
+            logger.info(f"Instance {name} on {instance.url}")
+        return self
+
+    async def stop(self):
+        for server in reversed(self.servers):
+            await server.stop()
+        self.servers.clear()
+
+    async def __aenter__(self) -> "Topology":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+async def serve_topology(config: "TopologyConfig", host: str = "127.0.0.1", port: int = 8123):
+    """Serve a topology until SIGINT/SIGTERM or cancellation."""
+    logging.basicConfig(level=logging.INFO)
+
+    async with Topology(config, host, port):
+        stop = asyncio.get_running_loop().create_future()
+        def terminate():
+            if not stop.done():
+                stop.set_result(None)
+
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGINT, terminate)
+            loop.add_signal_handler(signal.SIGTERM, terminate)
+        except NotImplementedError:
+            pass
+        await stop
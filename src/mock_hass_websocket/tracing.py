@@ -0,0 +1,73 @@
+"""
+Per-interaction timing spans.
+
+An ``Engine`` given a ``Tracer`` records one span per interaction it plays:
+each send (with how late it went out compared to its ``at_ms``), each
+expectation (when it started waiting, when it matched, how many messages it
+inspected, how many were already queued, and the send it was reacting to) and
+each state change. Every engine run is its own session, so concurrent clients
+show up as separate tracks.
+
+``Tracer.write`` exports the spans as Chrome trace-event JSON, which
+``chrome://tracing`` and https://ui.perfetto.dev open directly.
+"""
+import itertools
+import json
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+class Span(NamedTuple):
+    name: str
+    category: str
+    session: int
+    start: float
+    end: float
+    args: Dict[str, Any]
+
+class Tracer:
+    """Collects spans from any number of engine runs, timed by the event loop clock."""
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._sessions = itertools.count(1)
+
+    def new_session(self) -> int:
+        return next(self._sessions)
+
+    def add(self, name: str, category: str, session: int, start: float, end: float, **args: Any):
+        self.spans.append(Span(name, category, session, start, end, args))
+
+    def trace_events(self) -> List[Dict[str, Any]]:
+        """The spans as Chrome trace "complete" events, in microseconds from the first span."""
+        origin = min((span.start for span in self.spans), default=0.0)
+        return [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - origin) * 1e6, 3),
+                "dur": round((span.end - span.start) * 1e6, 3),
+                "pid": 1,
+                "tid": span.session,
+                "args": span.args,
+            }
+            for span in self.spans
+        ]
+
+    def write(self, path: Union[str, Path]):
+        """Write a Chrome trace-event JSON file."""
+        with open(path, "w") as f:
+            # default=str: match patterns may hold values JSON can't encode
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f, default=str)
+
+def describe(match: Any, limit: int = 60) -> str:
+    """A short label for an expectation pattern."""
+    if isinstance(match, dict) and isinstance(match.get("type"), str):
+        return f"expect {match['type']}"
+    text = json.dumps(match, default=str)
+    return f"expect {text if len(text) <= limit else text[:limit - 3] + '...'}"
+
+def reaction(last_send: Optional[Dict[str, Any]], matched_at: float) -> Dict[str, Any]:
+    """Args linking an expectation to the send it most likely answered."""
+    if last_send is None:
+        return {}
+    return {"after_send": last_send["index"], "reaction_ms": round((matched_at - last_send["time"]) * 1000.0, 3)}
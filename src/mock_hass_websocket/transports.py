@@ -0,0 +1,90 @@
+import asyncio
+import json
+import logging
+from typing import Any, Optional, Tuple
+from websockets.exceptions import ConnectionClosedOK
+
+logger = logging.getLogger(__name__)
+
+_CLOSED = object()
+
+class InProcessConnection:
+    """
+    One end of an in-process connection pair.
+
+    Implements the ``send`` / ``__aiter__`` / ``wait_closed`` interface the
+    Engine expects (plus ``recv`` and ``close`` for clients) on top of a pair of
+    asyncio queues. Messages are handed over as Python objects without any
+    serialisation, so payloads must be treated as read-only by both ends.
+    """
+    # Tells the Engine it may send payload objects instead of JSON text.
+    passthrough = True
+
+    def __init__(self, inbox: asyncio.Queue, name: str, text: bool = False):
+        self._inbox = inbox
+        self._peer: Optional["InProcessConnection"] = None
+        self._closed = asyncio.Event()
+        self.remote_address = ("in-process", name)
+        # When true, `recv` returns JSON text, for clients written against real sockets.
+        self.text = text
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def send(self, data: Any):
+        if self.closed or self._peer is None or self._peer.closed:
+            raise ConnectionClosedOK(None, None)
+        self._peer._inbox.put_nowait(data)
+
+    async def recv(self) -> Any:
+        if self.closed and self._inbox.empty():
+            raise ConnectionClosedOK(None, None)
+        data = await self._inbox.get()
+        if data is _CLOSED:
+            self._closed.set()
+            raise ConnectionClosedOK(None, None)
+        if self.text and not isinstance(data, (str, bytes)):
+            return json.dumps(data)
+        return data
+
+    async def __aiter__(self):
+        try:
+            while True:
+                yield await self.recv()
+        except ConnectionClosedOK:
+            return
+
+    async def close(self):
+        """Close both ends of the pair."""
+        for end in (self, self._peer):
+            if end is not None and not end.closed:
+                end._inbox.put_nowait(_CLOSED)
+                end._closed.set()
+
+    async def wait_closed(self):
+        await self._closed.wait()
+
+    async def __aenter__(self) -> "InProcessConnection":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+def connection_pair(text: bool = False) -> Tuple[InProcessConnection, InProcessConnection]:
+    """Create linked ``(server_end, client_end)`` connections."""
+    server = InProcessConnection(asyncio.Queue(), "client", text=False)
+    client = InProcessConnection(asyncio.Queue(), "server", text=text)
+    server._peer, client._peer = client, server
+    return server, client
+
+def connect_in_process(engine, text: bool = False) -> InProcessConnection:
+    """
+    Run ``engine`` against a new in-process connection and return the client end.
+
+    The engine task is available as ``client.engine_task``; its result or
+    exception reports the outcome of the script.
+    """
+    server, client = connection_pair(text=text)
+    client.engine_task = asyncio.create_task(engine.run(server))
+    return client
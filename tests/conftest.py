@@ -1,7 +1,9 @@
 import pytest
 import asyncio
+import json
 from unittest.mock import AsyncMock
 from websockets.asyncio.server import ServerConnection
+from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction
 
 @pytest.fixture
 def mock_websocket():
@@ -17,3 +19,26 @@ def event_loop():
     loop = asyncio.get_event_loop_policy().new_event_loop()
     yield loop
     loop.close()
+
+@pytest.fixture
+def auth_script():
+    """A script playing only Home Assistant's auth phase."""
+    return Script(items=[
+        SendInteraction(type="send", at_ms=0, payload={"type": "auth_required"}),
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "auth"}),
+        SendInteraction(type="send", at_ms=0, payload={"type": "auth_ok"}),
+    ])
+
+async def _login(ws, token="t", greeting=None):
+    first = json.loads(await ws.recv())
+    if greeting is not None:
+        assert first == greeting
+    else:
+        assert first["type"] == "auth_required"
+    await ws.send(json.dumps({"type": "auth", "access_token": token}))
+    return json.loads(await ws.recv())
+
+@pytest.fixture
+def login():
+    """Play the client side of the auth phase on a websocket; returns the server's answer."""
+    return _login
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import pytest
+import websockets
+from websockets.exceptions import InvalidStatus
+from mock_hass_websocket.admission import AdmissionController, AdmissionRejected, TokenBucket
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import AdmissionConfig, FaultConfig, Script, SendInteraction, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+
+def post_auth_script():
+    # With native auth the script starts after auth_ok
+    return Script(items=[
+        ExpectInteraction(type="expect", timeout_ms=3000, match={"type": "subscribe_events"}),
+        SendInteraction(type="send", at_ms=0, payload={"id": 1, "type": "event"}),
+    ])
+
+@pytest.mark.asyncio
+async def test_token_bucket_spaces_out_reservations():
+    bucket = TokenBucket(rate=10, burst=2)
+    delays = [bucket.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2] == pytest.approx(0.1, abs=0.01)
+    assert delays[3] == pytest.approx(0.2, abs=0.01)
+
+@pytest.mark.asyncio
+async def test_controller_queues_then_rejects():
+    controller = AdmissionController(AdmissionConfig(max_sessions=1, max_queue=1, queue_timeout_ms=1000))
+    await controller.acquire()
+    queued = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    assert controller.waiting == 1
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+
+    controller.release()
+    await queued
+    assert controller.active == 1
+    assert controller.stats["admitted"] == 2
+    assert controller.stats["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_controller_times_out_queued_handshakes():
+    controller = AdmissionController(AdmissionConfig(max_sessions=1, queue_timeout_ms=50))
+    await controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+    assert controller.waiting == 0
+    # The slot that timed out was never taken
+    controller.release()
+    await controller.acquire()
+
+@pytest.mark.asyncio
+async def test_native_auth_runs_script_after_auth_ok(login):
+    engine = Engine(post_auth_script())
+    async with MockHass(engine=engine, admission=AdmissionConfig(native_auth=True)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert (await login(ws))["type"] == "auth_ok"
+            await ws.send(json.dumps({"id": 1, "type": "subscribe_events"}))
+            assert json.loads(await ws.recv()) == {"id": 1, "type": "event"}
+
+    # The auth phase never reached the script
+    assert [log.payload["type"] for log in engine.history] == ["subscribe_events", "event"]
+
+@pytest.mark.asyncio
+async def test_native_auth_keeps_messages_read_behind_a_slow_link():
+    script = Script(items=[
+        ExpectInteraction(type="expect", timeout_ms=3000, match={"type": "ping"}),
+        SendInteraction(type="send", at_ms=0, payload={"id": 1, "type": "pong"}),
+    ])
+    engine = Engine(script)
+    faults = FaultConfig(latency_ms=50, direction="receive")
+    async with MockHass(engine=engine, admission=AdmissionConfig(native_auth=True), faults=faults) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert json.loads(await ws.recv())["type"] == "auth_required"
+            # The ping is already read while the auth message is still delayed
+            await ws.send(json.dumps({"type": "auth", "access_token": "t"}))
+            await ws.send(json.dumps({"id": 1, "type": "ping"}))
+            assert json.loads(await ws.recv())["type"] == "auth_ok"
+            assert json.loads(await asyncio.wait_for(ws.recv(), 5)) == {"id": 1, "type": "pong"}
+
+@pytest.mark.asyncio
+async def test_native_auth_rejects_unknown_token(login):
+    config = AdmissionConfig(native_auth=True, tokens=["good"])
+    async with MockHass(engine=Engine(post_auth_script()), admission=config) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert (await login(ws, "bad"))["type"] == "auth_invalid"
+        async with websockets.connect(server.ws_url) as ws:
+            assert (await login(ws, "good"))["type"] == "auth_ok"
+
+@pytest.mark.asyncio
+async def test_saturated_server_answers_503(login):
+    config = AdmissionConfig(max_sessions=1, max_queue=0, native_auth=True)
+    async with MockHass(engine=Engine(post_auth_script()), admission=config) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await login(ws)
+            with pytest.raises(InvalidStatus) as excinfo:
+                await websockets.connect(server.ws_url)
+            assert excinfo.value.response.status_code == 503
+            await ws.send(json.dumps({"id": 1, "type": "subscribe_events"}))
+            await ws.recv()
+
+        # The slot frees up once the first client leaves
+        await asyncio.sleep(0.1)
+        async with websockets.connect(server.ws_url) as ws:
+            assert (await login(ws))["type"] == "auth_ok"
+        assert server.admission_control.stats["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_connection_storm_is_queued(login):
+    config = AdmissionConfig(max_sessions=5, accept_rate=200, accept_burst=5, native_auth=True)
+    async with MockHass(engine=Engine(Script(items=[])), admission=config) as server:
+        async def client():
+            async with websockets.connect(server.ws_url, open_timeout=10) as ws:
+                return (await login(ws))["type"]
+
+        assert await asyncio.gather(*(client() for _ in range(50))) == ["auth_ok"] * 50
+        stats = server.admission_control.stats
+        assert stats["admitted"] == 50
+        assert stats["rejected"] == 0
+        assert stats["peak_waiting"] > 0
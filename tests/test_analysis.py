@@ -0,0 +1,114 @@
+import json
+from pathlib import Path
+from typer.testing import CliRunner
+from mock_hass_websocket.analysis import analyse, analyse_file, longest_first, scenario_files
+from mock_hass_websocket.loader import ScriptStream
+from mock_hass_websocket.main import app
+from mock_hass_websocket.models import Script
+
+def make_script(items, **kwargs):
+    return Script(items=items, **kwargs)
+
+def test_timeline_expected_and_worst_case():
+    timeline = analyse(make_script([
+        {"type": "send", "at_ms": 100, "payload": {}},
+        {"type": "expect", "timeout_ms": 1000, "match": {"type": "call_service"}},
+        {"type": "send", "at_ms": 2000, "payload": {}},
+        {"type": "expect", "timeout_ms": 5000, "match": {"type": "call_service"}},
+    ]))
+    assert timeline.expected_ms == 2000
+    assert timeline.worst_ms == 7000
+    assert timeline.critical_path == [2, 3]
+    assert [(s.start_ms, s.worst_start_ms) for s in timeline.steps] == [(100, 100), (100, 100), (2000, 2000), (2000, 2000)]
+    assert timeline.issues == []
+
+def test_repeated_send_ends_at_last_repetition():
+    timeline = analyse(make_script([{"type": "send", "at_ms": 100, "payload": {}, "repeat": 5, "interval_ms": 50}]))
+    assert timeline.steps[0].start_ms == 100
+    assert timeline.expected_ms == 300
+
+def test_backwards_at_ms_is_flagged():
+    timeline = analyse(make_script([
+        {"type": "send", "at_ms": 500, "payload": {}},
+        {"type": "set_state", "at_ms": 200, "entity_id": "light.a", "state": "on"},
+    ]))
+    [issue] = timeline.issues
+    assert (issue.index, issue.severity) == (1, "warning")
+    assert "goes backwards" in issue.message
+    assert timeline.steps[1].start_ms == 500
+
+def test_send_slipping_behind_timeouts_is_noted():
+    timeline = analyse(make_script([
+        {"type": "expect", "timeout_ms": 1000, "match": {"type": "ping"}},
+        {"type": "send", "at_ms": 50, "payload": {}},
+    ]))
+    assert [(i.index, i.severity) for i in timeline.issues] == [(1, "info")]
+    assert timeline.expected_ms == 50
+    assert timeline.worst_ms == 1000
+    assert timeline.critical_path == [0]
+
+def test_impossible_expectations_are_errors():
+    timeline = analyse(make_script([
+        {"type": "expect", "timeout_ms": 1000, "match": {"type": "result"}},
+        {"type": "expect", "timeout_ms": 1000, "match": {"type": "custom_command"}},
+        {"type": "expect", "timeout_ms": 0, "match": {}},
+    ], validate_commands="strict"))
+    assert [(i.index, i.severity) for i in timeline.issues] == [(0, "error"), (1, "error"), (2, "warning"), (2, "info")]
+    assert len(timeline.errors) == 2
+
+def test_redundant_state_change_is_flagged():
+    timeline = analyse(make_script([
+        {"type": "set_state", "at_ms": 0, "entity_id": "light.a", "state": "on"},
+        {"type": "set_state", "at_ms": 10, "entity_id": "light.b", "state": "on"},
+    ], states=[{"entity_id": "light.a", "state": "on"}]))
+    [issue] = timeline.issues
+    assert issue.index == 0
+    assert "redundant" in issue.message
+
+def test_streamed_script_without_steps():
+    stream = ScriptStream(lambda: ({"type": "send", "at_ms": i * 10, "payload": {}} for i in range(1000)))
+    timeline = analyse(stream, keep_steps=False)
+    assert timeline.steps == []
+    assert timeline.expected_ms == 9990
+
+def test_load_errors_become_issues(tmp_path):
+    path = tmp_path / "broken.yaml"
+    path.write_text("script:\n  - type: send\n    payload: {}\n")
+    timeline = analyse_file(path)
+    [issue] = timeline.errors
+    assert "at_ms" in issue.message
+
+def test_template_errors_become_issues(tmp_path):
+    yaml_path = tmp_path / "template.yaml"
+    yaml_path.write_text("script:\n  - type: send\n    at_ms: 0\n    template: true\n    payload: {id: '${1 +}'}\n")
+    jsonl_path = tmp_path / "template.jsonl"
+    jsonl_path.write_text('{"type": "send", "at_ms": 0, "payload": {}}\n{"type": "send", "at_ms": 5, "template": true, "payload": "${nope(}"}\n')
+    for path in (yaml_path, jsonl_path):
+        [issue] = analyse_file(path).issues
+        assert issue.severity == "error"
+        assert issue.message.startswith(f"{path}: script[")
+        assert "Invalid template" in issue.message
+
+def test_scenario_library_has_no_errors():
+    timelines = [analyse_file(path) for path in scenario_files([Path("scenarios")])]
+    assert timelines
+    assert [t.name for t in timelines if t.errors] == []
+    ordered = longest_first(timelines)
+    assert ordered[0].expected_ms >= ordered[-1].expected_ms
+
+def test_check_cli(tmp_path):
+    good = tmp_path / "good.yaml"
+    good.write_text("script:\n  - type: send\n    at_ms: 300\n    payload: {}\n")
+    bad = tmp_path / "bad.yaml"
+    bad.write_text("script:\n  - type: expect\n    timeout_ms: 100\n    match: {type: event}\n")
+
+    runner = CliRunner()
+    result = runner.invoke(app, ["check", str(good)])
+    assert result.exit_code == 0
+    assert "expected 300ms" in result.stdout
+
+    result = runner.invoke(app, ["check", "--json", str(tmp_path)])
+    assert result.exit_code == 1
+    report = json.loads(result.stdout)
+    assert [Path(entry["name"]).name for entry in report] == ["good.yaml", "bad.yaml"]
+    assert report[1]["issues"][0]["severity"] == "error"
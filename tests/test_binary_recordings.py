@@ -0,0 +1,79 @@
+import json
+import pytest
+from typer.testing import CliRunner
+from mock_hass_websocket.binary_recordings import (
+    BinaryRecording, BinaryRecordingWriter, binary_to_json, is_binary_recording, json_to_binary,
+)
+from mock_hass_websocket.diff import diff_files
+from mock_hass_websocket.main import app
+from mock_hass_websocket.recordings import iter_recording
+from mock_hass_websocket.replay import replay_script
+
+def write_soak(path, count):
+    with BinaryRecordingWriter(path) as writer:
+        for i in range(count):
+            if i % 3 == 2:
+                writer.write("received", {"id": i, "type": "call_service", "domain": "light"}, 100.0 + i)
+            else:
+                writer.write("sent", {"id": 1, "type": "event", "event": {"n": i}}, 100.0 + i)
+    return path
+
+def test_random_access_and_index_queries(tmp_path):
+    path = write_soak(tmp_path / "soak.mhrec", 10000)
+    assert is_binary_recording(path)
+    with BinaryRecording(path) as recording:
+        assert len(recording) == 10000
+        assert recording[5000] == {"timestamp": 5100.0, "direction": "received", "payload": {"id": 5000, "type": "call_service", "domain": "light"}}
+        assert recording[-1]["payload"]["event"] == {"n": 9999}
+        with pytest.raises(IndexError):
+            recording[10000]
+
+        assert recording.count(msg_type="call_service") == 3333
+        assert recording.count(direction="sent") == 6667
+        assert recording.count(msg_type="ping") == 0
+
+        # Minute 37 of the run
+        position = recording.position_at(37 * 60)
+        assert position == 2220
+        assert next(recording.entries(start=position))["timestamp"] == 100.0 + 2220
+        calls = list(recording.entries(start=9990, direction="received"))
+        assert [c["payload"]["id"] for c in calls] == [9992, 9995, 9998]
+        assert json.loads(recording.payload_bytes(2)) == {"id": 2, "type": "call_service", "domain": "light"}
+
+def test_json_round_trip_and_existing_readers(tmp_path):
+    source = "scenarios/recordings/3_motion_light.json"
+    packed = tmp_path / "motion.mhrec"
+    assert json_to_binary(source, packed) == 4
+
+    assert diff_files(source, packed) == []
+    assert list(iter_recording(packed)) == list(iter_recording(source))
+    assert len(list(replay_script(packed).items)) == 4
+
+    unpacked = tmp_path / "motion.json"
+    binary_to_json(packed, unpacked)
+    with open(source) as f:
+        assert json.loads(unpacked.read_text()) == json.load(f)
+    binary_to_json(packed, tmp_path / "motion.jsonl", lines=True)
+    assert len((tmp_path / "motion.jsonl").read_text().splitlines()) == 4
+
+def test_unclosed_recording_is_rejected(tmp_path):
+    writer = BinaryRecordingWriter(tmp_path / "broken.mhrec")
+    writer.write("sent", {"type": "event"})
+    writer._file.flush()
+    with pytest.raises(ValueError, match="index is missing"):
+        BinaryRecording(tmp_path / "broken.mhrec")
+    writer.close()
+    with BinaryRecording(tmp_path / "broken.mhrec") as recording:
+        assert recording[0] == {"timestamp": None, "direction": "sent", "payload": {"type": "event"}}
+
+def test_convert_cli(tmp_path):
+    runner = CliRunner()
+    packed = tmp_path / "cube.mhrec"
+    result = runner.invoke(app, ["convert", "scenarios/recordings/9_cube_flip.json", str(packed)])
+    assert result.exit_code == 0
+    assert "Wrote" in result.stdout
+
+    result = runner.invoke(app, ["convert", str(packed), str(tmp_path / "cube.json")])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["convert", str(tmp_path / "cube.json"), str(tmp_path / "again.json")])
+    assert result.exit_code != 0
@@ -0,0 +1,56 @@
+import pytest
+from mock_hass_websocket.commands import CommandValidator, COMMAND_TYPES
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, ExpectInteraction
+from mock_hass_websocket.transports import connect_in_process
+
+def test_command_types_cover_the_union():
+    assert {"auth", "call_service", "ping", "subscribe_events", "get_services_for_target"} <= COMMAND_TYPES
+    assert "result" not in COMMAND_TYPES
+
+def test_valid_commands_pass():
+    validator = CommandValidator()
+    assert validator.check({"type": "auth", "access_token": "abc"}) is None
+    assert validator.check({"id": 1, "type": "ping"}) is None
+    assert validator.check({"id": 2, "type": "call_service", "domain": "light", "service": "turn_on"}) is None
+    # Lenient mode coerces and lets unmodelled commands through
+    assert validator.check({"id": "3", "type": "ping"}) is None
+    assert validator.check({"id": 4, "type": "render_template", "template": "{{ 1 }}"}) is None
+
+def test_invalid_command_gets_error_result():
+    error = CommandValidator().check({"id": 5, "type": "call_service", "domain": "light"})
+    assert error.id == 5
+    assert not error.success
+    assert error.error.code == "invalid_format"
+    assert "service" in error.error.message
+
+    error = CommandValidator().check(["not", "a", "mapping"])
+    assert error.id == 0
+    assert error.error.code == "invalid_format"
+
+def test_strict_mode():
+    validator = CommandValidator(strict=True)
+    assert validator.check({"id": 1, "type": "ping"}) is None
+    assert validator.check({"id": "1", "type": "ping"}).error.code == "invalid_format"
+    error = validator.check({"id": 2, "type": "render_template"})
+    assert error.id == 2
+    assert error.error.code == "unknown_command"
+
+@pytest.mark.asyncio
+async def test_engine_rejects_invalid_commands():
+    script = Script(validate_commands="strict", items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "call_service"}),
+    ])
+    engine = Engine(script)
+    async with connect_in_process(engine) as ws:
+        await ws.send({"id": 1, "type": "call_service", "domain": "light"})
+        reply = await ws.recv()
+        assert reply["id"] == 1
+        assert reply["success"] is False
+        assert reply["error"]["code"] == "invalid_format"
+
+        await ws.send({"id": 2, "type": "call_service", "domain": "light", "service": "turn_on"})
+        await ws.engine_task
+
+    # The rejected command is recorded but never matched
+    assert [(log.direction, log.payload.get("id")) for log in engine.history] == [("received", 1), ("sent", 1), ("received", 2)]
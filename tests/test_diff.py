@@ -0,0 +1,74 @@
+import json
+from typer.testing import CliRunner
+from mock_hass_websocket.diff import IgnoreRules, diff_recordings, diff_files
+from mock_hass_websocket.main import app
+
+def rec(direction, payload, timestamp=0.0):
+    return {"timestamp": timestamp, "direction": direction, "payload": payload}
+
+def test_identical_recordings_ignore_timestamps():
+    expected = [rec("sent", {"a": 1}, 1.0), rec("received", {"b": 2}, 2.0)]
+    actual = [rec("sent", {"a": 1}, 5.0), rec("received", {"b": 2}, 9.0)]
+    assert diff_recordings(expected, actual) == []
+
+def test_reports_path_of_first_divergence():
+    expected = [rec("sent", {"event": {"data": {"state": "on"}}})]
+    actual = [rec("sent", {"event": {"data": {"state": "off"}}})]
+    [difference] = diff_recordings(expected, actual)
+    assert difference.index == 0
+    assert difference.path == "payload.event.data.state"
+    assert (difference.expected, difference.actual) == ("on", "off")
+    assert "value differs" in str(difference)
+
+def test_length_mismatch_and_bounded_collection():
+    expected = [rec("sent", {"n": n}) for n in range(5)]
+    actual = [rec("sent", {"n": n + 1}) for n in range(3)]
+    assert len(diff_recordings(expected, actual, max_diffs=2)) == 2
+    differences = diff_recordings(expected, actual, max_diffs=None)
+    assert [d.reason for d in differences[-2:]] == ["missing entry", "missing entry"]
+
+def test_ignore_paths_with_wildcards():
+    rules = IgnoreRules(["payload.id", "payload.**.context", "payload.items.*.ts"])
+    value = {"payload": {"id": 5, "event": {"context": {"id": "x"}, "data": {"context": 1, "keep": 2}}, "items": [{"ts": 1, "v": 1}]}}
+    assert rules.normalise(value) == {"payload": {"event": {"data": {"keep": 2}}, "items": [{"v": 1}]}}
+
+def test_ignore_presets():
+    expected = [rec("received", {"id": 1, "type": "ping"})]
+    actual = [rec("received", {"id": 7, "type": "ping"})]
+    assert diff_recordings(expected, actual)
+    assert diff_recordings(expected, actual, ignore=["timestamp", "ids"]) == []
+
+def test_unordered_mode():
+    expected = [rec("received", {"n": 1}), rec("received", {"n": 2}), rec("received", {"n": 2})]
+    actual = [rec("received", {"n": 2}), rec("received", {"n": 1}), rec("received", {"n": 2})]
+    assert diff_recordings(expected, actual)
+    assert diff_recordings(expected, actual, ordered=False) == []
+
+    actual[2] = rec("received", {"n": 3})
+    reasons = sorted(d.reason for d in diff_recordings(expected, actual, ordered=False, max_diffs=None))
+    assert reasons == ["missing entry (x1)", "unexpected entry"]
+
+def test_large_recordings_stream(tmp_path):
+    records = [{"direction": "sent", "payload": {"n": n, "s": "x"}} for n in range(100000)]
+    a = tmp_path / "a.json"
+    b = tmp_path / "b.json"
+    a.write_text(json.dumps(records))
+    records[-1]["payload"]["n"] = -1
+    b.write_text(json.dumps(records))
+    [difference] = diff_files(a, b)
+    assert difference.index == 99999
+
+def test_diff_cli(tmp_path):
+    a = tmp_path / "a.json"
+    b = tmp_path / "b.json"
+    a.write_text(json.dumps([rec("sent", {"x": 1})]))
+    b.write_text(json.dumps([rec("sent", {"x": 2})]))
+
+    runner = CliRunner()
+    result = runner.invoke(app, ["diff", str(a), str(a)])
+    assert result.exit_code == 0
+    assert "match" in result.stdout
+
+    result = runner.invoke(app, ["diff", str(a), str(b)])
+    assert result.exit_code == 1
+    assert "payload.x" in result.stdout
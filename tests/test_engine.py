@@ -1,8 +1,10 @@
 import pytest
 import asyncio
+import json
 from unittest.mock import AsyncMock, patch, MagicMock
 from mock_hass_websocket.engine import Engine, deep_match
 from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction
+from mock_hass_websocket.loader import ScriptStream
 
 # deep_match tests
 def test_deep_match_dict():
@@ -96,3 +98,26 @@ async def test_engine_expect_ignore_mismatch(mock_websocket):
     mock_websocket.__aiter__.side_effect = msg_iter
     
     await engine.run(mock_websocket)
+
+@pytest.mark.asyncio
+async def test_engine_streamed_script(mock_websocket):
+    consumed = []
+
+    def generate():
+        for n in range(50):
+            consumed.append(n)
+            yield {"type": "send", "at_ms": 0, "payload": {"n": n}}
+
+    engine = Engine(ScriptStream(generate), history_limit=10, lookahead=4)
+
+    def on_send(text):
+        # Items are pulled lazily: only the look-ahead window is decoded ahead of sending
+        sent = json.loads(text)["n"]
+        assert len(consumed) <= sent + 1 + engine.lookahead
+
+    mock_websocket.send.side_effect = on_send
+    await engine.run(mock_websocket)
+
+    assert mock_websocket.send.call_count == 50
+    assert len(engine.history) == 10
+    assert engine.history[-1].payload == {"n": 49}
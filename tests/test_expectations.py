@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from mock_hass_websocket.engine import deep_match
+from mock_hass_websocket.expectations import Expectations
+
+@pytest.mark.asyncio
+async def test_delivery_resolves_waiting_expectation():
+    expectations = Expectations(deep_match)
+    waiting = asyncio.create_task(expectations.expect({"type": "auth"}, 1.0))
+    await asyncio.sleep(0)
+    expectations.deliver({"type": "ping"})
+    expectations.deliver({"type": "auth", "access_token": "t"})
+    assert await waiting == {"type": "auth", "access_token": "t"}
+    # The mismatch was skipped, not kept
+    assert not expectations.backlog
+    expectations.close()
+
+@pytest.mark.asyncio
+async def test_early_messages_wait_for_the_next_expectation():
+    expectations = Expectations(deep_match)
+    expectations.deliver({"n": 1})
+    expectations.deliver({"n": 2})
+    assert await expectations.expect({"n": 2}, 0.1) == {"n": 2}
+    assert not expectations.backlog
+
+@pytest.mark.asyncio
+async def test_timeouts_share_one_timer():
+    expectations = Expectations(deep_match)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    with pytest.raises(asyncio.TimeoutError, match="timed out after 50ms"):
+        await expectations.expect({"n": 1}, 0.05)
+    assert loop.time() - start >= 0.04
+
+    # A settled expectation's deadline doesn't fire later
+    waiting = asyncio.create_task(expectations.expect({"n": 2}, 0.05))
+    await asyncio.sleep(0)
+    expectations.deliver({"n": 2})
+    await waiting
+    with pytest.raises(asyncio.TimeoutError):
+        await expectations.expect({"n": 3}, 0.1)
+    assert expectations._timer is None
+
+@pytest.mark.asyncio
+async def test_cancelled_expectation_releases_messages():
+    expectations = Expectations(deep_match)
+    waiting = asyncio.create_task(expectations.expect({"n": 1}, 1.0))
+    await asyncio.sleep(0)
+    waiting.cancel()
+    await asyncio.sleep(0)
+    expectations.deliver({"n": 1})
+    assert list(expectations.backlog) == [{"n": 1}]
+    expectations.close()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import logging
+import pytest
+import websockets
+from websockets.exceptions import ConnectionClosed
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.faults import FaultScheduler, FaultyConnection
+from mock_hass_websocket.models import FaultConfig, Script, SendInteraction, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.transports import connection_pair, connect_in_process
+
+async def transmit(config, count, size=10):
+    """Send `count` numbered messages through a faulty link; return what arrived."""
+    server, client = connection_pair()
+    faulty = FaultyConnection(server, config)
+    for i in range(count):
+        await faulty.send({"n": i, "pad": "x" * size})
+    received = []
+    while len(received) < count + faulty.stats["duplicated"] - faulty.stats["dropped"]:
+        received.append((await asyncio.wait_for(client.recv(), 2))["n"])
+    await faulty.close()
+    return received, faulty.stats
+
+def test_scheduler_is_reproducible():
+    config = FaultConfig(seed=7, drop_rate=0.3, duplicate_rate=0.2, latency_ms=20, jitter_ms=10, distribution="normal")
+    a, b = FaultScheduler(config, "send"), FaultScheduler(config, "send")
+    assert [a.decide() for _ in range(100)] == [b.decide() for _ in range(100)]
+    # Directions are independent streams
+    c = FaultScheduler(config, "receive")
+    assert [c.decide() for _ in range(100)] != [FaultScheduler(config, "send").decide() for _ in range(100)]
+
+@pytest.mark.asyncio
+async def test_drops_and_duplicates_are_seeded():
+    config = FaultConfig(seed=3, drop_rate=0.25, duplicate_rate=0.25)
+    received, stats = await transmit(config, 40)
+    again, _ = await transmit(config, 40)
+    assert received == again
+    assert stats["dropped"] > 0 and stats["duplicated"] > 0
+    assert len(received) == 40 - stats["dropped"] + stats["duplicated"]
+    assert received == sorted(received)
+
+@pytest.mark.asyncio
+async def test_latency_preserves_order():
+    config = FaultConfig(seed=1, latency_ms=30, jitter_ms=25, distribution="uniform")
+    start = asyncio.get_running_loop().time()
+    received, stats = await transmit(config, 10)
+    assert received == list(range(10))
+    assert stats["delayed"] > 0
+    assert asyncio.get_running_loop().time() - start >= 0.005
+
+@pytest.mark.asyncio
+async def test_bandwidth_cap():
+    config = FaultConfig(bandwidth_bps=20000)
+    start = asyncio.get_running_loop().time()
+    received, _ = await transmit(config, 10, size=200)
+    # ~2 KB at 20 KB/s
+    assert asyncio.get_running_loop().time() - start >= 0.09
+    assert received == list(range(10))
+
+@pytest.mark.asyncio
+async def test_dropped_requests_never_reach_the_script():
+    script = Script(
+        faults=FaultConfig(direction="receive", drop_rate=1.0),
+        items=[ExpectInteraction(type="expect", timeout_ms=100, match={"type": "auth"})],
+    )
+    async with connect_in_process(Engine(script)) as ws:
+        await ws.send({"type": "auth"})
+        with pytest.raises(asyncio.TimeoutError):
+            await ws.engine_task
+
+@pytest.mark.asyncio
+async def test_forced_disconnect_and_reconnect():
+    script = Script(
+        faults=FaultConfig(disconnect_at_ms=[100]),
+        items=[SendInteraction(type="send", at_ms=0, payload={"type": "auth_required"})],
+    )
+    async with MockHass(engine=Engine(script)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert json.loads(await ws.recv()) == {"type": "auth_required"}
+            with pytest.raises(ConnectionClosed):
+                await asyncio.wait_for(ws.recv(), 2)
+        # The client can come back and gets a fresh session
+        async with websockets.connect(server.ws_url) as ws:
+            assert json.loads(await ws.recv()) == {"type": "auth_required"}
+
+@pytest.mark.asyncio
+async def test_delayed_get_states_answers_keep_their_ids():
+    script = Script(
+        states=[{"entity_id": "light.hall", "state": "on"}],
+        faults=FaultConfig(latency_ms=100),
+        items=[ExpectInteraction(type="expect", timeout_ms=2000, match={"id": 2})],
+    )
+    async with MockHass(engine=Engine(script)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 1, "type": "get_states"}))
+            await ws.send(json.dumps({"id": 2, "type": "get_states"}))
+            # Both answers are still queued when the second one is encoded
+            ids = [json.loads(await asyncio.wait_for(ws.recv(), 2))["id"] for _ in range(2)]
+    assert ids == [1, 2]
+
+@pytest.mark.asyncio
+async def test_connection_stays_open_after_script_with_receive_faults(caplog):
+    script = Script(
+        faults=FaultConfig(latency_ms=20, direction="receive"),
+        items=[ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "ping"})],
+    )
+    caplog.set_level(logging.DEBUG, logger="mock_hass_websocket.server")
+    async with MockHass(engine=Engine(script)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 1, "type": "ping"}))
+            await asyncio.sleep(0.2)
+            await ws.send(json.dumps({"id": 2, "type": "ping"}))
+            await asyncio.sleep(0.2)
+    assert "Received after script completion" in caplog.text
+    assert "Error during execution" not in caplog.text
@@ -1,8 +1,8 @@
 import pytest
 import yaml
 from pathlib import Path
-from mock_hass_websocket.loader import load_script
-from mock_hass_websocket.models import SendInteraction, ExpectInteraction
+from mock_hass_websocket.loader import load_script, stream_script, ScriptStream, ScriptError
+from mock_hass_websocket.models import SendInteraction, ExpectInteraction, SetStateInteraction
 
 def test_load_script_valid(tmp_path):
     script_content = """
@@ -24,6 +24,22 @@ def test_load_script_valid(tmp_path):
     assert isinstance(script.items[1], ExpectInteraction)
     assert script.items[1].timeout_ms == 500
 
+def test_load_script_set_state(tmp_path):
+    p = tmp_path / "scenario.yaml"
+    p.write_text("""
+    script:
+      - type: set_state
+        at_ms: 50
+        entity_id: light.kitchen
+        state: "on"
+        attributes: {brightness: 255}
+    """)
+
+    item = load_script(p).items[0]
+    assert isinstance(item, SetStateInteraction)
+    assert item.entity_id == "light.kitchen"
+    assert item.attributes == {"brightness": 255}
+
 def test_load_script_file_not_found():
     with pytest.raises(FileNotFoundError):
         load_script(Path("non_existent_file.yaml"))
@@ -54,3 +70,122 @@ def test_load_script_missing_script_key(tmp_path):
     # helper returns empty script if key missing
     script = load_script(p)
     assert script.items == []
+    assert script.states is None
+
+def test_stream_script_yaml(tmp_path):
+    p = tmp_path / "scenario.yaml"
+    p.write_text("""
+    variables: {room: kitchen}
+    seed: 3
+    states:
+      - {entity_id: light.kitchen, state: "on"}
+    script:
+      - type: send
+        at_ms: 100
+        payload: {event: hello}
+      - type: expect
+        timeout_ms: 500
+        match: {event: world}
+    """)
+
+    stream = stream_script(p)
+    assert stream.variables == {"room": "kitchen"}
+    assert stream.seed == 3
+    assert stream.states == [{"entity_id": "light.kitchen", "state": "on"}]
+    # Each iteration re-reads the file, so a stream can be run repeatedly
+    for _ in range(2):
+        items = list(stream.items)
+        assert [type(i) for i in items] == [SendInteraction, ExpectInteraction]
+        assert items[0].payload == {"event": "hello"}
+
+def test_stream_script_is_lazy(tmp_path):
+    p = tmp_path / "scenario.yaml"
+    p.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        payload: {n: 1}
+      - type: bogus
+    """)
+
+    items = iter(stream_script(p))
+    assert next(items).payload == {"n": 1}
+    with pytest.raises(ValueError, match="Unknown interaction type"):
+        next(items)
+
+def test_stream_script_jsonl(tmp_path):
+    p = tmp_path / "scenario.jsonl"
+    p.write_text(
+        '{"variables": {"x": 1}}\n'
+        '{"type": "send", "at_ms": 0, "payload": {"a": 1}}\n'
+        '\n'
+        '{"type": "expect", "timeout_ms": 10, "match": {"b": 2}}\n'
+    )
+
+    stream = stream_script(p)
+    assert stream.variables == {"x": 1}
+    items = list(stream)
+    assert items[0].payload == {"a": 1}
+    assert items[1].match == {"b": 2}
+
+def test_stream_script_generator():
+    def generate():
+        for n in range(3):
+            yield {"type": "send", "at_ms": n, "payload": {"n": n}}
+
+    stream = ScriptStream(generate)
+    assert [i.payload["n"] for i in stream] == [0, 1, 2]
+    assert [i.payload["n"] for i in stream] == [0, 1, 2]
+
+def test_load_script_reports_every_error_location(tmp_path):
+    p = tmp_path / "bad_fields.yaml"
+    p.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        payload: {}
+      - type: send
+        payload: {}
+      - type: expect
+        timeout_ms: soon
+        match: {}
+    """)
+
+    with pytest.raises(ScriptError) as excinfo:
+        load_script(p)
+    message = str(excinfo.value)
+    assert "script[1].at_ms: Field required" in message
+    assert "script[2].timeout_ms:" in message
+    assert "script[0]" not in message
+
+def test_stream_script_error_location():
+    stream = ScriptStream(lambda: [{"type": "send", "at_ms": 0, "payload": 1}, {"type": "send", "payload": 2}])
+    with pytest.raises(ScriptError, match=r"script\[1\]\.at_ms"):
+        list(stream)
+
+def test_template_errors_fail_the_load(tmp_path):
+    p = tmp_path / "bad_template.yaml"
+    p.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        template: true
+        payload: {id: "${counter()}"}
+      - type: send
+        at_ms: 0
+        template: true
+        payload: {value: "${1 +}"}
+    """)
+    with pytest.raises(ScriptError, match=r"script\[1\]: .*Invalid template expression: 1 \+"):
+        load_script(p)
+    stream = stream_script(p)
+    with pytest.raises(ScriptError, match=r"script\[1\]"):
+        list(stream)
+
+def test_builtin_template_names_are_reserved(tmp_path):
+    p = tmp_path / "reserved.yaml"
+    p.write_text("variables: {last_id: 3}\nscript: []\n")
+    with pytest.raises(ScriptError, match="'last_id' is a built-in template variable"):
+        load_script(p)
+    with pytest.raises(ScriptError, match="'last_id' is a built-in template variable"):
+        stream_script(p)
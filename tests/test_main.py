@@ -30,3 +30,21 @@ def test_main_cli_missing_config():
     runner = CliRunner()
     result = runner.invoke(app, []) # Missing required --config
     assert result.exit_code != 0
+
+@patch("mock_hass_websocket.main.start_server", new_callable=AsyncMock)
+def test_main_cli_http_options(mock_start, tmp_path):
+    config = tmp_path / "config.yaml"
+    config.touch()
+
+    runner = CliRunner()
+    result = runner.invoke(app, ["--config", str(config)])
+    assert result.exit_code == 0
+    assert mock_start.call_args.kwargs["http_options"] is None
+
+    result = runner.invoke(app, ["--config", str(config), "--high-throughput", "--backlog", "512", "--reuse-port"])
+    assert result.exit_code == 0
+    options = mock_start.call_args.kwargs["http_options"]
+    assert options.backlog == 512
+    assert options.reuse_port
+    assert not options.access_log
+    assert options.keepalive_timeout == 300
@@ -2,18 +2,10 @@ import pytest
 import asyncio
 import json
 import websockets
-from pathlib import Path
-from mock_hass_websocket.server import start_server
-
-@pytest.fixture
-def unused_tcp_port():
-    import socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('127.0.0.1', 0))
-        return s.getsockname()[1]
+from mock_hass_websocket.server import MockHass
 
 @pytest.mark.asyncio
-async def test_persistence(unused_tcp_port, tmp_path):
+async def test_persistence(tmp_path):
     # Script does one thing then finishes
     content = """
     script:
@@ -24,12 +16,8 @@ async def test_persistence(unused_tcp_port, tmp_path):
     p = tmp_path / "persistence.yaml"
     p.write_text(content)
     
-    port = unused_tcp_port
-    server_task = asyncio.create_task(start_server("127.0.0.1", port, p))
-    await asyncio.sleep(0.5)
-    
-    try:
-        async with websockets.connect(f"ws://127.0.0.1:{port}/api/websocket") as ws:
+    async with MockHass(p) as server:
+        async with websockets.connect(server.ws_url) as ws:
             # Receive the "done" message
             msg = await ws.recv()
             assert json.loads(msg) == {"msg": "done"}
@@ -47,9 +35,3 @@ async def test_persistence(unused_tcp_port, tmp_path):
                 pass
             except websockets.exceptions.ConnectionClosed:
                 pytest.fail("Connection closed prematurely by server after script finished")
-    finally:
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
@@ -0,0 +1,51 @@
+import json
+import pstats
+import aiohttp
+import pytest
+import websockets
+from mock_hass_websocket import engine as engine_module
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.profiling import Profiler
+from mock_hass_websocket.server import MockHass
+
+@pytest.mark.asyncio
+async def test_counters_and_cpu_profile(tmp_path, auth_script, login):
+    original = engine_module.Expectations
+    profiler = Profiler(tmp_path, cpu=True)
+    async with MockHass(engine=Engine(auth_script), profiler=profiler) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await login(ws)
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{server.url}/admin/profile/counters") as response:
+                counters = await response.json()
+
+    assert counters["send"]["calls"] == 2
+    assert counters["json_decode"]["calls"] == 1
+    # One match of the auth message, not one per level of the pattern
+    assert counters["deep_match"]["calls"] == 1
+    # Uninstalled on stop, and everything written out
+    assert engine_module.Expectations is original
+    assert json.loads((tmp_path / "counters.json").read_text())["send"]["calls"] == 2
+    pstats.Stats(str(tmp_path / "cpu-1.prof"))
+
+@pytest.mark.asyncio
+async def test_admin_endpoints_control_captures(tmp_path, auth_script, login):
+    profiler = Profiler(tmp_path, memory=True)
+    async with MockHass(engine=Engine(auth_script), profiler=profiler) as server:
+        async with aiohttp.ClientSession() as http:
+            async with http.post(f"{server.url}/admin/profile/stop") as response:
+                assert response.status == 409
+            async with http.post(f"{server.url}/admin/profile/start") as response:
+                assert response.status == 200
+            async with websockets.connect(server.ws_url) as ws:
+                await login(ws)
+            async with http.post(f"{server.url}/admin/profile/stop") as response:
+                cpu_file = (await response.json())["file"]
+            async with http.post(f"{server.url}/admin/profile/memory") as response:
+                memory_file = (await response.json())["file"]
+
+    assert pstats.Stats(cpu_file).total_calls > 0
+    assert open(memory_file).readline() == "# process\n"
+    # The process growth while the session was open was written when it ended
+    sessions = [p for p in tmp_path.glob("memory-*.txt") if p.read_text().startswith("# process growth during session")]
+    assert len(sessions) == 1
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import aiohttp
+import pytest
+import websockets
+from websockets.sync.client import connect
+from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction
+
+def make_script(tag):
+    return Script(items=[
+        SendInteraction(type="send", at_ms=0, payload={"tag": tag}),
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"ack": tag}),
+    ])
+
+def test_sync_session(mock_hass):
+    session = mock_hass(make_script("sync"))
+    with connect(session.ws_url) as ws:
+        assert json.loads(ws.recv(timeout=5)) == {"tag": "sync"}
+        ws.send(json.dumps({"ack": "sync"}))
+        history = session.wait(timeout=5)
+    assert [log.direction for log in history] == ["sent", "received"]
+
+@pytest.mark.asyncio
+async def test_sessions_are_isolated(mock_hass, mock_hass_server):
+    first = mock_hass(make_script("a"))
+    second = mock_hass(make_script("b"))
+    assert first.url != second.url
+    assert first.url.startswith(f"http://127.0.0.1:{mock_hass_server.port}/session/")
+
+    async def drive(session, tag):
+        async with websockets.connect(session.ws_url) as ws:
+            assert json.loads(await ws.recv()) == {"tag": tag}
+            await ws.send(json.dumps({"ack": tag}))
+            await session.wait_async(timeout=5)
+
+    await asyncio.gather(drive(first, "a"), drive(second, "b"))
+    assert first.history[0].payload == {"tag": "a"}
+    assert second.history[0].payload == {"tag": "b"}
+
+@pytest.mark.asyncio
+async def test_session_failure_is_reported(mock_hass):
+    session = mock_hass(Script(items=[ExpectInteraction(type="expect", timeout_ms=50, match={"never": True})]))
+    async with websockets.connect(session.ws_url):
+        with pytest.raises(asyncio.TimeoutError):
+            await session.wait_async(timeout=5)
+
+@pytest.mark.asyncio
+async def test_unknown_session_rejected(mock_hass_server):
+    with pytest.raises(websockets.exceptions.InvalidStatus):
+        async with websockets.connect(f"ws://127.0.0.1:{mock_hass_server.port}/session/nope/api/websocket"):
+            pass
+
+@pytest.mark.asyncio
+async def test_session_serves_rest(mock_hass):
+    session = mock_hass(make_script("rest"))
+    async with aiohttp.ClientSession() as http:
+        async with http.post(f"{session.url}/api/states/light.desk", json={"state": "on"}) as response:
+            assert response.status == 201
+        async with http.get(f"{session.url}/api/states") as response:
+            assert [state["entity_id"] for state in await response.json()] == ["light.desk"]
+    assert session.history[0].payload["path"] == f"/session/{session.session_id}/api/states/light.desk"
+
+def test_session_from_scenario_file(mock_hass):
+    session = mock_hass("scenarios/feature_ping_pong.yaml")
+    assert session.engine.script.items
@@ -0,0 +1,72 @@
+import io
+import json
+import pytest
+from unittest.mock import patch, AsyncMock
+from typer.testing import CliRunner
+from mock_hass_websocket.main import app
+from mock_hass_websocket.models import SendInteraction, ExpectInteraction
+from mock_hass_websocket.recordings import iter_json_array, iter_recording, normalise_record
+from mock_hass_websocket.replay import recording_to_interactions, replay_script
+
+def test_iter_json_array_small_chunks():
+    records = [{"direction": "sent", "payload": {"text": "a]b,c" * n}} for n in range(20)]
+    text = json.dumps(records, indent=2)
+    for chunk_size in (1, 3, 17, 4096):
+        assert list(iter_json_array(io.StringIO(text), chunk_size)) == records
+
+def test_iter_json_array_errors():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[{}, ")))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("{}")))
+
+def test_iter_recording_jsonl(tmp_path):
+    p = tmp_path / "capture.jsonl"
+    p.write_text(
+        '{"ts": 10.0, "dir": "out", "message": "{\\"type\\": \\"auth_required\\"}"}\n'
+        '{"ts": 10.5, "dir": "in", "message": {"type": "auth"}}\n'
+    )
+    records = list(iter_recording(p))
+    assert records == [
+        {"timestamp": 10.0, "direction": "sent", "payload": {"type": "auth_required"}},
+        {"timestamp": 10.5, "direction": "received", "payload": {"type": "auth"}},
+    ]
+
+def test_normalise_record_rejects_unknown_direction():
+    with pytest.raises(ValueError, match="direction"):
+        normalise_record({"direction": "sideways", "payload": {}})
+
+def test_recording_to_interactions_timing():
+    records = [
+        {"timestamp": 100.0, "direction": "sent", "payload": {"type": "auth_required"}},
+        {"timestamp": 100.2, "direction": "received", "payload": {"id": 1, "type": "auth"}},
+        {"timestamp": 110.0, "direction": "sent", "payload": {"type": "auth_ok"}},
+    ]
+    items = list(recording_to_interactions(records, speed=100, strip_keys=["id"]))
+    assert isinstance(items[0], SendInteraction) and items[0].at_ms == 0
+    assert isinstance(items[1], ExpectInteraction) and items[1].match == {"type": "auth"}
+    assert isinstance(items[2], SendInteraction) and items[2].at_ms == 100
+
+    sends_only = list(recording_to_interactions(records, expect=False))
+    assert [i.type for i in sends_only] == ["send", "send"]
+    assert sends_only[1].at_ms == 10000
+
+def test_replay_script_from_repo_recording():
+    script = replay_script("scenarios/recordings/feature_call_service.json")
+    items = list(script)
+    assert [i.type for i in items] == ["expect", "send"] * 3
+    assert items[0].match["type"] == "call_service"
+    assert all(i.at_ms == 0 for i in items if i.type == "send")
+
+@patch("mock_hass_websocket.main.start_server", new_callable=AsyncMock)
+def test_replay_cli(mock_start, tmp_path):
+    recording = tmp_path / "rec.json"
+    recording.write_text(json.dumps([{"direction": "sent", "payload": {"a": 1}}]))
+
+    runner = CliRunner()
+    result = runner.invoke(app, ["replay", str(recording), "--port", "9001", "--speed", "10"])
+
+    assert result.exit_code == 0, result.output
+    mock_start.assert_awaited_once()
+    engine = mock_start.call_args.kwargs["engine"]
+    assert [i.payload for i in engine.script.items] == [{"a": 1}]
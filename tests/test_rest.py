@@ -0,0 +1,151 @@
+import asyncio
+import json
+import aiohttp
+import pytest
+import websockets
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import HttpOptions, Script, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+
+STATES = [
+    {"entity_id": "light.kitchen", "state": "on", "attributes": {"brightness": 200}},
+    {"entity_id": "sensor.temperature", "state": "21.5", "attributes": {}},
+]
+
+@pytest.mark.asyncio
+async def test_get_states_and_entity():
+    async with MockHass(engine=Engine(Script(states=STATES))) as server:
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{server.url}/api/states") as response:
+                assert response.status == 200
+                assert await response.json() == STATES
+            async with http.get(f"{server.url}/api/states/light.kitchen") as response:
+                assert await response.json() == STATES[0]
+            async with http.get(f"{server.url}/api/states/light.missing") as response:
+                assert response.status == 404
+                assert await response.json() == {"message": "Entity not found."}
+
+@pytest.mark.asyncio
+async def test_etag_answers_not_modified_until_a_change():
+    engine = Engine(Script(states=STATES))
+    async with MockHass(engine=engine) as server:
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{server.url}/api/states") as response:
+                etag = response.headers["ETag"]
+            async with http.get(f"{server.url}/api/states/sensor.temperature") as response:
+                entity_etag = response.headers["ETag"]
+
+            async with http.get(f"{server.url}/api/states", headers={"If-None-Match": etag}) as response:
+                assert response.status == 304
+                assert await response.read() == b""
+
+            async with http.post(f"{server.url}/api/states/light.kitchen", json={"state": "off"}) as response:
+                assert response.status == 200
+            async with http.get(f"{server.url}/api/states", headers={"If-None-Match": etag}) as response:
+                assert response.status == 200
+                assert response.headers["ETag"] != etag
+            # Other entities keep their ETag
+            async with http.get(f"{server.url}/api/states/sensor.temperature", headers={"If-None-Match": entity_etag}) as response:
+                assert response.status == 304
+
+@pytest.mark.asyncio
+async def test_post_state_creates_and_notifies_subscribers():
+    script = Script(items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "subscribe_events"}),
+        ExpectInteraction(type="expect", timeout_ms=2000, match={"type": "never"}),
+    ])
+    engine = Engine(script)
+    async with MockHass(engine=engine) as server:
+        async with websockets.connect(server.ws_url) as ws, aiohttp.ClientSession() as http:
+            await ws.send(json.dumps({"id": 1, "type": "subscribe_events", "event_type": "state_changed"}))
+            await asyncio.sleep(0.1)
+            body = {"state": 5, "attributes": {"unit_of_measurement": "W"}}
+            async with http.post(f"{server.url}/api/states/sensor.power", json=body) as response:
+                assert response.status == 201
+                assert response.headers["Location"] == "/api/states/sensor.power"
+                created = await response.json()
+            assert created["state"] == "5"
+
+            event = json.loads(await ws.recv())
+            assert event["id"] == 1
+            assert event["event"]["data"]["new_state"] == created
+            assert event["event"]["data"]["old_state"] is None
+
+            async with http.post(f"{server.url}/api/states/sensor.power", json={"attributes": {}}) as response:
+                assert response.status == 400
+
+@pytest.mark.asyncio
+async def test_rest_store_of_a_stateless_scenario():
+    script = Script(items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "get_states"}),
+    ])
+    engine = Engine(script)
+    async with MockHass(engine=engine) as server:
+        async with aiohttp.ClientSession() as http:
+            async with http.post(f"{server.url}/api/states/light.hall", json={"state": "on"}) as response:
+                assert response.status == 201
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 1, "type": "get_states"}))
+            # The scenario has no states, so get_states is left to the script
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(ws.recv(), 0.3)
+        async with aiohttp.ClientSession() as http:
+            # Connecting didn't discard what was set over REST
+            async with http.get(f"{server.url}/api/states/light.hall") as response:
+                assert (await response.json())["state"] == "on"
+
+@pytest.mark.asyncio
+async def test_services_and_events_are_recorded():
+    script = Script(items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "subscribe_events"}),
+        ExpectInteraction(type="expect", timeout_ms=2000, match={"type": "never"}),
+    ])
+    engine = Engine(script)
+    async with MockHass(engine=engine) as server:
+        async with websockets.connect(server.ws_url) as ws, aiohttp.ClientSession() as http:
+            await ws.send(json.dumps({"id": 2, "type": "subscribe_events", "event_type": "door_knock"}))
+            await asyncio.sleep(0.1)
+            async with http.post(f"{server.url}/api/services/light/turn_on", json={"entity_id": "light.kitchen"}) as response:
+                assert await response.json() == []
+            async with http.post(f"{server.url}/api/events/door_knock", json={"door": "front"}) as response:
+                assert await response.json() == {"message": "Event door_knock fired."}
+
+            event = json.loads(await ws.recv())
+            assert event["event"]["event_type"] == "door_knock"
+            assert event["event"]["data"] == {"door": "front"}
+
+    calls = [log.payload for log in engine.history if log.payload.get("type") == "rest"]
+    assert calls == [
+        {"type": "rest", "method": "POST", "path": "/api/services/light/turn_on", "body": {"entity_id": "light.kitchen"}},
+        {"type": "rest", "method": "POST", "path": "/api/events/door_knock", "body": {"door": "front"}},
+    ]
+
+@pytest.mark.asyncio
+async def test_session_rest_routes_use_their_own_store():
+    sessions = {"a": Engine(Script(states=STATES)), "b": Engine(Script(states=[]))}
+    async with MockHass(sessions=sessions) as server:
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"{server.url}/session/a/api/states") as response:
+                assert len(await response.json()) == 2
+            async with http.get(f"{server.url}/session/b/api/states") as response:
+                assert await response.json() == []
+            async with http.get(f"{server.url}/session/c/api/states") as response:
+                assert response.status == 404
+
+@pytest.mark.asyncio
+async def test_high_throughput_keeps_connections_alive():
+    options = HttpOptions.high_throughput(reuse_port=True)
+    async with MockHass(engine=Engine(Script(states=STATES)), http_options=options) as server:
+        opened = []
+        async def on_connection_create_end(session, context, params):
+            opened.append(params)
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(on_connection_create_end)
+
+        async with aiohttp.ClientSession(trace_configs=[trace]) as http:
+            for _ in range(3):
+                async with http.get(f"{server.url}/api/states") as response:
+                    assert response.status == 200
+                    await response.read()
+        # One pooled connection served every request
+        assert len(opened) == 1
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+import websockets
+from websockets.exceptions import ConnectionClosed
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, SendInteraction, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+
+SCRIPTED_AUTH = {"type": "auth_required", "ha_version": "scripted"}
+
+def session_script(event_at_ms=0):
+    return Script(items=[
+        SendInteraction(type="send", at_ms=0, payload=SCRIPTED_AUTH),
+        ExpectInteraction(type="expect", timeout_ms=3000, match={"type": "auth"}),
+        SendInteraction(type="send", at_ms=0, payload={"type": "auth_ok"}),
+        ExpectInteraction(type="expect", timeout_ms=3000, match={"type": "subscribe_events"}),
+        SendInteraction(type="send", at_ms=event_at_ms, payload={"id": 1, "type": "event"}),
+    ])
+
+@pytest.mark.asyncio
+async def test_reconnect_resumes_script(login):
+    engine = Engine(session_script())
+    async with MockHass(engine=engine, resume_grace_ms=2000) as server:
+        url = f"{server.ws_url}?client_id=app1"
+        async with websockets.connect(url) as ws:
+            assert (await login(ws, greeting=SCRIPTED_AUTH))["type"] == "auth_ok"
+
+        # Same client again: the handshake is answered natively and the script carries on
+        async with websockets.connect(url) as ws:
+            assert json.loads(await ws.recv())["ha_version"] != "scripted"
+            await ws.send(json.dumps({"type": "auth", "access_token": "t"}))
+            assert json.loads(await ws.recv())["type"] == "auth_ok"
+            await ws.send(json.dumps({"id": 1, "type": "subscribe_events"}))
+            assert json.loads(await ws.recv()) == {"id": 1, "type": "event"}
+
+        assert len(server.resume.reconnect_latencies) == 1
+        assert server.resume.reconnect_latencies[0] > 0
+
+    # Handshake messages of the second connection never reached the script
+    assert [log.payload["type"] for log in engine.history] == ["auth_required", "auth", "auth_ok", "subscribe_events", "event"]
+
+@pytest.mark.asyncio
+async def test_messages_sent_while_away_are_buffered(login):
+    script = Script(items=[
+        SendInteraction(type="send", at_ms=0, payload=SCRIPTED_AUTH),
+        SendInteraction(type="send", at_ms=200, payload={"type": "event", "n": 1}),
+    ])
+    async with MockHass(engine=Engine(script), resume_grace_ms=2000) as server:
+        headers = {"X-Client-Id": "app2"}
+        async with websockets.connect(server.ws_url, additional_headers=headers) as ws:
+            assert json.loads(await ws.recv()) == SCRIPTED_AUTH
+        await asyncio.sleep(0.4)
+        async with websockets.connect(server.ws_url, additional_headers=headers) as ws:
+            assert (await login(ws))["type"] == "auth_ok"
+            assert json.loads(await ws.recv()) == {"type": "event", "n": 1}
+
+@pytest.mark.asyncio
+async def test_session_expires_after_grace_window(login):
+    async with MockHass(engine=Engine(session_script()), resume_grace_ms=100) as server:
+        headers = {"Authorization": "Bearer secret"}
+        async with websockets.connect(server.ws_url, additional_headers=headers) as ws:
+            assert (await login(ws, greeting=SCRIPTED_AUTH))["type"] == "auth_ok"
+        await asyncio.sleep(0.3)
+        async with websockets.connect(server.ws_url, additional_headers=headers) as ws:
+            # A fresh run of the script
+            assert json.loads(await ws.recv()) == SCRIPTED_AUTH
+
+@pytest.mark.asyncio
+async def test_anonymous_clients_start_over():
+    script = Script(items=[SendInteraction(type="send", at_ms=0, payload=SCRIPTED_AUTH)])
+    async with MockHass(engine=Engine(script), resume_grace_ms=2000) as server:
+        for _ in range(2):
+            async with websockets.connect(server.ws_url) as ws:
+                assert json.loads(await ws.recv()) == SCRIPTED_AUTH
+
+@pytest.mark.asyncio
+async def test_reconnect_takes_over_a_stale_connection(login):
+    async with MockHass(engine=Engine(session_script(event_at_ms=300)), resume_grace_ms=2000) as server:
+        url = f"{server.ws_url}?client_id=app3"
+        old = await websockets.connect(url)
+        assert (await login(old))["type"] == "auth_ok"
+        async with websockets.connect(url) as ws:
+            assert (await login(ws))["type"] == "auth_ok"
+            with pytest.raises(ConnectionClosed):
+                await asyncio.wait_for(old.recv(), 2)
+            await ws.send(json.dumps({"id": 1, "type": "subscribe_events"}))
+            assert json.loads(await ws.recv()) == {"id": 1, "type": "event"}
@@ -4,20 +4,12 @@ import json
 import websockets
 from pathlib import Path
 from mock_hass_websocket.loader import load_script
-from mock_hass_websocket.server import start_server
 from mock_hass_websocket.models import SendInteraction, ExpectInteraction
+from mock_hass_websocket.diff import diff_recordings, format_differences
 
 SCENARIOS_DIR = Path("scenarios")
 SCENARIO_FILES = sorted(list(SCENARIOS_DIR.glob("*.yaml")))
 
-# Helper to find an unused port
-@pytest.fixture
-def unused_tcp_port():
-    import socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('127.0.0.1', 0))
-        return s.getsockname()[1]
-
 from mock_hass_websocket.engine import Engine, deep_match
 
 async def run_complementary_client(ws, script):
@@ -26,10 +18,11 @@ async def run_complementary_client(ws, script):
     """
     for item in script.items:
         if isinstance(item, SendInteraction):
-            # Server sends, we receive
+            # Server sends, we receive (once per repetition)
             # Use a generous timeout; some scenarios wait 5s
-            msg = await asyncio.wait_for(ws.recv(), timeout=10.0)
-            data = json.loads(msg)
+            for _ in range(item.repeat):
+                msg = await asyncio.wait_for(ws.recv(), timeout=10.0)
+                data = json.loads(msg)
         elif isinstance(item, ExpectInteraction):
             # Server expects, we send
             payload = item.match
@@ -66,9 +59,8 @@ def verify_history(engine: Engine, script, scenario_file: Path):
         # But for strictly controlled tests, they should match exactly or be a superset?
         # Let's assert exact match for now as our scenarios are deterministic.
         
-        # Deep diff or simple equality?
-        # Simple equality of list of dicts should work if deterministic.
-        assert actual_records == expected_records, f"History mismatch for {scenario_file.name}"
+        differences = diff_recordings(expected_records, actual_records, max_diffs=5)
+        assert not differences, f"History mismatch for {scenario_file.name}:\n{format_differences(differences)}"
     else:
         # Record (First run)
         # We might want to warn or just save.
@@ -81,28 +73,14 @@ def verify_history(engine: Engine, script, scenario_file: Path):
 
 @pytest.mark.asyncio
 @pytest.mark.parametrize("scenario_file", SCENARIO_FILES)
-async def test_scenario_end_to_end(unused_tcp_port, scenario_file):
-    port = unused_tcp_port
-    host = "127.0.0.1"
-    
-    # Load script and create engine manually to access it later
+async def test_scenario_end_to_end(mock_hass, scenario_file):
+    # Register the scenario on the shared server; its engine is kept for verification
     script = load_script(scenario_file)
-    engine = Engine(script)
+    session = mock_hass(script)
     
-    # Start server with injected engine
-    server_task = asyncio.create_task(start_server(host, port, scenario_file, engine=engine))
-    await asyncio.sleep(0.5) # Wait for startup
+    async with websockets.connect(session.ws_url) as ws:
+        await run_complementary_client(ws, script)
+        await session.wait_async(timeout=10.0)
     
-    try:
-        async with websockets.connect(f"ws://{host}:{port}/api/websocket") as ws:
-            await run_complementary_client(ws, script)
-        
-        # Verify history
-        verify_history(engine, script, scenario_file)
-            
-    finally:
-        server_task.cancel()
-        try:
-            await server_task
-        except asyncio.CancelledError:
-            pass
+    # Verify history
+    verify_history(session.engine, script, scenario_file)
@@ -1,9 +1,11 @@
 import pytest
 import asyncio
 import json
+import logging
 import websockets
-from pathlib import Path
-from mock_hass_websocket.server import start_server
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, ExpectInteraction
+from mock_hass_websocket.server import start_server, MockHass
 
 @pytest.fixture
 def unused_tcp_port():
@@ -49,10 +51,11 @@ async def test_server_end_to_end(unused_tcp_port, tmp_path):
     
     # Better: run start_server as a task, then cancel it.
     
-    server_task = asyncio.create_task(start_server(host, port, script_path))
+    ready = asyncio.Event()
+    server_task = asyncio.create_task(start_server(host, port, script_path, on_ready=lambda server: ready.set()))
     
-    # Wait for server to start (a bit hacky, but simple)
-    await asyncio.sleep(0.5)
+    # Wait for the server to signal it is bound
+    await asyncio.wait_for(ready.wait(), timeout=5)
     
     try:
         async with websockets.connect(f"ws://{host}:{port}/api/websocket") as ws:
@@ -75,3 +78,105 @@ async def test_server_end_to_end(unused_tcp_port, tmp_path):
             await server_task
         except asyncio.CancelledError:
             pass
+
+@pytest.mark.asyncio
+async def test_mock_hass_context_manager(tmp_path):
+    script_path = tmp_path / "scenario.yaml"
+    script_path.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        payload: {type: auth_required}
+    """)
+
+    async with MockHass(script_path) as server:
+        # Port 0 binds an ephemeral port, reported once ready
+        assert server.ready.is_set()
+        assert server.port != 0
+        async with websockets.connect(server.ws_url) as ws:
+            assert json.loads(await ws.recv()) == {"type": "auth_required"}
+
+    assert not server.ready.is_set()
+
+@pytest.mark.asyncio
+async def test_start_server_reports_bound_port(tmp_path):
+    script_path = tmp_path / "scenario.yaml"
+    script_path.write_text("script: []")
+    bound = asyncio.get_running_loop().create_future()
+
+    server_task = asyncio.create_task(start_server("127.0.0.1", 0, script_path, on_ready=bound.set_result))
+    try:
+        server = await asyncio.wait_for(bound, timeout=5)
+        assert server.address == ("127.0.0.1", server.port)
+        assert server.port > 0
+    finally:
+        server_task.cancel()
+        try:
+            await server_task
+        except asyncio.CancelledError:
+            pass
+
+@pytest.mark.asyncio
+async def test_compression_and_binary_frames(tmp_path):
+    from mock_hass_websocket.models import WebsocketOptions
+
+    script_path = tmp_path / "scenario.yaml"
+    script_path.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        payload: {type: auth_required}
+      - type: expect
+        match: {type: auth}
+        timeout_ms: 2000
+      - type: send
+        at_ms: 0
+        payload: {type: event, data: {state: "on", attributes: {long: "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa"}}}
+    """)
+    options = WebsocketOptions(compress_level=9, window_bits=10, compress_threshold=64, binary=True)
+
+    async with MockHass(script_path, ws_options=options) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert [e.name for e in ws.protocol.extensions] == ["permessage-deflate"]
+            first = await ws.recv()
+            # Binary frames arrive as bytes
+            assert isinstance(first, bytes)
+            assert json.loads(first) == {"type": "auth_required"}
+            # Clients may answer with binary frames too
+            await ws.send(json.dumps({"type": "auth"}).encode())
+            event = json.loads(await ws.recv())
+            assert event["data"]["attributes"]["long"] == "a" * 100
+        await asyncio.sleep(0.05)
+
+    assert server.engine.history[1].payload == {"type": "auth"}
+
+@pytest.mark.asyncio
+async def test_compression_can_be_disabled(tmp_path):
+    from mock_hass_websocket.models import WebsocketOptions
+
+    script_path = tmp_path / "scenario.yaml"
+    script_path.write_text("""
+    script:
+      - type: send
+        at_ms: 0
+        payload: {type: auth_required}
+    """)
+
+    async with MockHass(script_path, ws_options=WebsocketOptions(compress=False)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            assert ws.protocol.extensions == []
+            assert json.loads(await ws.recv()) == {"type": "auth_required"}
+
+@pytest.mark.asyncio
+async def test_connection_stays_open_after_script(caplog):
+    script = Script(items=[ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "ping"})])
+    caplog.set_level(logging.DEBUG, logger="mock_hass_websocket.server")
+    async with MockHass(engine=Engine(script)) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 1, "type": "ping"}))
+            await asyncio.sleep(0.2)
+            await ws.send(json.dumps({"id": 2, "type": "ping"}))
+            await asyncio.sleep(0.2)
+    # The handler only reads the connection again once the script's receiver is gone
+    assert "Received after script completion" in caplog.text
+    assert "Error during execution" not in caplog.text
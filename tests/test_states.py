@@ -0,0 +1,174 @@
+import asyncio
+import json
+import pytest
+import websockets
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, ExpectInteraction, SetStateInteraction
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.states import StateStore
+from mock_hass_websocket.transports import connect_in_process
+
+def make_states(count):
+    return [{"entity_id": f"light.l{i}", "state": "on" if i % 2 else "off", "attributes": {"brightness": i}} for i in range(count)]
+
+@pytest.mark.asyncio
+async def test_encode_result_matches_json_dumps():
+    states = make_states(7)
+    store = StateStore(states, chunk_size=3)
+    data = await store.encode_result(bytearray(), 5)
+    assert bytes(data) == json.dumps({"id": 5, "type": "result", "success": True, "result": states}).encode()
+
+    empty = await StateStore().encode_result(bytearray(), 1)
+    assert json.loads(empty) == {"id": 1, "type": "result", "success": True, "result": []}
+
+def test_encoding_is_cached_until_entity_changes():
+    store = StateStore(make_states(2))
+    first = store.encoded("light.l0")
+    assert store.encoded("light.l0") is first
+
+    store.set({"entity_id": "light.l0", "state": "on"})
+    assert json.loads(store.encoded("light.l0")) == {"entity_id": "light.l0", "state": "on"}
+    assert store.encoded("light.l1") is store.encoded("light.l1")
+
+    with pytest.raises(ValueError):
+        store.set({"state": "on"})
+
+@pytest.mark.asyncio
+async def test_encoding_yields_between_chunks():
+    store = StateStore(make_states(10), chunk_size=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    ticks = 0
+    await store.encode_result(bytearray(), 1)
+    task.cancel()
+    assert ticks >= 4
+
+@pytest.mark.asyncio
+async def test_engine_answers_get_states():
+    states = make_states(3)
+    script = Script(states=states, items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "get_states"}),
+    ])
+    engine = Engine(script)
+    async with MockHass(engine=engine) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 3, "type": "get_states"}))
+            reply = await ws.recv()
+            # A text frame, like a real Home Assistant
+            assert isinstance(reply, str)
+            assert json.loads(reply) == {"id": 3, "type": "result", "success": True, "result": states}
+
+    assert [log.direction for log in engine.history] == ["received", "sent"]
+    # The history holds the message that was sent
+    assert engine.history[1].payload == json.loads(reply)
+
+@pytest.mark.asyncio
+async def test_engine_answers_get_states_in_process():
+    script = Script(states=make_states(2), items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "get_states"}),
+    ])
+    async with connect_in_process(Engine(script)) as ws:
+        await ws.send({"id": 1, "type": "get_states"})
+        reply = await ws.recv()
+        assert [s["entity_id"] for s in reply["result"]] == ["light.l0", "light.l1"]
+        await ws.engine_task
+
+@pytest.mark.asyncio
+async def test_snapshot_rebuilds_only_dirty_chunks():
+    store = StateStore(make_states(10), chunk_size=4)
+    await store.encode_result(bytearray(), 1)
+    assert store.dirty == set()
+    chunks = list(store._chunks)
+
+    store.set({"entity_id": "light.l5", "state": "off"})
+    assert store.dirty == {"light.l5"}
+    data = await store.encode_result(bytearray(), 2)
+    # Chunk 1 holds light.l4..l7; the others are reused as they are
+    assert store._chunks[0] is chunks[0] and store._chunks[2] is chunks[2]
+    assert store._chunks[1] is not chunks[1]
+    assert json.loads(data)["result"][5] == {"entity_id": "light.l5", "state": "off"}
+
+    store.set({"entity_id": "light.new", "state": "on"})
+    store.remove("light.l0")
+    result = json.loads(await store.encode_result(bytearray(), 3))["result"]
+    assert [s["entity_id"] for s in result] == [f"light.l{i}" for i in range(1, 10)] + ["light.new"]
+
+def test_set_state_follows_home_assistant_semantics():
+    store = StateStore()
+    old, new = store.set_state("sensor.t", 21, {"unit_of_measurement": "C"})
+    assert old is None
+    assert new["state"] == "21"
+
+    old, same = store.set_state("sensor.t", "21")
+    assert old is new
+    # Same value: last_changed is kept and attributes carry over
+    assert same["last_changed"] == new["last_changed"]
+    assert same["attributes"] == {"unit_of_measurement": "C"}
+
+    _, changed = store.set_state("sensor.t", "22", {})
+    assert changed["attributes"] == {}
+    assert changed["last_changed"] == changed["last_updated"]
+
+def test_encoded_event_matches_model():
+    store = StateStore(make_states(1))
+    old_encoded = store.encoded("light.l0")
+    old, new = store.set_state("light.l0", "on")
+    event = store.state_changed_event(7, old, new)
+    assert store.encode_state_changed(7, "light.l0", old_encoded) == json.dumps(event.model_dump()).encode()
+    assert store.result_message(3).result == [new]
+
+@pytest.mark.asyncio
+async def test_engine_set_state_notifies_subscribers():
+    script = Script(states=make_states(1), items=[
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "subscribe_events"}),
+        SetStateInteraction(type="set_state", at_ms=0, entity_id="light.l0", state="on"),
+        ExpectInteraction(type="expect", timeout_ms=1000, match={"type": "get_states"}),
+    ])
+    engine = Engine(script)
+    async with MockHass(engine=engine) as server:
+        async with websockets.connect(server.ws_url) as ws:
+            await ws.send(json.dumps({"id": 4, "type": "subscribe_events", "event_type": "state_changed"}))
+            event = json.loads(await ws.recv())
+            assert event["id"] == 4
+            assert event["event"]["data"]["old_state"]["state"] == "off"
+            assert event["event"]["data"]["new_state"]["state"] == "on"
+            await ws.send(json.dumps({"id": 5, "type": "get_states"}))
+            result = json.loads(await ws.recv())["result"]
+            assert result[0] == event["event"]["data"]["new_state"]
+
+    assert engine.history[1].payload == event
+
+@pytest.mark.asyncio
+async def test_engine_set_state_without_subscribers_in_process():
+    script = Script(items=[
+        SetStateInteraction(type="set_state", at_ms=0, entity_id="switch.s", state="on"),
+        SetStateInteraction(type="set_state", at_ms=0, entity_id="switch.s", state="off", subscription=9),
+    ])
+    async with connect_in_process(Engine(script)) as ws:
+        event = await ws.recv()
+        # Only the explicit subscription gets an event
+        assert event["id"] == 9
+        assert event["event"]["data"]["old_state"]["state"] == "on"
+        await ws.engine_task
+
+@pytest.mark.asyncio
+async def test_encoded_list_is_cached_per_version():
+    store = StateStore(make_states(3), chunk_size=2)
+    first = await store.encoded_list()
+    assert json.loads(first) == make_states(3)
+    assert await store.encoded_list() is first
+
+    version = store.version
+    store.set_state("light.l1", "off")
+    assert store.version == version + 1
+    assert store.entity_version("light.l1") == store.version
+    assert store.entity_version("light.l0") < store.version
+    assert json.loads(await store.encoded_list())[1]["state"] == "off"
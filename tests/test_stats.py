@@ -0,0 +1,117 @@
+import json
+import pytest
+from typer.testing import CliRunner
+from mock_hass_websocket import stats
+from mock_hass_websocket.binary_recordings import json_to_binary
+from mock_hass_websocket.main import app
+from mock_hass_websocket.stats import Counts, Filter, Pairs, Reservoir, aggregate, aggregate_file, lookup
+
+def state_changed(entity_id, state):
+    return {"id": 1, "type": "event", "event": {"event_type": "state_changed", "data": {"entity_id": entity_id, "new_state": {"state": state}}}}
+
+def call(domain, service):
+    return {"id": 2, "type": "call_service", "domain": domain, "service": service}
+
+def soak():
+    """Motion on every 10s for 5 minutes; the light follows 50-59ms later, a switch every minute."""
+    entries = []
+    for n in range(30):
+        t = n * 10.0
+        entries.append({"timestamp": t, "direction": "sent", "payload": state_changed("binary_sensor.motion", "on")})
+        entries.append({"timestamp": t + 0.050 + n % 10 / 1000.0, "direction": "received", "payload": call("light", "turn_on")})
+        if n % 6 == 0:
+            entries.append({"timestamp": t + 1.0, "direction": "received", "payload": call("switch", "toggle")})
+    return entries
+
+def test_lookup():
+    payload = {"event": {"data": {"entity_id": "light.a", "list": [1, {"x": 2}]}}}
+    assert lookup(payload, "event.data.entity_id") == "light.a"
+    assert lookup(payload, "event.data.list.1.x") == 2
+    assert lookup(payload, "event.data.list.-1.x") == 2
+    assert lookup(payload, "event.missing.x") is None
+
+def test_counts_per_domain_per_minute():
+    counts = Counts(["domain"], bucket_s=60, select=Filter("received", {"type": "call_service"}))
+    assert aggregate(soak(), [counts]) == 65
+    rows = counts.rows()
+    assert rows[:2] == [
+        {"bucket_s": 0, "domain": "light", "count": 6},
+        {"bucket_s": 0, "domain": "switch", "count": 1},
+    ]
+    assert sum(row["count"] for row in rows if row["domain"] == "light") == 30
+    assert [row["bucket_s"] for row in rows if row["domain"] == "switch"] == [0, 60, 120, 180, 240]
+
+def test_pairs_latency_percentiles():
+    pairs = Pairs(
+        {"type": "event", "event": {"data": {"entity_id": "binary_sensor.motion"}}},
+        {"type": "call_service", "domain": "light"},
+        group_by=["event.data.entity_id"],
+    )
+    aggregate(soak(), [pairs])
+    [row] = pairs.rows()
+    assert row["event.data.entity_id"] == "binary_sensor.motion"
+    assert row["count"] == 30
+    assert row["min"] == pytest.approx(50.0)
+    assert row["max"] == pytest.approx(59.0)
+    assert row["p50"] == pytest.approx(54.5)
+    assert row["p99"] == pytest.approx(59.0)
+    assert pairs.unmatched_ends == 0
+
+def test_pairing_modes():
+    entries = [
+        {"timestamp": 0.0, "direction": "sent", "payload": {"n": 1}},
+        {"timestamp": 1.0, "direction": "sent", "payload": {"n": 2}},
+        {"timestamp": 1.5, "direction": "received", "payload": {"ack": True}},
+        {"timestamp": 2.0, "direction": "received", "payload": {"ack": True}},
+    ]
+    fifo = Pairs({}, {"ack": True}, mode="fifo")
+    latest = Pairs({}, {"ack": True}, mode="latest")
+    aggregate(entries, [fifo, latest])
+    assert fifo.rows()[0]["min"] == pytest.approx(1000.0)
+    assert fifo.rows()[0]["max"] == pytest.approx(1500.0)
+    assert latest.rows()[0]["count"] == 1
+    assert latest.rows()[0]["mean"] == pytest.approx(500.0)
+    assert latest.unmatched_ends == 1
+
+def test_reservoir_stays_bounded():
+    reservoir = Reservoir(size=100)
+    for value in range(10000):
+        reservoir.add(float(value))
+    summary = reservoir.summary()
+    assert len(reservoir.sample) == 100
+    assert (summary["count"], summary["min"], summary["max"], summary["sampled"]) == (10000, 0.0, 9999.0, 100)
+    assert summary["mean"] == pytest.approx(4999.5)
+    assert 3000 < summary["p50"] < 7000
+
+def test_percentiles_match_numpy(monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    reservoir = Reservoir()
+    for value in numpy.random.default_rng(1).exponential(20.0, 1000):
+        reservoir.add(float(value))
+    vectorised = reservoir.summary()
+    monkeypatch.setattr(stats, "numpy", None)
+    assert reservoir.summary() == pytest.approx(vectorised)
+
+def test_stats_cli_on_binary_recording(tmp_path):
+    source = tmp_path / "soak.jsonl"
+    source.write_text("".join(json.dumps(entry) + "\n" for entry in soak()))
+    packed = tmp_path / "soak.mhrec"
+    json_to_binary(source, packed)
+    assert aggregate_file(packed, []) == 65
+
+    runner = CliRunner()
+    result = runner.invoke(app, [
+        "stats", str(packed), "--type", "call_service", "--group-by", "domain", "--bucket", "60",
+        "--pair-from", '{"type": "event"}', "--pair-to", '{"domain": "light"}', "--json",
+    ])
+    assert result.exit_code == 0, result.stdout
+    report = json.loads(result.stdout)
+    assert report["entries"] == 65
+    assert report["counts"][0] == {"bucket_s": 0, "domain": "light", "count": 6}
+    assert report["delays_ms"][0]["count"] == 30
+
+    result = runner.invoke(app, ["stats", str(packed), "--group-by", "type"])
+    assert result.exit_code == 0
+    assert "call_service" in result.stdout
+    result = runner.invoke(app, ["stats", str(packed), "--pair-from", "{}"])
+    assert result.exit_code != 0
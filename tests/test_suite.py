@@ -0,0 +1,77 @@
+import json
+import time
+import xml.etree.ElementTree as ET
+import pytest
+from typer.testing import CliRunner
+from mock_hass_websocket.analysis import Timeline, analyse_file
+from mock_hass_websocket.main import app
+from mock_hass_websocket.suite import plan, run_scenarios
+
+SCENARIO = """
+script:
+  - type: send
+    at_ms: {at_ms}
+    payload: {{type: event, event: {{state: "on"}}}}
+  - type: expect
+    timeout_ms: 1000
+    match: {{type: call_service, domain: light, service: turn_on}}
+"""
+
+def write_scenario(directory, name, at_ms):
+    path = directory / f"{name}.yaml"
+    path.write_text(SCENARIO.format(at_ms=at_ms))
+    return path
+
+def test_plan_balances_longest_first():
+    timelines = [Timeline(name=str(n), expected_ms=ms) for n, ms in enumerate([100, 700, 300, 500, 400])]
+    shards = plan(timelines, 2)
+    assert [[t.expected_ms for t in shard] for shard in shards] == [[700, 300], [500, 400, 100]]
+    assert plan(timelines[:1], 4) == [timelines[:1]]
+
+@pytest.mark.asyncio
+async def test_scenarios_run_concurrently(tmp_path):
+    timelines = [analyse_file(write_scenario(tmp_path, f"s{n}", 300)) for n in range(4)]
+    started = time.perf_counter()
+    results = await run_scenarios(timelines)
+    elapsed = time.perf_counter() - started
+
+    assert [r.status for r in results] == ["passed"] * 4
+    assert all(r.seconds >= 0.3 for r in results)
+    # Four 300ms scenarios side by side, not one after the other
+    assert elapsed < 1.0
+
+@pytest.mark.asyncio
+async def test_impossible_and_mismatching_scenarios(tmp_path):
+    impossible = tmp_path / "impossible.yaml"
+    impossible.write_text("script:\n  - type: expect\n    timeout_ms: 100\n    match: {type: result}\n")
+    good = write_scenario(tmp_path, "good", 10)
+    recordings = tmp_path / "recordings"
+    recordings.mkdir()
+    (recordings / "good.json").write_text(json.dumps([{"direction": "sent", "payload": {"type": "event", "event": {"state": "off"}}}]))
+
+    results = await run_scenarios([analyse_file(impossible), analyse_file(good)], recordings=recordings)
+    by_name = {r.name: r for r in results}
+    assert by_name["impossible"].status == "error"
+    assert "only sent by Home Assistant" in by_name["impossible"].message
+    assert by_name["good"].status == "failed"
+    assert "payload.event.state" in by_name["good"].message
+
+def test_run_suite_cli_reports(tmp_path):
+    scenarios = tmp_path / "scenarios"
+    scenarios.mkdir()
+    for n, at_ms in enumerate([50, 150, 100]):
+        write_scenario(scenarios, f"s{n}", at_ms)
+    junit, report = tmp_path / "junit.xml", tmp_path / "report.json"
+
+    runner = CliRunner()
+    result = runner.invoke(app, ["run-suite", str(scenarios), "--workers", "2", "--junit", str(junit), "--json", str(report)])
+    assert result.exit_code == 0, result.stdout
+    assert "3 passed, 0 failed, 0 errors" in result.stdout
+
+    data = json.loads(report.read_text())
+    assert data["workers"] == 2
+    assert [r["name"] for r in data["results"]] == ["s1", "s2", "s0"]
+    suite = ET.parse(junit).getroot()
+    assert suite.get("tests") == "3"
+    assert suite.get("failures") == "0"
+    assert {case.get("name") for case in suite.iter("testcase")} == {"s0", "s1", "s2"}
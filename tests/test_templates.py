@@ -0,0 +1,87 @@
+import json
+import pytest
+from mock_hass_websocket.templates import TemplateContext, compile_template, compile_expression
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, SendInteraction
+
+def test_static_payload_matches_json_dumps():
+    payload = {"type": "event", "event": {"a": [1, 2.5, None, True]}, "text": "plain"}
+    template = compile_template(payload)
+    assert template.is_static
+    text, rendered = template.render(TemplateContext())
+    assert text == json.dumps(payload)
+    assert rendered == payload
+
+def test_whole_placeholder_keeps_type():
+    template = compile_template({"id": "${last_id}", "count": "${n}"})
+    ctx = TemplateContext(variables={"n": 3})
+    ctx.last_id = 12
+    text, payload = template.render(ctx)
+    assert payload == {"id": 12, "count": 3}
+    assert json.loads(text) == payload
+
+def test_embedded_placeholder_is_stringified():
+    template = compile_template({"entity_id": "light.${room}_${index}"})
+    ctx = TemplateContext(variables={"room": "kitchen"})
+    ctx.index = 4
+    text, payload = template.render(ctx)
+    assert payload == {"entity_id": "light.kitchen_4"}
+    assert text == '{"entity_id": "light.kitchen_4"}'
+
+def test_escaping_in_spliced_strings():
+    template = compile_template({"msg": 'say "${word}"'})
+    text, payload = template.render(TemplateContext(variables={"word": "hi\n"}))
+    assert json.loads(text) == payload == {"msg": 'say "hi\n"'}
+
+def test_counters_and_ranges():
+    template = compile_template(["${counter(a)}", "${counter(b, 10)}", "${range(0, 6, 2)}"])
+    ctx = TemplateContext()
+    results = []
+    for index in range(4):
+        ctx.index = index
+        results.append(template.render(ctx)[1])
+    assert results == [[1, 10, 0], [2, 11, 2], [3, 12, 4], [4, 13, 0]]
+
+def test_seeded_random_is_reproducible():
+    template = compile_template({"v": "${randint(0, 1000)}", "c": "${choice('a', 'b', 'c')}"})
+    first = [template.render(TemplateContext(seed=1))[0] for _ in range(3)]
+    second = [template.render(TemplateContext(seed=1))[0] for _ in range(3)]
+    assert first == second
+
+def test_dotted_variables():
+    template = compile_template("${room.lights}")
+    text, payload = template.render(TemplateContext(variables={"room": {"lights": ["a"]}}))
+    assert payload == ["a"]
+
+def test_invalid_expressions():
+    with pytest.raises(ValueError, match="Unknown template function"):
+        compile_expression("explode()")
+    with pytest.raises(ValueError, match="Invalid template expression"):
+        compile_expression("1 + 1")
+    with pytest.raises(ValueError, match="Invalid template arguments"):
+        compile_expression("uniform(1)")
+    with pytest.raises(KeyError, match="Unknown template variable"):
+        compile_template("${missing}").render(TemplateContext())
+
+@pytest.mark.asyncio
+async def test_engine_repeat_with_template(mock_websocket):
+    script = Script(
+        items=[SendInteraction(
+            type="send", at_ms=0, repeat=3, interval_ms=1, template=True,
+            payload={"type": "event", "n": "${counter(events)}", "entity_id": "${entity}"},
+        )],
+        variables={"entity": "sensor.x"},
+    )
+    engine = Engine(script)
+    await engine.run(mock_websocket)
+
+    sent = [json.loads(call.args[0]) for call in mock_websocket.send.call_args_list]
+    assert [m["n"] for m in sent] == [1, 2, 3]
+    assert all(m["entity_id"] == "sensor.x" for m in sent)
+    assert [log.payload for log in engine.history] == sent
+
+def test_render_payload_matches_render():
+    template = compile_template({"n": "${counter(x)}", "s": "id_${index}"})
+    ctx = TemplateContext()
+    assert template.render_payload(ctx) == {"n": 1, "s": "id_0"}
+    assert template.render(ctx)[1] == {"n": 2, "s": "id_0"}
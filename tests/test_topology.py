@@ -0,0 +1,100 @@
+import asyncio
+import json
+import socket
+import aiohttp
+import pytest
+import websockets
+from typer.testing import CliRunner
+from mock_hass_websocket.main import app
+from mock_hass_websocket.models import InstanceConfig, TopologyConfig
+from mock_hass_websocket.topology import Topology, load_topology
+
+SCENARIO = """
+states:
+  - {entity_id: light.porch, state: "off"}
+script:
+  - type: send
+    at_ms: 0
+    payload: {type: event, event: {instance: true}}
+  - type: expect
+    timeout_ms: 2000
+    match: {type: ping}
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def scenario(tmp_path):
+    path = tmp_path / "porch.yaml"
+    path.write_text(SCENARIO)
+    return path
+
+async def play(ws_url, token=None):
+    async with websockets.connect(ws_url) as ws:
+        if token is not None:
+            assert json.loads(await ws.recv())["type"] == "auth_required"
+            await ws.send(json.dumps({"type": "auth", "access_token": token}))
+            reply = json.loads(await ws.recv())
+            if reply["type"] != "auth_ok":
+                return reply
+        event = json.loads(await asyncio.wait_for(ws.recv(), 5))
+        await ws.send(json.dumps({"id": 1, "type": "ping"}))
+        return event
+
+@pytest.mark.asyncio
+async def test_instances_share_scripts_but_not_state(scenario):
+    config = TopologyConfig(instances={
+        "home": InstanceConfig(scenario=str(scenario), tokens=["home-token"]),
+        "cabin": InstanceConfig(scenario=str(scenario), sessions={"extra": str(scenario)}),
+        "remote": InstanceConfig(scenario=str(scenario), port=free_port(), tokens=["remote-token"]),
+    })
+    async with Topology(config) as topology:
+        home, cabin, remote = (topology.instances[name] for name in ("home", "cabin", "remote"))
+        # One parse of the scenario serves every engine
+        assert len(topology.cache) == 1
+        assert home.engine.script is cabin.engine.script is remote.engine.script is cabin.sessions["extra"].script
+        assert home.url == f"http://127.0.0.1:{topology.port}/home"
+        assert remote.url == f"http://127.0.0.1:{remote.config.port}"
+
+        assert (await play(home.ws_url, "remote-token"))["type"] == "auth_invalid"
+        assert await play(home.ws_url, "home-token") == {"type": "event", "event": {"instance": True}}
+        assert await play(cabin.ws_url) == {"type": "event", "event": {"instance": True}}
+        assert await play(cabin.session_ws_url("extra")) == {"type": "event", "event": {"instance": True}}
+        assert await play(remote.ws_url, "remote-token") == {"type": "event", "event": {"instance": True}}
+
+        async with aiohttp.ClientSession() as http:
+            async with http.post(f"{home.url}/api/states/light.porch", json={"state": "on"}) as response:
+                assert response.status == 200
+            async with http.get(f"{home.url}/api/states/light.porch") as response:
+                assert (await response.json())["state"] == "on"
+            for other in (cabin, remote):
+                async with http.get(f"{other.url}/api/states/light.porch") as response:
+                    assert (await response.json())["state"] == "off"
+            async with http.get(f"http://127.0.0.1:{topology.port}/nowhere/api/states") as response:
+                assert response.status == 404
+
+@pytest.mark.asyncio
+async def test_invalid_instance_name(scenario):
+    config = TopologyConfig(instances={"bad name": InstanceConfig(scenario=str(scenario))})
+    with pytest.raises(ValueError, match="bad name"):
+        await Topology(config).start()
+
+def test_load_topology_resolves_relative_paths(tmp_path, scenario):
+    path = tmp_path / "topology.yaml"
+    path.write_text("instances:\n  home:\n    scenario: porch.yaml\n    sessions: {a: porch.yaml}\n    port: 9000\n")
+    config = load_topology(path)
+    home = config.instances["home"]
+    assert home.scenario == str(scenario)
+    assert home.sessions == {"a": str(scenario)}
+    assert home.port == 9000
+
+def test_topology_cli(tmp_path, scenario):
+    path = tmp_path / "topology.yaml"
+    path.write_text("instances:\n  home:\n    scenario: porch.yaml\n")
+    runner = CliRunner()
+    result = runner.invoke(app, ["topology", "--help"])
+    assert result.exit_code == 0
+    assert "virtual Home Assistant" in result.stdout
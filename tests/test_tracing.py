@@ -0,0 +1,55 @@
+import asyncio
+import json
+import pytest
+import websockets
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.tracing import Tracer
+from mock_hass_websocket.transports import connect_in_process
+
+@pytest.mark.asyncio
+async def test_spans_per_interaction(auth_script):
+    tracer = Tracer()
+    engine = Engine(auth_script, tracer=tracer)
+    async with connect_in_process(engine) as ws:
+        await ws.recv()
+        await ws.send({"type": "ping"})
+        await ws.send({"type": "auth", "access_token": "t"})
+        await ws.recv()
+        await ws.engine_task
+
+    assert [(span.name, span.args["index"]) for span in tracer.spans] == [("send", 0), ("expect auth", 1), ("send", 2)]
+    expect = tracer.spans[1]
+    assert expect.end >= expect.start
+    assert expect.args["inspected"] == 2
+    assert expect.args["timed_out"] is False
+    assert expect.args["after_send"] == 0
+    assert expect.args["reaction_ms"] >= 0
+
+@pytest.mark.asyncio
+async def test_timed_out_expectation_is_traced():
+    tracer = Tracer()
+    script = Script(items=[ExpectInteraction(type="expect", timeout_ms=50, match={"type": "auth"})])
+    async with connect_in_process(Engine(script, tracer=tracer)) as ws:
+        with pytest.raises(asyncio.TimeoutError):
+            await ws.engine_task
+
+    (span,) = tracer.spans
+    assert span.args["timed_out"] is True
+    assert span.end - span.start >= 0.04
+
+@pytest.mark.asyncio
+async def test_server_writes_chrome_trace(tmp_path, auth_script, login):
+    path = tmp_path / "trace.json"
+    async with MockHass(engine=Engine(auth_script), trace_path=path) as server:
+        for _ in range(2):
+            async with websockets.connect(server.ws_url) as ws:
+                await login(ws)
+
+    events = json.loads(path.read_text())["traceEvents"]
+    assert len(events) == 6
+    assert {event["ph"] for event in events} == {"X"}
+    # Each connection is its own track
+    assert {event["tid"] for event in events} == {1, 2}
+    assert min(event["ts"] for event in events) == 0
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import pytest
+import websockets
+from websockets.exceptions import ConnectionClosed
+from mock_hass_websocket.engine import Engine
+from mock_hass_websocket.models import Script, ExpectInteraction
+from mock_hass_websocket.server import MockHass
+from mock_hass_websocket.transports import connection_pair, connect_in_process
+
+@pytest.mark.asyncio
+async def test_in_process_passes_objects(auth_script):
+    engine = Engine(auth_script)
+    async with connect_in_process(engine) as ws:
+        first = await ws.recv()
+        # No serialisation: the client sees the script's payload object itself
+        assert first is auth_script.items[0].payload
+        await ws.send({"type": "auth", "access_token": "abc"})
+        assert await ws.recv() == {"type": "auth_ok"}
+        await ws.engine_task
+
+    assert [log.direction for log in engine.history] == ["sent", "received", "sent"]
+
+@pytest.mark.asyncio
+async def test_in_process_text_mode(auth_script):
+    engine = Engine(auth_script)
+    async with connect_in_process(engine, text=True) as ws:
+        assert json.loads(await ws.recv()) == {"type": "auth_required"}
+        await ws.send(json.dumps({"type": "auth"}))
+        assert json.loads(await ws.recv()) == {"type": "auth_ok"}
+        await ws.engine_task
+
+@pytest.mark.asyncio
+async def test_in_process_close():
+    server, client = connection_pair()
+    await server.send({"a": 1})
+    await client.close()
+    assert server.closed and client.closed
+    # Messages already delivered are still readable, then the close is reported
+    assert await client.recv() == {"a": 1}
+    with pytest.raises(ConnectionClosed):
+        await client.recv()
+    assert [m async for m in server] == []
+    with pytest.raises(ConnectionClosed):
+        await server.send({"b": 2})
+    await server.wait_closed()
+
+@pytest.mark.asyncio
+async def test_in_process_expect_timeout():
+    engine = Engine(Script(items=[ExpectInteraction(type="expect", timeout_ms=50, match={"x": 1})]))
+    async with connect_in_process(engine) as ws:
+        with pytest.raises(asyncio.TimeoutError):
+            await ws.engine_task
+
+@pytest.mark.asyncio
+async def test_unix_socket_server(tmp_path, auth_script):
+    socket_path = str(tmp_path / "hass.sock")
+    engine = Engine(auth_script)
+    async with MockHass(engine=engine, unix_path=socket_path) as server:
+        async with websockets.unix_connect(socket_path, uri=server.ws_url) as ws:
+            assert json.loads(await ws.recv()) == {"type": "auth_required"}
+            await ws.send(json.dumps({"type": "auth"}))
+            assert json.loads(await ws.recv()) == {"type": "auth_ok"}